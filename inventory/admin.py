@@ -2,12 +2,15 @@ from datetime import timezone
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import Supplier, Category, Product, StockMovement, ProductImage, InventoryAlert
+from django.db.models import Prefetch
+from .models import Supplier, Category, CategoryClosure, Product, StockMovement, ProductImage, InventoryAlert
 from .forms import ProductForm
+from .rollups import with_rollups
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
-    list_display = ('name', 'contact_person', 'email', 'phone', 'total_products', 'is_active', 'created_at')
+    list_display = ('name', 'contact_person', 'email', 'phone', 'total_products', 'low_stock_products',
+                    'inventory_value', 'is_active', 'created_at')
     search_fields = ('name', 'contact_person', 'email', 'phone')
     list_filter = ('is_active', 'created_at')
     list_editable = ('is_active',)
@@ -28,9 +31,23 @@ class SupplierAdmin(admin.ModelAdmin):
     )
     actions = ['activate_suppliers', 'deactivate_suppliers']
 
+    def get_queryset(self, request):
+        return with_rollups(super().get_queryset(request))
+
     def total_products(self, obj):
-        return obj.products.count()
+        return obj.products_count
     total_products.short_description = 'Products'
+    total_products.admin_order_field = 'products_count'
+
+    def low_stock_products(self, obj):
+        return obj.low_stock_count
+    low_stock_products.short_description = 'Low Stock'
+    low_stock_products.admin_order_field = 'low_stock_count'
+
+    def inventory_value(self, obj):
+        return f"{obj.stock_value:,.2f}"
+    inventory_value.short_description = 'Stock Value'
+    inventory_value.admin_order_field = 'stock_value'
 
     def activate_suppliers(self, request, queryset):
         queryset.update(is_active=True)
@@ -43,6 +60,7 @@ class SupplierAdmin(admin.ModelAdmin):
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'parent', 'product_count', 'is_active', 'hierarchy')
+    list_select_related = ('parent',)
     search_fields = ('name', 'description')
     list_filter = ('is_active', 'parent')
     list_editable = ('is_active',)
@@ -60,9 +78,16 @@ class CategoryAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Every row's ancestors in one extra query, for the hierarchy column
+        ancestor_links = CategoryClosure.objects.select_related('ancestor')
+        return with_rollups(super().get_queryset(request)).prefetch_related(
+            Prefetch('ancestor_links', queryset=ancestor_links))
+
     def product_count(self, obj):
-        return obj.products.count()
+        return obj.products_count
     product_count.short_description = 'Products'
+    product_count.admin_order_field = 'products_count'
 
     def hierarchy(self, obj):
         return obj.get_full_path()
@@ -84,6 +109,7 @@ class ProductAdmin(admin.ModelAdmin):
     form = ProductForm
     list_display = ('name', 'category_link', 'supplier_link', 'unit_price', 'cost_price', 
                     'quantity', 'stock_status', 'expiry_status', 'is_active')
+    list_select_related = ('category', 'supplier')
     list_filter = ('is_active', 'category', 'supplier', 'created_at')
     search_fields = ('name', 'sku', 'barcode', 'description')
     list_editable = ('unit_price', 'quantity', 'is_active')
@@ -184,6 +210,11 @@ class StockMovementAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return self.readonly_fields + StockMovement.POSTED_FIELDS
+        return self.readonly_fields
+
     def product_link(self, obj):
         url = reverse('admin:inventory_product_change', args=[obj.product.id])
         return format_html('<a href="{}">{}</a>', url, obj.product)
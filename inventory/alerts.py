@@ -0,0 +1,159 @@
+"""
+Set-based stock and expiry alert engine.
+
+``evaluate_alerts`` works out which alerts a set of products should have with
+one query, then brings InventoryAlert in line in bulk: new alerts are
+inserted with one ``bulk_create``, changed ones are refreshed with one
+``bulk_update`` and alerts that no longer apply are resolved with one
+``update``.
+"""
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from store_manager.caching import bump
+
+from .models import InventoryAlert, Product
+
+STOCK_ALERT_TYPES = ('low_stock', 'out_of_stock')
+EXPIRY_ALERT_TYPES = ('expiring', 'expired')
+MANAGED_ALERT_TYPES = STOCK_ALERT_TYPES + EXPIRY_ALERT_TYPES
+EXPIRY_WARNING_DAYS = 30
+# Products per evaluation query when a list of ids is given
+CHUNK_SIZE = 500
+
+
+def stock_alert(name, quantity, reorder_level):
+    """
+    Returns ``(alert_type, message, threshold, days_to_expiry)`` for the
+    product's stock level, or None when stock is fine
+    """
+    if quantity == 0:
+        return ('out_of_stock', f"{name} is out of stock", reorder_level, None)
+    if quantity <= reorder_level:
+        return ('low_stock',
+                f"{name} is low on stock (Current: {quantity}, Reorder at: {reorder_level})",
+                reorder_level, None)
+    return None
+
+
+def expiry_alert(name, expiry_date, today):
+    """
+    Returns ``(alert_type, message, threshold, days_to_expiry)`` for the
+    product's expiry date, or None when it is not due to expire soon
+    """
+    if expiry_date is None:
+        return None
+    days_to_expiry = (expiry_date - today).days
+    if days_to_expiry < 0:
+        return ('expired', f"{name} has expired", None, None)
+    if days_to_expiry <= EXPIRY_WARNING_DAYS:
+        return ('expiring', f"{name} expires in {days_to_expiry} days", None, days_to_expiry)
+    return None
+
+
+class AlertChanges:
+    """
+    Counts of the alerts created, refreshed and resolved by an evaluation
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.resolved = 0
+
+    def __iadd__(self, other):
+        self.created += other.created
+        self.updated += other.updated
+        self.resolved += other.resolved
+        return self
+
+    def __str__(self):
+        return f"{self.created} created, {self.updated} updated, {self.resolved} resolved"
+
+
+def desired_alerts(products, today):
+    """
+    Maps ``(product_id, alert_type)`` to ``(message, threshold,
+    days_to_expiry)`` for every alert the given products should have
+    """
+    horizon = today + timedelta(days=EXPIRY_WARNING_DAYS)
+    flagged = products.filter(
+        Q(quantity__lte=F('reorder_level')) | Q(expiry_date__lte=horizon)
+    ).values_list('pk', 'name', 'quantity', 'reorder_level', 'expiry_date')
+
+    desired = {}
+    for pk, name, quantity, reorder_level, expiry_date in flagged:
+        for alert in (stock_alert(name, quantity, reorder_level), expiry_alert(name, expiry_date, today)):
+            if alert:
+                desired[(pk, alert[0])] = alert[1:]
+    return desired
+
+
+def sync_alerts(products, alerts, today, alert_types=MANAGED_ALERT_TYPES):
+    """
+    Makes the unresolved ``alerts`` match the rules for ``products`` (two
+    querysets over the same products)
+    """
+    changes = AlertChanges()
+    desired = {
+        key: values for key, values in desired_alerts(products, today).items()
+        if key[1] in alert_types
+    }
+
+    current = {}
+    stale = []
+    for alert in alerts.filter(is_resolved=False, alert_type__in=alert_types).order_by('created_at', 'pk'):
+        key = (alert.product_id, alert.alert_type)
+        if key in desired and key not in current:
+            current[key] = alert
+        else:
+            # No longer applies, or a duplicate of an alert we keep
+            stale.append(alert.pk)
+
+    new_alerts = []
+    changed = []
+    for key, (message, threshold, days_to_expiry) in desired.items():
+        alert = current.get(key)
+        if alert is None:
+            new_alerts.append(InventoryAlert(
+                product_id=key[0], alert_type=key[1], message=message,
+                threshold=threshold, days_to_expiry=days_to_expiry,
+            ))
+        elif (alert.message, alert.threshold, alert.days_to_expiry) != (message, threshold, days_to_expiry):
+            alert.message, alert.threshold, alert.days_to_expiry = message, threshold, days_to_expiry
+            changed.append(alert)
+
+    if new_alerts:
+        changes.created = len(InventoryAlert.objects.bulk_create(new_alerts, batch_size=CHUNK_SIZE))
+    if changed:
+        changes.updated = InventoryAlert.objects.bulk_update(
+            changed, ['message', 'threshold', 'days_to_expiry'], batch_size=CHUNK_SIZE)
+    for start in range(0, len(stale), CHUNK_SIZE):
+        changes.resolved += InventoryAlert.objects.filter(pk__in=stale[start:start + CHUNK_SIZE]).update(
+            is_resolved=True, resolved_at=timezone.now())
+    if new_alerts or changed or stale:
+        bump('inventory')
+    return changes
+
+
+def evaluate_alerts(product_ids=None, today=None, alert_types=MANAGED_ALERT_TYPES):
+    """
+    Evaluates stock and expiry alerts for the given products, or the whole
+    catalog when ``product_ids`` is None, and returns the AlertChanges
+    """
+    today = today or timezone.now().date()
+    if product_ids is None:
+        return sync_alerts(Product.objects.all(), InventoryAlert.objects.all(), today, alert_types)
+
+    product_ids = list(dict.fromkeys(product_ids))
+    changes = AlertChanges()
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        ids = product_ids[start:start + CHUNK_SIZE]
+        changes += sync_alerts(
+            Product.objects.filter(pk__in=ids),
+            InventoryAlert.objects.filter(product_id__in=ids),
+            today, alert_types,
+        )
+    return changes
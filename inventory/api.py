@@ -0,0 +1,61 @@
+"""
+JSON API endpoints for the inventory lists (see store_manager.api)
+"""
+from store_manager.api import ApiListView
+from .views import InventoryAlertListView, ProductListView, StockMovementListView
+
+
+class ProductApiView(ApiListView):
+    list_view = ProductListView
+    page_size = ProductListView.paginate_by
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'sku': 'sku',
+        'barcode': 'barcode',
+        'category': 'category__name',
+        'supplier': 'supplier__name',
+        'quantity': 'quantity',
+        'reorder_level': 'reorder_level',
+        'unit_price': 'unit_price',
+        'cost_price': 'cost_price',
+        'is_active': 'is_active',
+        'expiry_date': 'expiry_date',
+        'updated_at': 'updated_at',
+    }
+
+
+class StockMovementApiView(ApiListView):
+    list_view = StockMovementListView
+    page_size = StockMovementListView.paginate_by
+    fields = {
+        'id': 'id',
+        'product': 'product_id',
+        'sku': 'product__sku',
+        'movement_type': 'movement_type',
+        'quantity': 'quantity',
+        'before_quantity': 'before_quantity',
+        'after_quantity': 'after_quantity',
+        'unit_price': 'unit_price',
+        'total_price': 'total_price',
+        'reference': 'reference',
+        'created_by': 'created_by__username',
+        'created_at': 'created_at',
+    }
+
+
+class InventoryAlertApiView(ApiListView):
+    list_view = InventoryAlertListView
+    page_size = InventoryAlertListView.paginate_by
+    fields = {
+        'id': 'id',
+        'product': 'product_id',
+        'sku': 'product__sku',
+        'alert_type': 'alert_type',
+        'message': 'message',
+        'threshold': 'threshold',
+        'days_to_expiry': 'days_to_expiry',
+        'is_resolved': 'is_resolved',
+        'created_at': 'created_at',
+        'resolved_at': 'resolved_at',
+    }
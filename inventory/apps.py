@@ -13,13 +13,14 @@ class InventoryConfig(AppConfig):
         try:
             from . import signals  # noqa
             from django.db.models.signals import post_migrate
-            from .setup import create_initial_data
+            from .setup import check_search_triggers, create_initial_data
             
             # Connect post-migrate signal for initial data setup
             post_migrate.connect(create_initial_data, sender=self)
+            post_migrate.connect(check_search_triggers, sender=self)
             
             # Import checks for custom validation
             from . import checks  # noqa
         except ImportError:
             # Silently fail if signals.py doesn't exist yet
-            pass
\ No newline at end of file
+            pass
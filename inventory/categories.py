@@ -0,0 +1,123 @@
+"""
+Category hierarchy index.
+
+CategoryClosure stores every (ancestor, descendant) pair of the tree with
+its distance, so a subtree or a path to the root is a single indexed query
+whatever the depth. Creating a category adds its row for each ancestor;
+moving one rewrites the links between its subtree and its old and new
+ancestors. ``rebuild_closure`` recomputes the table from ``parent``.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Category, CategoryClosure, Product
+
+BATCH_SIZE = 1000
+
+
+def ancestor_links(category_id, using=None):
+    """
+    ``[(ancestor_id, depth)]`` of the category, itself included
+    """
+    return list(CategoryClosure.objects.using(using).filter(
+        descendant_id=category_id).values_list('ancestor_id', 'depth'))
+
+
+def add_category(category, using=None):
+    """
+    Links a new category to itself and to its parent's ancestors
+    """
+    links = [CategoryClosure(ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+    if category.parent_id:
+        links += [
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=category.pk, depth=depth + 1)
+            for ancestor_id, depth in ancestor_links(category.parent_id, using)
+        ]
+    CategoryClosure.objects.using(using).bulk_create(links, ignore_conflicts=True)
+
+
+def move_category(category, using=None):
+    """
+    Relinks the category's subtree under its current parent: links to the
+    old ancestors go, links to the new ones are added. Raises
+    ValidationError if the parent is inside the subtree.
+    """
+    closure = CategoryClosure.objects.using(using)
+    subtree = dict(closure.filter(ancestor_id=category.pk).values_list('descendant_id', 'depth'))
+    if not subtree:
+        # Not indexed yet
+        return add_category(category, using)
+    if category.parent_id in subtree:
+        raise ValidationError("A category cannot be moved under itself or one of its subcategories")
+
+    with transaction.atomic(using=using):
+        closure.filter(descendant_id__in=list(subtree)).exclude(ancestor_id__in=list(subtree)).delete()
+        if category.parent_id:
+            closure.bulk_create([
+                CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id,
+                                depth=ancestor_depth + depth + 1)
+                for ancestor_id, ancestor_depth in ancestor_links(category.parent_id, using)
+                for descendant_id, depth in subtree.items()
+            ], batch_size=BATCH_SIZE)
+
+
+def detach_children(category, using=None):
+    """
+    Before a category is deleted: its children become roots (``parent`` is
+    SET_NULL), so their subtrees lose every ancestor above them
+    """
+    closure = CategoryClosure.objects.using(using)
+    below = closure.filter(ancestor_id=category.pk, depth__gt=0).values('descendant_id')
+    closure.filter(descendant_id__in=below).exclude(
+        ancestor_id__in=closure.filter(ancestor_id__in=category.children.values('pk')).values('descendant_id'),
+    ).delete()
+
+
+def rebuild_closure(batch_size=BATCH_SIZE):
+    """
+    Recomputes the closure table from the parent links and returns the
+    number of rows written. Cycles in the parent links are cut.
+    """
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+    links = []
+    for pk in parents:
+        ancestor, depth, seen = pk, 0, set()
+        while ancestor is not None and ancestor not in seen:
+            seen.add(ancestor)
+            links.append(CategoryClosure(ancestor_id=ancestor, descendant_id=pk, depth=depth))
+            ancestor, depth = parents.get(ancestor), depth + 1
+    with transaction.atomic():
+        CategoryClosure.objects.all().delete()
+        CategoryClosure.objects.bulk_create(links, batch_size=batch_size)
+    return len(links)
+
+
+def descendant_ids(category, include_self=True):
+    """
+    The ids in the category's subtree, as a subquery
+    """
+    links = CategoryClosure.objects.filter(ancestor_id=getattr(category, 'pk', category))
+    if not include_self:
+        links = links.filter(depth__gt=0)
+    return links.values('descendant_id')
+
+
+def descendants(category, include_self=False):
+    return Category.objects.filter(pk__in=descendant_ids(category, include_self))
+
+
+def ancestors(category, include_self=False):
+    """
+    The category's ancestors, root first
+    """
+    links = CategoryClosure.objects.filter(descendant_id=getattr(category, 'pk', category))
+    if not include_self:
+        links = links.filter(depth__gt=0)
+    return [link.ancestor for link in links.select_related('ancestor').order_by('-depth')]
+
+
+def subtree_products(category):
+    """
+    Products in the category or any of its subcategories
+    """
+    return Product.objects.filter(category_id__in=descendant_ids(category))
@@ -0,0 +1,86 @@
+"""
+Scheduled expiry alert sweep.
+
+A product's expiry status only changes on two dates: when it enters the
+warning window (``EXPIRY_WARNING_DAYS`` before it expires) and the day after
+it expires. The sweep keeps a watermark and, for each day since the last
+run, looks up just the products whose expiry date makes that day one of
+those two dates, using the ``expiry_date`` index. Daily cost is therefore
+proportional to the products whose status changed, not the catalog size.
+Edits to expiry dates in between are handled by the product save signal.
+
+Run the ``sweep_expiry_alerts`` command daily from cron, or once with
+``--at HH:MM`` as its own long-running process. Nothing is started from the
+web or worker processes.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .alerts import EXPIRY_ALERT_TYPES, EXPIRY_WARNING_DAYS, AlertChanges, evaluate_alerts
+from .models import Product, SweepWatermark
+
+WATERMARK_NAME = 'expiry_alerts'
+
+
+def changed_on(day):
+    """
+    Products whose expiry status changes on ``day``
+    """
+    return Product.objects.filter(
+        expiry_date__in=[day + timedelta(days=EXPIRY_WARNING_DAYS), day - timedelta(days=1)]
+    ).values_list('pk', flat=True)
+
+
+def sweep_expiry_alerts(today=None, full=False):
+    """
+    Brings expiry alerts up to date for every day since the last sweep and
+    returns the AlertChanges.
+
+    The first sweep (or ``full=True``) evaluates every product inside the
+    warning window. Each later day is claimed by moving the watermark with
+    a conditional update, so concurrent sweeps never process a day twice and
+    an interrupted sweep resumes at the first unfinished day.
+    """
+    today = today or timezone.now().date()
+    changes = AlertChanges()
+    watermark = SweepWatermark.objects.filter(name=WATERMARK_NAME).first()
+
+    if watermark is None or full:
+        product_ids = list(Product.objects.filter(
+            expiry_date__lte=today + timedelta(days=EXPIRY_WARNING_DAYS)
+        ).values_list('pk', flat=True))
+        with transaction.atomic():
+            changes += evaluate_alerts(product_ids, today=today, alert_types=EXPIRY_ALERT_TYPES)
+            SweepWatermark.objects.update_or_create(
+                name=WATERMARK_NAME,
+                defaults={'swept_through': today, 'products_checked': len(product_ids)},
+            )
+        return changes
+
+    day = watermark.swept_through
+    while day < today:
+        day += timedelta(days=1)
+        with transaction.atomic():
+            product_ids = list(changed_on(day))
+            claimed = SweepWatermark.objects.filter(
+                name=WATERMARK_NAME, swept_through=day - timedelta(days=1)
+            ).update(swept_through=day, products_checked=len(product_ids), updated_at=timezone.now())
+            if not claimed:
+                # Another sweep got here first
+                break
+            changes += evaluate_alerts(product_ids, today=today, alert_types=EXPIRY_ALERT_TYPES)
+    return changes
+
+
+def seconds_until(at, now=None):
+    """
+    Seconds from ``now`` until the next local time ``at`` ('HH:MM')
+    """
+    now = now or timezone.localtime()
+    hour, minute = (int(part) for part in at.split(':'))
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
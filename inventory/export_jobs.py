@@ -0,0 +1,192 @@
+"""
+Background CSV export jobs.
+
+Large exports are queued as ExportJob rows and written by the
+run_export_jobs command. Each job walks its queryset in primary-key order
+(keyset pagination, ``pk > last_pk``) and writes every page to its own gzip
+chunk file under ``MEDIA_ROOT/exports/<token>/``. Progress is saved after
+each chunk, so a job that is interrupted resumes from the last finished
+chunk. Concatenated gzip members form a valid gzip stream, so the download
+view just sends the chunks back to back.
+"""
+import gzip
+import logging
+import os
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import Max, Min, Q
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .exports import EXPORTS, csv_blocks, stream_export
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ASYNC_THRESHOLD = 100000
+CHUNK_ROWS = 50000
+STALE_AFTER = timedelta(minutes=10)
+
+
+def async_threshold():
+    return getattr(settings, 'EXPORT_ASYNC_THRESHOLD', DEFAULT_ASYNC_THRESHOLD)
+
+
+def estimate_rows(queryset):
+    """
+    Cheap row estimate. For a whole table this is the primary key span,
+    which takes two index lookups instead of a full COUNT(*).
+    """
+    if queryset.query.has_filters():
+        return queryset.count()
+    span = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    if span['low'] is None:
+        return 0
+    return span['high'] - span['low'] + 1
+
+
+def job_dir(job):
+    return os.path.join(settings.MEDIA_ROOT, 'exports', str(job.token))
+
+
+def chunk_path(job, index):
+    return os.path.join(job_dir(job), f'chunk-{index:05d}.csv.gz')
+
+
+def chunk_paths(job):
+    return [chunk_path(job, index) for index in range(job.chunk_count)]
+
+
+def job_queryset(job):
+    return EXPORTS[job.export].get_queryset().filter(**job.filters)
+
+
+def enqueue_export(name, filters=None, filename=None, user=None, estimated_rows=None):
+    spec = EXPORTS[name]
+    filters = filters or {}
+    if estimated_rows is None:
+        estimated_rows = estimate_rows(spec.get_queryset().filter(**filters))
+    return ExportJob.objects.create(
+        export=name,
+        filters=filters,
+        filename=filename or spec.filename,
+        requested_by=user if user is not None and user.is_authenticated else None,
+        estimated_rows=estimated_rows,
+    )
+
+
+def export_or_enqueue(request, name, filters=None, filename=None):
+    """
+    Streams the export straight away when it is small enough, otherwise
+    queues a job and redirects to its status page
+    """
+    spec = EXPORTS[name]
+    queryset = spec.get_queryset().filter(**(filters or {}))
+    estimated_rows = estimate_rows(queryset)
+    if estimated_rows <= async_threshold():
+        return stream_export(spec, queryset, filename)
+
+    job = enqueue_export(name, filters, filename, request.user, estimated_rows)
+    messages.info(request, f"The export is large and is being prepared in the background (job #{job.pk}).")
+    return redirect(job)
+
+
+def write_chunk(path, header, rows):
+    # Write to a temporary name first so a crash never leaves a partial
+    # chunk under the final name.
+    temp_path = f'{path}.tmp'
+    with gzip.open(temp_path, 'wt', encoding='utf-8', newline='') as chunk:
+        for block in csv_blocks(header, rows):
+            chunk.write(block)
+    os.replace(temp_path, path)
+
+
+def run_export_job(job, chunk_rows=CHUNK_ROWS):
+    """
+    Writes the remaining chunks of a claimed job and marks it completed
+    """
+    spec = EXPORTS[job.export]
+    queryset = job_queryset(job).order_by('pk')
+    os.makedirs(job_dir(job), exist_ok=True)
+
+    while True:
+        page = list(queryset.filter(pk__gt=job.last_pk).values_list('pk', *spec.fields)[:chunk_rows])
+        if not page:
+            break
+        header = spec.header if job.chunk_count == 0 else None
+        write_chunk(chunk_path(job, job.chunk_count), header, (spec.format(row[1:]) for row in page))
+
+        job.last_pk = page[-1][0]
+        job.rows_written += len(page)
+        job.chunk_count += 1
+        job.save(update_fields=['last_pk', 'rows_written', 'chunk_count', 'updated_at'])
+        if len(page) < chunk_rows:
+            break
+
+    if job.chunk_count == 0:
+        # Empty export: still produce a file with the header
+        write_chunk(chunk_path(job, 0), spec.header, [])
+        job.chunk_count = 1
+
+    job.status = 'completed'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at', 'chunk_count', 'updated_at'])
+    return job
+
+
+def claim_job(stale_after=STALE_AFTER):
+    """
+    Claims the oldest queued job, or a running job whose worker has stopped
+    reporting progress. Claims are conditional updates, so several workers
+    can poll the same queue.
+    """
+    now = timezone.now()
+    candidates = ExportJob.objects.filter(
+        Q(status='queued') | Q(status='running', updated_at__lt=now - stale_after)
+    ).order_by('created_at')
+    for job in candidates[:10]:
+        claimed = ExportJob.objects.filter(
+            pk=job.pk, status=job.status, updated_at=job.updated_at
+        ).update(status='running', started_at=job.started_at or now, updated_at=now)
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run_pending_jobs(limit=None, chunk_rows=CHUNK_ROWS, stale_after=STALE_AFTER):
+    """
+    Runs queued jobs until the queue is empty (or ``limit`` jobs have run)
+    and returns the jobs processed
+    """
+    processed = []
+    while limit is None or len(processed) < limit:
+        job = claim_job(stale_after)
+        if job is None:
+            break
+        try:
+            run_export_job(job, chunk_rows)
+        except Exception as e:
+            logger.exception(f"Export job {job.pk} failed")
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        processed.append(job)
+    return processed
+
+
+def purge_jobs(older_than):
+    """
+    Deletes finished jobs created before ``older_than`` along with their files
+    """
+    jobs = ExportJob.objects.filter(status__in=['completed', 'failed'], created_at__lt=older_than)
+    count = 0
+    for job in jobs.iterator():
+        shutil.rmtree(job_dir(job), ignore_errors=True)
+        job.delete()
+        count += 1
+    return count
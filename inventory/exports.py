@@ -0,0 +1,142 @@
+"""
+Streaming CSV exports.
+
+Each export is an ExportSpec: the columns to read with values_list() and how
+to turn a row into CSV values. Rows are read with iterator(chunk_size=...),
+so no model instances are built and nothing is cached, and the CSV is
+streamed to the client as it is produced.
+"""
+import csv
+
+from django.http import StreamingHttpResponse
+
+from orders.models import Customer, Order, OrderItem
+from .models import InventoryAlert, Product, StockMovement
+
+CHUNK_SIZE = 2000
+# Rows are buffered into blocks of roughly this many bytes before being sent
+BLOCK_SIZE = 64 * 1024
+
+
+class Echo:
+    """
+    File-like object whose write() just returns the value, so csv.writer
+    produces strings instead of writing them anywhere
+    """
+
+    def write(self, value):
+        return value
+
+
+def format_datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def blank_if_none(value):
+    return '' if value is None else value
+
+
+class ExportSpec:
+    """
+    Describes one CSV export
+    """
+
+    def __init__(self, name, filename, model, fields, header, transform=None):
+        self.name = name
+        self.filename = filename
+        self.model = model
+        self.fields = fields
+        self.header = header
+        self.transform = transform
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def values(self, queryset=None):
+        queryset = self.get_queryset() if queryset is None else queryset
+        return queryset.order_by('pk').values_list(*self.fields)
+
+    def format(self, row):
+        return self.transform(row) if self.transform else row
+
+    def rows(self, queryset=None, chunk_size=CHUNK_SIZE):
+        for row in self.values(queryset).iterator(chunk_size=chunk_size):
+            yield self.format(row)
+
+
+def csv_blocks(header, rows, block_size=BLOCK_SIZE):
+    """
+    Yields the CSV text for ``rows`` in blocks of about ``block_size`` bytes.
+    The header row is left out when ``header`` is None.
+    """
+    writer = csv.writer(Echo())
+    block = [writer.writerow(header)] if header is not None else []
+    size = sum(len(line) for line in block)
+    for row in rows:
+        line = writer.writerow(row)
+        block.append(line)
+        size += len(line)
+        if size >= block_size:
+            yield ''.join(block)
+            block, size = [], 0
+    if block:
+        yield ''.join(block)
+
+
+def stream_csv(filename, header, rows):
+    response = StreamingHttpResponse(csv_blocks(header, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def stream_export(spec, queryset=None, filename=None):
+    return stream_csv(filename or spec.filename, spec.header, spec.rows(queryset))
+
+
+ORDER_STATUSES = dict(Order.STATUS_CHOICES)
+MOVEMENT_TYPES = dict(StockMovement.MOVEMENT_TYPES)
+ALERT_TYPES = dict(InventoryAlert.ALERT_TYPES)
+
+EXPORTS = {spec.name: spec for spec in [
+    ExportSpec(
+        'orders', 'orders.csv', Order,
+        ('pk', 'customer__name', 'order_date', 'status', 'total'),
+        ['Order ID', 'Customer Name', 'Order Date', 'Status', 'Total'],
+        lambda row: (row[0], row[1], format_datetime(row[2]), ORDER_STATUSES.get(row[3], row[3]), row[4]),
+    ),
+    ExportSpec(
+        'order_items', 'order_items.csv', OrderItem,
+        ('order_id', 'product__name', 'quantity', 'price'),
+        ['Order ID', 'Product Name', 'Quantity', 'Price', 'Total'],
+        lambda row: (*row, row[2] * row[3]),
+    ),
+    ExportSpec(
+        'customers', 'customers.csv', Customer,
+        ('pk', 'name', 'email', 'phone', 'address'),
+        ['Customer ID', 'Name', 'Email', 'Phone', 'Address'],
+    ),
+    ExportSpec(
+        'products', 'products.csv', Product,
+        ('pk', 'name', 'sku', 'category__name', 'supplier__name', 'quantity', 'cost_price', 'unit_price'),
+        ['Product ID', 'Name', 'SKU', 'Category', 'Supplier', 'Quantity', 'Cost Price', 'Selling Price'],
+        lambda row: tuple(blank_if_none(value) for value in row),
+    ),
+    ExportSpec(
+        'stock_movements', 'stock_movements.csv', StockMovement,
+        ('pk', 'product__name', 'movement_type', 'quantity', 'unit_price', 'total_price',
+         'created_by__username', 'created_at'),
+        ['Movement ID', 'Product', 'Movement Type', 'Quantity', 'Unit Price', 'Total Value',
+         'Created By', 'Created At'],
+        lambda row: (row[0], row[1], MOVEMENT_TYPES.get(row[2], row[2]), row[3],
+                     blank_if_none(row[4]), blank_if_none(row[5]), blank_if_none(row[6]),
+                     format_datetime(row[7])),
+    ),
+    ExportSpec(
+        'inventory_alerts', 'inventory_alerts.csv', InventoryAlert,
+        ('pk', 'product__name', 'alert_type', 'threshold', 'resolved_by__username', 'created_at',
+         'is_resolved'),
+        ['Alert ID', 'Product', 'Alert Type', 'Threshold', 'Resolved By', 'Created At', 'Resolved'],
+        lambda row: (row[0], row[1], ALERT_TYPES.get(row[2], row[2]), blank_if_none(row[3]),
+                     blank_if_none(row[4]), format_datetime(row[5]), row[6]),
+    ),
+]}
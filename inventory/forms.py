@@ -65,6 +65,12 @@ class StockMovementForm(forms.ModelForm):
         
         # Only show active products
         self.fields['product'].queryset = Product.objects.filter(is_active=True)
+
+        # A saved movement has already been posted to stock
+        if self.instance.pk:
+            self.fields['product'].queryset = Product.objects.all()
+            for field_name in StockMovement.POSTED_FIELDS:
+                self.fields[field_name].disabled = True
         
         # Set initial unit price from product if available
         if 'product' in self.initial:
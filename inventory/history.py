@@ -0,0 +1,271 @@
+"""
+Daily stock-level history.
+
+StockLevelDay holds one row per product per day that had movements: opening
+and closing quantity, stock in and out, and the quantity moved by each
+movement type. ``record_movements`` folds newly posted movements into those
+rows (an INSERT that is skipped when the row exists, then one UPDATE per
+product-day), so the history stays current without rereading the ledger.
+``record_edit`` does the same for a product's opening quantity and direct
+quantity edits, which count as adjusted stock but not as movements.
+
+``as_of`` answers "how many did we have on that day" with one indexed
+lookup, and ``stock_series`` returns a date range as arrays for charting.
+``rebuild_history`` recomputes the rows from StockMovement. Direct edits
+aren't in the ledger, so it infers them from the gaps: stock a product had
+before its first movement is dated at its creation, a difference between
+one movement's after and the next one's before quantity at the next
+movement, and a difference from the current quantity at the last update.
+"""
+from itertools import groupby
+
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Product, StockLevelDay, StockMovement
+
+TYPE_COLUMNS = {
+    'purchase': 'purchased',
+    'sale': 'sold',
+    'return': 'returned',
+    'adjustment': 'adjusted',
+    'transfer': 'transferred',
+    'loss': 'lost',
+}
+FLOW_COLUMNS = ('inflow', 'outflow', *TYPE_COLUMNS.values(), 'movement_count')
+BATCH_SIZE = 1000
+# The movement type of a direct quantity edit
+EDIT = None
+
+
+def movement_day(created_at):
+    return timezone.localdate(created_at) if timezone.is_aware(created_at) else created_at.date()
+
+
+class DayTotals:
+    """
+    The movements of one product on one day, folded into StockLevelDay
+    columns
+    """
+
+    def __init__(self, opening_quantity):
+        self.opening_quantity = opening_quantity
+        self.closing_quantity = opening_quantity
+        self.flows = dict.fromkeys(FLOW_COLUMNS, 0)
+
+    def add(self, movement_type, quantity, before_quantity, after_quantity):
+        change = after_quantity - before_quantity
+        if change > 0:
+            self.flows['inflow'] += change
+        else:
+            self.flows['outflow'] -= change
+        if movement_type is EDIT:
+            self.flows['adjusted'] += abs(change)
+        else:
+            self.flows[TYPE_COLUMNS[movement_type]] += abs(quantity)
+            self.flows['movement_count'] += 1
+        self.closing_quantity = after_quantity
+
+
+def fold_days(rows):
+    """
+    Folds ``(product_id, movement_type, quantity, before_quantity,
+    after_quantity, created_at)`` rows, in posting order, into
+    ``((product_id, date), DayTotals)`` pairs. A pair is yielded whenever
+    the product-day changes, so interleaved products can yield the same day
+    more than once; applying the pairs in order is still correct.
+    """
+    key = totals = None
+    for product_id, movement_type, quantity, before, after, created_at in rows:
+        row_key = (product_id, movement_day(created_at))
+        if row_key != key:
+            if totals is not None:
+                yield key, totals
+            key, totals = row_key, DayTotals(before)
+        totals.add(movement_type, quantity, before, after)
+    if totals is not None:
+        yield key, totals
+
+
+def apply_day(product_id, date, totals, using=None):
+    """
+    Adds a day's totals to the stored row. The row is first inserted empty
+    if it doesn't exist (a no-op on conflict, so concurrent postings can't
+    both create it), then the totals are added in one UPDATE.
+    """
+    StockLevelDay.objects.using(using).bulk_create([StockLevelDay(
+        product_id=product_id, date=date,
+        opening_quantity=totals.opening_quantity,
+        closing_quantity=totals.opening_quantity,
+    )], ignore_conflicts=True)
+    StockLevelDay.objects.using(using).filter(product_id=product_id, date=date).update(
+        closing_quantity=totals.closing_quantity,
+        **{column: F(column) + value for column, value in totals.flows.items() if value},
+    )
+
+
+def record_movements(movements, using=None):
+    """
+    Adds posted movements (with before/after quantities set) to the history
+    """
+    rows = (
+        (m.product_id, m.movement_type, m.quantity, m.before_quantity, m.after_quantity, m.created_at)
+        for m in movements
+    )
+    for (product_id, date), totals in fold_days(rows):
+        apply_day(product_id, date, totals, using=using)
+
+
+def record_edit(product_id, before_quantity, after_quantity, using=None):
+    """
+    Adds a direct change of a product's quantity (from 0 for a new product)
+    to the history
+    """
+    if before_quantity == after_quantity:
+        return
+    rows = [(product_id, EDIT, after_quantity - before_quantity, before_quantity, after_quantity, timezone.now())]
+    for (product_id, date), totals in fold_days(rows):
+        apply_day(product_id, date, totals, using=using)
+
+
+def open_products(product_ids, using=None):
+    """
+    Records the opening quantity of products created in bulk (bypassing
+    save()) that have no history yet, with one INSERT ... SELECT per batch
+    """
+    connection = connections[using or router.db_for_write(StockLevelDay)]
+    qn = connection.ops.quote_name
+    days, products = StockLevelDay._meta, Product._meta
+    columns = {
+        'product_id': qn(products.pk.column), 'date': '%s', 'opening_quantity': '0',
+        'closing_quantity': qn(products.get_field('quantity').column),
+        **{column: '0' for column in FLOW_COLUMNS},
+    }
+    # Stock quantities are never negative, so the opening is all inflow
+    columns['inflow'] = columns['adjusted'] = columns['closing_quantity']
+    product_ids = list(product_ids)
+    today = days.get_field('date').get_db_prep_value(timezone.localdate(), connection)
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            chunk = product_ids[start:start + BATCH_SIZE]
+            cursor.execute(
+                f"INSERT INTO {qn(days.db_table)} "
+                f"({', '.join(qn(days.get_field(name).column) for name in columns)}) "
+                f"SELECT {', '.join(columns.values())} FROM {qn(products.db_table)} "
+                f"WHERE {qn(products.pk.column)} IN ({', '.join(['%s'] * len(chunk))}) "
+                f"AND {columns['closing_quantity']} != 0 AND NOT EXISTS ("
+                f"SELECT 1 FROM {qn(days.db_table)} WHERE {qn(days.get_field('product').column)} = "
+                f"{qn(products.db_table)}.{qn(products.pk.column)})",
+                [today, *chunk],
+            )
+
+
+def with_edits(products, movements):
+    """
+    Merges ``(pk, quantity, created_at, updated_at)`` product rows with
+    their movement rows (both in product order) and adds the inferred
+    direct edits, in the row format of fold_days
+    """
+    movements = groupby(movements, key=lambda row: row[0])
+    group_id, group = next(movements, (None, None))
+    for product_id, quantity, created_at, updated_at in products:
+        rows = []
+        while group_id is not None and group_id < product_id:
+            group_id, group = next(movements, (None, None))
+        if group_id == product_id:
+            rows = list(group)
+        level = 0
+        for index, row in enumerate(rows):
+            if row[3] != level:
+                at = min(created_at, row[5]) if index == 0 else row[5]
+                yield (product_id, EDIT, row[3] - level, level, row[3], at)
+            yield row
+            level = row[4]
+        if quantity != level:
+            at = max(updated_at, rows[-1][5]) if rows else created_at
+            yield (product_id, EDIT, quantity - level, level, quantity, at)
+
+
+def rebuild_history(product_ids=None, batch_size=BATCH_SIZE):
+    """
+    Recomputes the history from the movement ledger and the products'
+    quantities, and returns the number of rows written
+    """
+    products = Product.objects.all()
+    movements = StockMovement.objects.all()
+    days = StockLevelDay.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+        movements = movements.filter(product_id__in=product_ids)
+        days = days.filter(product_id__in=product_ids)
+    products = products.order_by('pk').values_list(
+        'pk', 'quantity', 'created_at', 'updated_at').iterator(chunk_size=batch_size)
+    rows = movements.order_by('product_id', 'created_at', 'pk').values_list(
+        'product_id', 'movement_type', 'quantity', 'before_quantity', 'after_quantity', 'created_at',
+    ).iterator(chunk_size=batch_size)
+
+    written = 0
+    batch = []
+    with transaction.atomic():
+        days.delete()
+        for (product_id, date), totals in fold_days(with_edits(products, rows)):
+            batch.append(StockLevelDay(
+                product_id=product_id, date=date,
+                opening_quantity=totals.opening_quantity,
+                closing_quantity=totals.closing_quantity,
+                **totals.flows,
+            ))
+            if len(batch) >= batch_size:
+                written += len(StockLevelDay.objects.bulk_create(batch))
+                batch = []
+        written += len(StockLevelDay.objects.bulk_create(batch))
+    return written
+
+
+def as_of(product, date):
+    """
+    Returns the product's quantity at the end of ``date``: the closing
+    quantity of its last day on or before the date, else the opening
+    quantity of its first later day, else (never moved) its current quantity
+    """
+    product_id = getattr(product, 'pk', product)
+    days = StockLevelDay.objects.filter(product_id=product_id)
+    closing = days.filter(date__lte=date).order_by('-date').values_list('closing_quantity', flat=True).first()
+    if closing is not None:
+        return closing
+    opening = days.filter(date__gt=date).order_by('date').values_list('opening_quantity', flat=True).first()
+    if opening is not None:
+        return opening
+    if isinstance(product, Product):
+        return product.quantity
+    return Product.objects.filter(pk=product_id).values_list('quantity', flat=True).first()
+
+
+def stock_series(product, start, end):
+    """
+    Returns the product's daily history from ``start`` to ``end`` inclusive
+    as parallel arrays: 'dates' (ISO strings), 'closing', and one array per
+    flow column. Days without movements carry the previous closing quantity.
+    """
+    product_id = getattr(product, 'pk', product)
+    rows = {
+        row['date']: row for row in StockLevelDay.objects.filter(
+            product_id=product_id, date__range=(start, end),
+        ).values('date', 'closing_quantity', *FLOW_COLUMNS)
+    }
+    level = as_of(product, start - timedelta(days=1))
+    series = {'dates': [], 'closing': [], **{column: [] for column in FLOW_COLUMNS}}
+    day = start
+    while day <= end:
+        row = rows.get(day)
+        if row:
+            level = row['closing_quantity']
+        series['dates'].append(day.isoformat())
+        series['closing'].append(level)
+        for column in FLOW_COLUMNS:
+            series[column].append(row[column] if row else 0)
+        day += timedelta(days=1)
+    return series
@@ -0,0 +1,382 @@
+"""
+Bulk product catalog import.
+
+Rows are streamed from CSV or JSON Lines and upserted on ``sku`` in batches
+with ``bulk_create(update_conflicts=True)``, so a batch costs a handful of
+queries instead of several per product. Categories and suppliers are
+resolved by name through an in-memory cache. Product signals don't fire for
+bulk writes, so the inventory snapshot is rebuilt, alerts are evaluated
+and scan lookups are invalidated once when the import finishes.
+
+Existing products keep their slug and quantity: stock levels only change
+through stock movements.
+"""
+import codecs
+import csv
+import json
+import time
+import uuid
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.utils.text import slugify
+
+from store_manager.caching import bump
+
+from .alerts import evaluate_alerts
+from .history import open_products
+from .models import Category, Product, Supplier
+from .scan import invalidate_products
+from .snapshot import rebuild_snapshot
+from .valuation import sync_products
+
+BATCH_SIZE = 1000
+SKU_PREFIX = 'SKU-'
+# Columns that can be imported, besides sku, category and supplier
+PRODUCT_COLUMNS = (
+    'name', 'description', 'unit_price', 'cost_price', 'quantity', 'reorder_level',
+    'barcode', 'is_active', 'weight', 'dimensions', 'manufacture_date', 'expiry_date',
+    'tax_rate',
+)
+REQUIRED_FOR_NEW = ('name', 'unit_price', 'cost_price')
+TEXT_FIELDS = (models.CharField, models.TextField)
+# Never overwritten on existing products
+CREATE_ONLY = ('quantity',)
+
+
+class ImportReport:
+    """
+    Counts and per-row errors for a catalog import
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.elapsed = 0
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def rows(self):
+        return self.created + self.updated + len(self.errors)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+
+
+class NameCache:
+    """
+    Resolves names to primary keys, loading the table once and creating
+    missing rows on demand. Names match case-insensitively, and for models
+    with a slug also by slug, since a new row with the same slug as an
+    existing one couldn't be created.
+    """
+
+    def __init__(self, model, create=True, defaults=None):
+        self.model = model
+        self.create = create
+        self.defaults = defaults or {}
+        self.by_slug = any(field.name == 'slug' for field in model._meta.fields)
+        self.ids = {}
+        for row in model.objects.values('pk', 'name', *(['slug'] if self.by_slug else [])):
+            self.ids[self.key(row['name'])] = row['pk']
+            if self.by_slug:
+                self.ids.setdefault(row['slug'], row['pk'])
+        self.created = 0
+
+    def key(self, name):
+        return (self.by_slug and slugify(name)) or name.casefold()
+
+    def get(self, name):
+        name = (name or '').strip()
+        if not name:
+            return None
+        key = self.key(name)
+        if key not in self.ids:
+            if not self.create:
+                raise ValueError(f"Unknown {self.model._meta.verbose_name} {name!r}")
+            max_length = self.model._meta.get_field('name').max_length
+            if len(name) > max_length:
+                raise ValueError(f"{self.model._meta.verbose_name} name is longer than {max_length} characters")
+            # Known to be missing, so no lookup first. The savepoint keeps
+            # the batch usable if another import created it meanwhile.
+            try:
+                with transaction.atomic():
+                    pk = self.model.objects.create(name=name, **self.defaults).pk
+                self.created += 1
+            except IntegrityError as e:
+                pk = self.model.objects.filter(name=name).values_list('pk', flat=True).first()
+                if pk is None:
+                    raise ValueError(f"Cannot create {self.model._meta.verbose_name} {name!r}: {e}")
+            self.ids[key] = pk
+        return self.ids[key]
+
+
+def read_csv(uploaded_file):
+    reader = csv.DictReader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+    if 'sku' not in (reader.fieldnames or []) and 'name' not in (reader.fieldnames or []):
+        raise ValidationError("The file needs at least a sku or name column")
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(uploaded_file):
+    for line_number, line in enumerate(codecs.iterdecode(uploaded_file, 'utf-8-sig'), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, e
+            continue
+        yield line_number, row if isinstance(row, dict) else ValueError("Each line must be a JSON object")
+
+
+def read_rows(uploaded_file, file_format=None):
+    """
+    Yields ``(line_number, row)`` pairs; ``file_format`` is 'csv' or 'jsonl'
+    and defaults to the file extension
+    """
+    if file_format is None:
+        name = getattr(uploaded_file, 'name', '') or ''
+        file_format = 'jsonl' if name.endswith(('.jsonl', '.ndjson')) else 'csv'
+    if file_format == 'jsonl':
+        return read_jsonl(uploaded_file)
+    if file_format == 'csv':
+        return read_csv(uploaded_file)
+    raise ValidationError(f"Unsupported format {file_format!r}")
+
+
+def normalize_sku(sku):
+    """
+    Product.save() replaces SKUs without the ``SKU-`` prefix, so imported
+    SKUs get the prefix up front and keep matching on later imports
+    """
+    sku = str(sku or '').strip()
+    if sku and not sku.startswith(SKU_PREFIX):
+        sku = SKU_PREFIX + sku
+    return sku
+
+
+def make_slug(name, sku):
+    max_length = Product._meta.get_field('slug').max_length
+    suffix = slugify(sku)[:max_length // 2]
+    return f"{slugify(name)[:max_length - len(suffix) - 1].rstrip('-')}-{suffix}".strip('-')
+
+
+def parse_row(row, categories, suppliers):
+    """
+    Converts a raw row into ``(sku, values)`` where values holds only the
+    columns present in the row, converted to Python types
+    """
+    values = {}
+    for column in PRODUCT_COLUMNS:
+        raw = row.get(column)
+        field = Product._meta.get_field(column)
+        if isinstance(raw, str):
+            raw = raw.strip()
+        if raw is None:
+            continue
+        if raw == '':
+            # A blank cell clears an optional column and is ignored for
+            # required ones
+            if field.null:
+                values[column] = None
+            elif field.blank and isinstance(field, TEXT_FIELDS):
+                values[column] = ''
+            continue
+        try:
+            values[column] = field.to_python(raw)
+        except ValidationError as e:
+            raise ValueError(f"{column}: {'; '.join(e.messages)}")
+        max_length = getattr(field, 'max_length', None)
+        if max_length and isinstance(values[column], str) and len(values[column]) > max_length:
+            raise ValueError(f"{column} is longer than {max_length} characters")
+
+    for column in ('quantity', 'reorder_level'):
+        if values.get(column, 0) < 0:
+            raise ValueError(f"{column} cannot be negative")
+    if 'unit_price' in values and 'cost_price' in values and values['unit_price'] < values['cost_price']:
+        raise ValueError("Unit price cannot be less than cost price")
+
+    if str(row.get('category') or '').strip():
+        values['category_id'] = categories.get(row['category'])
+    if str(row.get('supplier') or '').strip():
+        values['supplier_id'] = suppliers.get(row['supplier'])
+
+    sku = normalize_sku(row.get('sku'))
+    if len(sku) > Product._meta.get_field('sku').max_length:
+        raise ValueError("sku is too long")
+    return sku, values
+
+
+def existing_placeholder(sku, values):
+    """
+    Builds the row to upsert for an existing product. Columns the row
+    didn't provide aren't updated, but the INSERT half of the upsert still
+    has to satisfy NOT NULL and unique constraints, so they get throwaway
+    values.
+    """
+    product = Product(sku=sku, slug=uuid.uuid4().hex, **values)
+    for field in Product._meta.concrete_fields:
+        if not field.null and not field.primary_key and getattr(product, field.attname) is None:
+            setattr(product, field.attname, 0)
+    return product
+
+
+class CatalogImporter:
+    """
+    Upserts products in batches and keeps the bookkeeping needed to finish
+    the import (snapshot rebuild, alert evaluation and scan invalidation)
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, create_missing=True):
+        self.batch_size = batch_size
+        self.categories = NameCache(Category, create_missing)
+        self.suppliers = NameCache(Supplier, create_missing)
+        self.report = ImportReport()
+        self.touched_ids = []
+        # SKUs and barcodes written, whose cached scan misses are now stale
+        self.touched_codes = set()
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                self.import_batch(batch)
+        self.finish()
+        return self.report
+
+    def import_batch(self, batch):
+        # Later rows for the same SKU win, as they would across batches
+        parsed = {}
+        new_rows = []
+        for line, row in batch:
+            if isinstance(row, Exception):
+                self.report.add_error(line, str(row))
+                continue
+            try:
+                sku, values = parse_row(row, self.categories, self.suppliers)
+            except ValueError as e:
+                self.report.add_error(line, str(e))
+                continue
+            if sku:
+                parsed[sku] = (line, values)
+            else:
+                new_rows.append((line, values))
+
+        existing = set(Product.objects.filter(sku__in=list(parsed)).values_list('sku', flat=True))
+        # (product, columns the row provided) pairs
+        rows = []
+        temporary_skus = []
+        for sku, (line, values) in parsed.items():
+            if sku in existing:
+                rows.append((existing_placeholder(sku, values), frozenset(values)))
+            elif self.check_new(line, values):
+                rows.append((Product(sku=sku, slug=make_slug(values['name'], sku), **values), frozenset(values)))
+        for line, values in new_rows:
+            if self.check_new(line, values):
+                # Replaced by SKU-<id> once the row has an id
+                sku = f"{SKU_PREFIX}TMP-{uuid.uuid4().hex}"
+                temporary_skus.append(sku)
+                rows.append((Product(sku=sku, slug=sku.lower(), **values), frozenset(values)))
+
+        self.avoid_slug_clashes([product for product, _ in rows if product.sku not in existing])
+        self.upsert(rows)
+        self.touched_codes.update(code for product, _ in rows for code in (product.sku, product.barcode))
+        self.replace_temporary_skus(temporary_skus)
+
+        self.report.created += len(rows) - len(existing)
+        self.report.updated += len(existing)
+
+    def check_new(self, line, values):
+        missing = [column for column in REQUIRED_FOR_NEW if column not in values]
+        if missing:
+            self.report.add_error(line, f"New product is missing {', '.join(missing)}")
+            return False
+        return True
+
+    def avoid_slug_clashes(self, new_products):
+        taken = set(Product.objects.filter(
+            slug__in=[product.slug for product in new_products]).values_list('slug', flat=True))
+        for product in new_products:
+            if product.slug in taken:
+                product.slug = f"{product.slug[:40]}-{uuid.uuid4().hex[:8]}"
+
+    def upsert(self, rows):
+        """
+        Groups products by the columns their rows provided, so an update
+        never blanks a column the row didn't mention, and upserts each group
+        in one statement
+        """
+        groups = {}
+        for product, columns in rows:
+            groups.setdefault(columns, []).append(product)
+
+        products = []
+        for columns, group in groups.items():
+            update_fields = [
+                column for column in (*PRODUCT_COLUMNS, 'category', 'supplier')
+                if (column in columns or f'{column}_id' in columns) and column not in CREATE_ONLY
+            ]
+            Product.objects.bulk_create(
+                group,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=update_fields + ['updated_at'],
+            )
+            products.extend(group)
+        if products:
+            self.touched_ids.extend(self.product_ids(products))
+
+    def product_ids(self, products):
+        if all(product.pk for product in products):
+            return [product.pk for product in products]
+        return list(Product.objects.filter(
+            sku__in=[product.sku for product in products]).values_list('pk', flat=True))
+
+    def replace_temporary_skus(self, temporary_skus):
+        if not temporary_skus:
+            return
+        products = list(Product.objects.filter(sku__in=temporary_skus).only('pk', 'name'))
+        for product in products:
+            product.sku = f"{SKU_PREFIX}{product.pk:04d}"
+            product.slug = make_slug(product.name, product.sku)
+        self.avoid_slug_clashes(products)
+        Product.objects.bulk_update(products, ['sku', 'slug'], batch_size=self.batch_size)
+        self.touched_codes.update(product.sku for product in products)
+
+    def finish(self):
+        """
+        Brings the snapshot, valuation, stock history, alerts and scan
+        lookups up to date for everything imported
+        """
+        rebuild_snapshot()
+        sync_products(self.touched_ids)
+        open_products(self.touched_ids)
+        evaluate_alerts(self.touched_ids)
+        invalidate_products(self.touched_ids, self.touched_codes)
+        bump('inventory')
+        self.report.finish()
+
+
+def import_products(uploaded_file, file_format=None, batch_size=BATCH_SIZE, create_missing=True):
+    """
+    Imports a product catalog from a CSV or JSON Lines file and returns an
+    ImportReport
+    """
+    importer = CatalogImporter(batch_size=batch_size, create_missing=create_missing)
+    return importer.run(read_rows(uploaded_file, file_format))
@@ -0,0 +1,147 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from inventory.categories import ancestors, descendants, rebuild_closure
+from inventory.models import Category, CategoryClosure, Product
+from inventory.rollups import subtree_rollups
+from inventory.snapshot import rebuild_snapshot
+
+SLUG_PREFIX = 'bench-tree-'
+SKU_PREFIX = 'SKU-TREE-'
+LEVELS = 8
+
+
+def level_sizes(nodes, levels=LEVELS):
+    """
+    Level sizes growing geometrically from 10 roots to ``nodes`` in total
+    """
+    growth = 1.0
+    while sum(10 * (growth ** level) for level in range(levels)) < nodes:
+        growth += 0.01
+    sizes = [max(1, int(10 * growth ** level)) for level in range(levels)]
+    sizes[-1] += nodes - sum(sizes)
+    return sizes
+
+
+def recursive_children(category):
+    # The old Category.get_all_children(): one query per node
+    children = []
+    for child in category.children.all():
+        children.append(child)
+        children.extend(recursive_children(child))
+    return children
+
+
+def parent_walk(category):
+    # One query per level
+    path = []
+    while category.parent_id:
+        category = Category.objects.get(pk=category.parent_id)
+        path.insert(0, category)
+    return path
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds a synthetic category tree and compares subtree, ancestor and subtree-product "
+        "queries between recursive parent walks and the closure table"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=10000)
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--samples', type=int, default=20, help="Categories timed per level")
+
+    def handle(self, *args, **options):
+        self.delete_tree()
+        try:
+            levels = self.seed(options['nodes'], options['products'])
+            rng = random.Random(3)
+            self.stdout.write(f"{'query':<28} {'level':>5} {'old p50':>10} {'new p50':>10}")
+            for depth in (0, 3, 6):
+                sample = rng.sample(levels[depth], min(options['samples'], len(levels[depth])))
+                self.compare('descendants', depth, sample,
+                             recursive_children, lambda c: list(descendants(c)))
+                self.compare('subtree product count', depth, sample,
+                             lambda c: Product.objects.filter(
+                                 category__in=[c.pk] + [d.pk for d in recursive_children(c)]).count(),
+                             subtree_rollups)
+            leaves = rng.sample(levels[-1], min(options['samples'], len(levels[-1])))
+            self.compare('ancestors', LEVELS - 1, leaves, parent_walk, ancestors)
+            self.time_maintenance(levels, rng)
+        finally:
+            self.delete_tree()
+
+    def compare(self, label, depth, categories, old, new):
+        old_times = [self.time_call(old, category) for category in categories]
+        new_times = [self.time_call(new, category) for category in categories]
+        self.stdout.write(
+            f"{label:<28} {depth:>5} {statistics.median(old_times):>8.2f}ms "
+            f"{statistics.median(new_times):>8.2f}ms")
+
+    def time_call(self, function, category):
+        began = time.perf_counter()
+        function(category)
+        return (time.perf_counter() - began) * 1000
+
+    def time_maintenance(self, levels, rng):
+        parent = rng.choice(levels[-2])
+        began = time.perf_counter()
+        Category.objects.create(name=f"{SLUG_PREFIX}leaf", slug=f"{SLUG_PREFIX}leaf", parent=parent)
+        created = (time.perf_counter() - began) * 1000
+
+        moved = rng.choice(levels[1])
+        size = CategoryClosure.objects.filter(ancestor=moved).count()
+        moved.parent = rng.choice([c for c in levels[0] if c.pk != moved.parent_id])
+        began = time.perf_counter()
+        moved.save()
+        reparented = (time.perf_counter() - began) * 1000
+        self.stdout.write(f"create leaf: {created:.2f}ms, move a {size}-node subtree: {reparented:.1f}ms")
+
+    def seed(self, nodes, products):
+        rng = random.Random(11)
+        began = time.perf_counter()
+        levels = []
+        for depth, size in enumerate(level_sizes(nodes)):
+            batch = [
+                Category(name=f"{SLUG_PREFIX}{depth}-{i}", slug=f"{SLUG_PREFIX}{depth}-{i}",
+                         parent=rng.choice(levels[-1]) if levels else None)
+                for i in range(size)
+            ]
+            with transaction.atomic():
+                levels.append(Category.objects.bulk_create(batch))
+        rows = rebuild_closure()
+        self.stdout.write(
+            f"Tree: {nodes:,} categories on {LEVELS} levels {[len(level) for level in levels]}, "
+            f"{rows:,} closure rows, built in {time.perf_counter() - began:.1f}s")
+
+        all_categories = [category for level in levels for category in level]
+        batch = []
+        for i in range(products):
+            sku = f"{SKU_PREFIX}{i:07d}"
+            batch.append(Product(
+                name=f"Tree product {i}", slug=sku.lower(), sku=sku, unit_price=10, cost_price=5,
+                quantity=rng.randrange(100), category=rng.choice(all_categories)))
+            if len(batch) == 10000 or i == products - 1:
+                with transaction.atomic():
+                    Product.objects.bulk_create(batch)
+                batch = []
+        return levels
+
+    def delete_tree(self):
+        # Raw deletes: the synthetic rows have no movements, valuations or
+        # alerts, and the ORM would load every row for the delete signals.
+        categories = Category._meta.db_table
+        bench_ids = f"SELECT id FROM {categories} WHERE slug LIKE %s"
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Product._meta.db_table} WHERE sku LIKE %s", [f"{SKU_PREFIX}%"])
+            cursor.execute(
+                f"DELETE FROM {CategoryClosure._meta.db_table} WHERE descendant_id IN ({bench_ids})",
+                [f"{SLUG_PREFIX}%"])
+            cursor.execute(f"UPDATE {categories} SET parent_id = NULL WHERE slug LIKE %s", [f"{SLUG_PREFIX}%"])
+            cursor.execute(f"DELETE FROM {categories} WHERE slug LIKE %s", [f"{SLUG_PREFIX}%"])
+        rebuild_snapshot()
@@ -0,0 +1,105 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from inventory.models import Product
+from inventory.search import get_search_backend, search_products
+from inventory.snapshot import rebuild_snapshot
+
+SKU_PREFIX = 'SKU-BENCH-'
+ADJECTIVES = ['wireless', 'compact', 'premium', 'portable', 'smart', 'heavy', 'mini', 'pro',
+              'classic', 'digital', 'organic', 'steel', 'cotton', 'solar', 'rapid', 'silent']
+NOUNS = ['mouse', 'keyboard', 'laptop', 'stand', 'lamp', 'charger', 'speaker', 'monitor',
+         'kettle', 'blender', 'backpack', 'bottle', 'drill', 'router', 'camera', 'printer',
+         'headphones', 'tripod', 'scanner', 'heater']
+BRANDS = ['Acme', 'Zenith', 'Orbit', 'Nimbus', 'Vertex', 'Kilima', 'Savanna', 'Tusker']
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic catalog and compares product search latency (count + first page) "
+        "between the old icontains filter and the configured search backend"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=100, help="Queries per search kind")
+        parser.add_argument('--keep', action='store_true',
+                            help="Keep the synthetic catalog for the next run")
+
+    def handle(self, *args, **options):
+        size = options['products']
+        existing = Product.objects.filter(sku__startswith=SKU_PREFIX).count()
+        if existing != size:
+            self.delete_catalog()
+            self.seed(size)
+
+        rng = random.Random(42)
+        kinds = {
+            'word': lambda: rng.choice(NOUNS),
+            'two words': lambda: f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}",
+            'word prefix': lambda: rng.choice(NOUNS)[:4],
+            'exact sku': lambda: f"{SKU_PREFIX}{rng.randrange(size):07d}",
+            'exact barcode': lambda: f"{rng.randrange(size):012d}",
+        }
+        self.stdout.write(f"Catalog: {size:,} products, backend: {type(get_search_backend()).__name__}")
+        self.stdout.write(f"{'query':<14} {'old p50':>10} {'old p99':>10} {'new p50':>10} {'new p99':>10}")
+        try:
+            for kind, make_term in kinds.items():
+                terms = [make_term() for _ in range(options['queries'])]
+                old = [self.time_query(self.icontains(term)) for term in terms]
+                new = [self.time_query(search_products(Product.objects.all(), term)) for term in terms]
+                self.stdout.write(
+                    f"{kind:<14} {statistics.median(old):>8.1f}ms {percentile(old, 0.99):>8.1f}ms "
+                    f"{statistics.median(new):>8.1f}ms {percentile(new, 0.99):>8.1f}ms")
+        finally:
+            if not options['keep']:
+                self.delete_catalog()
+
+    def icontains(self, term):
+        return Product.objects.filter(
+            Q(name__icontains=term) |
+            Q(sku__icontains=term) |
+            Q(barcode__icontains=term)).order_by('name')
+
+    def time_query(self, queryset):
+        # What the paginated product list does: a count plus the first page
+        began = time.perf_counter()
+        queryset.count()
+        list(queryset[:25])
+        return (time.perf_counter() - began) * 1000
+
+    def seed(self, size):
+        rng = random.Random(7)
+        began = time.perf_counter()
+        batch = []
+        for i in range(size):
+            name = f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i % 997}"
+            sku = f"{SKU_PREFIX}{i:07d}"
+            batch.append(Product(
+                name=name, slug=sku.lower(), sku=sku, barcode=f"{i:012d}",
+                description=f"{name} by {rng.choice(BRANDS)}", unit_price=10, cost_price=5,
+                quantity=rng.randrange(100)))
+            if len(batch) == 10000 or i == size - 1:
+                with transaction.atomic():
+                    Product.objects.bulk_create(batch)
+                batch = []
+        rebuild_snapshot()
+        self.stdout.write(f"Seeded {size:,} products in {time.perf_counter() - began:.0f}s")
+
+    def delete_catalog(self):
+        # Raw delete: the synthetic rows have no alerts or movements, and
+        # going through the ORM would load every row for the delete signals.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {Product._meta.db_table} WHERE sku LIKE %s", [f"{SKU_PREFIX}%"])
+        rebuild_snapshot()
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from inventory.models import Product, StockMovement
+
+
+class Command(BaseCommand):
+    help = "Posts concurrent sales against one SKU and checks that no stock updates are lost"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--sales', type=int, default=250, help="Sales posted by each thread")
+        parser.add_argument('--keep', action='store_true', help="Keep the benchmark product afterwards")
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        sales = options['sales']
+        total = threads * sales
+
+        product = Product.objects.create(
+            name=f"Stock posting benchmark {int(time.time())}",
+            unit_price=10,
+            cost_price=5,
+            quantity=total,
+            reorder_level=0,
+        )
+        errors = []
+        start = threading.Barrier(threads + 1)
+
+        def worker():
+            try:
+                local_product = Product.objects.get(pk=product.pk)
+                start.wait()
+                for _ in range(sales):
+                    StockMovement(product=local_product, movement_type='sale', quantity=1).save()
+            except Exception as e:  # reported after the run
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        try:
+            if errors:
+                raise CommandError(f"{len(errors)} worker(s) failed: {errors[0]!r}")
+
+            product.refresh_from_db()
+            movements = StockMovement.objects.filter(product=product)
+            snapshots = sorted(movements.values_list('after_quantity', flat=True))
+
+            self.stdout.write(f"Threads: {threads}, sales per thread: {sales}")
+            self.stdout.write(f"Final quantity: {product.quantity} (expected 0)")
+            self.stdout.write(f"Movements recorded: {len(snapshots)} (expected {total})")
+            self.stdout.write(f"Throughput: {total / elapsed:,.0f} postings/sec ({elapsed:.2f}s)")
+
+            # Every posting must have seen its own snapshot: after-quantities
+            # are exactly total-1 .. 0 with no duplicates.
+            if product.quantity != 0 or snapshots != list(range(total)):
+                raise CommandError("Lost updates detected")
+            self.stdout.write(self.style.SUCCESS("No lost updates"))
+        finally:
+            if not options['keep']:
+                product.delete()
@@ -0,0 +1,86 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store_manager.benchmarks import RENDER_ROWS, SCENARIOS, compare_reports, run_benchmarks, run_render_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests the key views and exports through the test client and records queries, "
+        "wall time and peak memory per scenario, optionally comparing with an earlier run"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', dest='scenarios', metavar='NAME',
+                            help="Only run this scenario (repeatable); "
+                                 f"one of {', '.join(s.name for s in SCENARIOS)}")
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc run")
+        parser.add_argument('--cached', action='store_true',
+                            help="Leave the response cache on, timing cached report and dashboard pages")
+        parser.add_argument('--render', action='store_true',
+                            help=f"Also time rendering a {RENDER_ROWS}-row page of the product, order and "
+                                 "customer lists, with cold and warm row caches")
+        parser.add_argument('--output', metavar='PATH', help="Write the JSON report here")
+        parser.add_argument('--compare', metavar='PATH', help="An earlier JSON report to compare with")
+        parser.add_argument('--max-slowdown', type=float,
+                            help="With --compare, fail when a scenario's p50 grows by more than this "
+                                 "factor or it runs more queries")
+
+    def handle(self, *args, **options):
+        scenarios = SCENARIOS
+        if options['scenarios']:
+            by_name = {scenario.name: scenario for scenario in SCENARIOS}
+            unknown = set(options['scenarios']) - set(by_name)
+            if unknown:
+                raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+            scenarios = [by_name[name] for name in options['scenarios']]
+
+        self.stdout.write(f"{'scenario':<24} {'status':>6} {'queries':>7} {'p50 ms':>9} {'p95 ms':>9} "
+                          f"{'peak KB':>9} {'bytes':>11}")
+        report = run_benchmarks(
+            scenarios, iterations=options['iterations'], warmup=options['warmup'],
+            measure_memory=not options['no_memory'], log=self.write_result,
+            cache_responses=options['cached'])
+        self.stdout.write(f"Dataset: {', '.join(f'{label} {count:,}' for label, count in report['dataset'].items())}")
+        if options['render']:
+            self.stdout.write(f"\n{'render':<24} {'rows':>6} {'cold ms':>9} {'warm ms':>9} {'queries':>9}")
+            report['render'] = run_render_benchmarks(iterations=options['iterations'], log=self.write_render)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+        if options['compare']:
+            self.compare(report, options['compare'], options['max_slowdown'])
+
+    def write_result(self, name, result):
+        if 'wall_ms' not in result:
+            self.stdout.write(f"{name:<24} {result.get('error') or result.get('skipped')}")
+            return
+        peak = result['peak_memory_kb']
+        self.stdout.write(
+            f"{name:<24} {result['status']:>6} {result['queries']:>7} {result['wall_ms']['p50']:>9.1f} "
+            f"{result['wall_ms']['p95']:>9.1f} {'-' if peak is None else peak:>9} {result['response_bytes']:>11,}")
+
+    def write_render(self, name, result):
+        self.stdout.write(
+            f"{name:<24} {result['rows']:>6} {result['cold_ms']['p50']:>9.1f} {result['warm_ms']['p50']:>9.1f} "
+            f"{result['cold_queries']:>4}->{result['warm_queries']:<4}")
+
+    def compare(self, report, path, max_slowdown):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        self.stdout.write(f"\nAgainst {baseline.get('commit') or path}:")
+        self.stdout.write(f"{'scenario':<24} {'was ms':>9} {'now ms':>9} {'ratio':>6} {'queries':>9}")
+        regressions = []
+        for name, old, new, ratio, old_queries, new_queries in compare_reports(baseline, report):
+            self.stdout.write(
+                f"{name:<24} {old:>9.1f} {new:>9.1f} {'-' if ratio is None else f'{ratio:.2f}':>6} "
+                f"{old_queries:>4}->{new_queries:<4}")
+            if max_slowdown and ((ratio or 0) > max_slowdown or new_queries > old_queries):
+                regressions.append(name)
+        if regressions:
+            raise CommandError(f"Regressed: {', '.join(regressions)}")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from inventory.alerts import EXPIRY_ALERT_TYPES, MANAGED_ALERT_TYPES, STOCK_ALERT_TYPES, evaluate_alerts
+
+ALERT_TYPE_SETS = {
+    'all': MANAGED_ALERT_TYPES,
+    'stock': STOCK_ALERT_TYPES,
+    'expiry': EXPIRY_ALERT_TYPES,
+}
+
+
+class Command(BaseCommand):
+    help = "Evaluates stock and expiry alerts for the whole catalog (or some products) in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', nargs='+', type=int, metavar='ID',
+                            help="Only evaluate these product ids")
+        parser.add_argument('--rules', choices=sorted(ALERT_TYPE_SETS), default='all',
+                            help="Which alert rules to evaluate")
+
+    def handle(self, *args, **options):
+        changes = evaluate_alerts(options['products'], alert_types=ALERT_TYPE_SETS[options['rules']])
+        self.stdout.write(self.style.SUCCESS(f"Inventory alerts: {changes}"))
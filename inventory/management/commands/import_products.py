@@ -0,0 +1,42 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.importers import BATCH_SIZE, import_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports or updates products from a CSV or JSON Lines catalog, matching on SKU. "
+        "Existing products keep their slug and stock quantity."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Catalog file (.csv, .jsonl)")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows per upsert batch")
+        parser.add_argument('--no-create', action='store_true',
+                            help="Reject rows with unknown categories or suppliers instead of creating them")
+        parser.add_argument('--max-errors', type=int, default=50, help="Number of row errors to print")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as catalog:
+                report = import_products(
+                    catalog,
+                    file_format=options['format'],
+                    batch_size=options['batch_size'],
+                    create_missing=not options['no_create'],
+                )
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+        except ValidationError as e:
+            raise CommandError(e.message)
+
+        for line, message in report.errors[:options['max_errors']]:
+            self.stdout.write(self.style.WARNING(f"Line {line}: {message}"))
+        if len(report.errors) > options['max_errors']:
+            self.stdout.write(f"... and {len(report.errors) - options['max_errors']} more error(s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.rows} rows in {report.elapsed:.2f}s ({report.rows_per_second:.0f} rows/s): "
+            f"{report.created} created, {report.updated} updated, {len(report.errors)} skipped"))
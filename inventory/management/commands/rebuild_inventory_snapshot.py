@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.snapshot import get_snapshot, rebuild_snapshot, snapshot_drift
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the inventory snapshot from the products table, or checks it for drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report drift; exit with an error if the snapshot is out of date")
+
+    def handle(self, *args, **options):
+        drift = snapshot_drift(get_snapshot())
+        for field, (stored, actual) in drift.items():
+            self.stdout.write(f"{field}: stored {stored}, actual {actual}")
+
+        if options['check']:
+            if drift:
+                raise CommandError(f"Inventory snapshot has drifted on {len(drift)} field(s)")
+            self.stdout.write(self.style.SUCCESS("Inventory snapshot is up to date"))
+            return
+
+        snapshot = rebuild_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt inventory snapshot: {snapshot.total_products} products, "
+            f"value {snapshot.total_value}"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from inventory.valuation import rebuild_valuation, total_value, valuation_method
+
+
+class Command(BaseCommand):
+    help = ("Recomputes product valuations and value rollups from the stock movement ledger. "
+            "Run once on deploy: until then stock is valued at current cost price.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', nargs='+', type=int, metavar='ID',
+                            help="Only rebuild these product ids")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        valued = rebuild_valuation(options['products'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Valued {valued} products ({valuation_method()}): total {total_value()}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from inventory.history import rebuild_history
+
+
+class Command(BaseCommand):
+    help = "Recomputes the daily stock history from the stock movement ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', nargs='+', type=int, metavar='ID',
+                            help="Only rebuild these product ids")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = rebuild_history(options['products'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Stock history rebuilt: {written} product-days"))
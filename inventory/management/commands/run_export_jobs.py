@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.export_jobs import CHUNK_ROWS, purge_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Runs queued CSV export jobs, resuming any that were interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling for new jobs instead of exiting when the queue is empty")
+        parser.add_argument('--poll', type=float, default=5, help="Seconds between polls with --loop")
+        parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="Rows per chunk file")
+        parser.add_argument('--stale-minutes', type=int, default=10,
+                            help="Resume running jobs that have made no progress for this long")
+        parser.add_argument('--purge-days', type=int,
+                            help="Also delete finished jobs and their files older than this many days")
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options['stale_minutes'])
+        if options['purge_days'] is not None:
+            purged = purge_jobs(timezone.now() - timedelta(days=options['purge_days']))
+            self.stdout.write(f"Purged {purged} old export job(s)")
+
+        while True:
+            for job in run_pending_jobs(chunk_rows=options['chunk_rows'], stale_after=stale_after):
+                style = self.style.SUCCESS if job.status == 'completed' else self.style.ERROR
+                self.stdout.write(style(
+                    f"Export job {job.pk} ({job.export}): {job.status}, "
+                    f"{job.rows_written} rows in {job.chunk_count} chunk(s)"))
+            if not options['loop']:
+                break
+            time.sleep(options['poll'])
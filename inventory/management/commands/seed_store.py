@@ -0,0 +1,50 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from store_manager.seed import DEFAULT_PREFIX, SeedConfig, clear_seed, seed_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a reproducible synthetic store (catalog, stock movements, customers and orders) "
+        "with bulk inserts, then rebuilds the summary tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--movements', type=int, help="Default: 10 per product")
+        parser.add_argument('--orders', type=int, help="Default: 2 per product")
+        parser.add_argument('--customers', type=int, help="Default: 1 per 10 products")
+        parser.add_argument('--categories', type=int, help="Default: 1 per 500 products, at least 10")
+        parser.add_argument('--suppliers', type=int, help="Default: 1 per 2000 products, at least 5")
+        parser.add_argument('--items-per-order', type=int, default=3, help="Average items per order")
+        parser.add_argument('--days', type=int, default=365, help="Days of movement and order history")
+        parser.add_argument('--until', type=date.fromisoformat,
+                            help="Last day of the history (YYYY-MM-DD), default today. "
+                                 "Fix it to reproduce a dataset on another day.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default=DEFAULT_PREFIX,
+                            help="Marks the seeded SKUs, category slugs and email domain")
+        parser.add_argument('--replace', action='store_true',
+                            help="Delete the rows seeded with this prefix first")
+        parser.add_argument('--clear', action='store_true',
+                            help="Only delete the rows seeded with this prefix")
+        parser.add_argument('--skip-summaries', action='store_true',
+                            help="Don't rebuild the summary tables afterwards")
+
+    def handle(self, *args, **options):
+        if options['clear'] or options['replace']:
+            deleted = clear_seed(options['prefix'])
+            self.stdout.write(f"Deleted {deleted:,} seeded rows")
+            if options['clear']:
+                return
+
+        config = SeedConfig(
+            products=options['products'], movements=options['movements'], orders=options['orders'],
+            customers=options['customers'], categories=options['categories'],
+            suppliers=options['suppliers'], items_per_order=options['items_per_order'],
+            days=options['days'], seed=options['seed'], until=options['until'], prefix=options['prefix'],
+        )
+        seed_store(config, log=self.stdout.write, derived=not options['skip_summaries'])
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,44 @@
+import time
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.expiry import seconds_until, sweep_expiry_alerts
+
+
+class Command(BaseCommand):
+    help = (
+        "Raises and updates expiring/expired product alerts for the days since the last sweep. "
+        "Run it daily from cron, or with --at to keep running and sweep every day at that time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Sweep as of this date (YYYY-MM-DD) instead of today")
+        parser.add_argument('--full', action='store_true',
+                            help="Ignore the watermark and re-evaluate every product in the warning window")
+        parser.add_argument('--at', metavar='HH:MM',
+                            help="Stay running and sweep every day at this local time")
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date {options['date']!r}, expected YYYY-MM-DD")
+
+        self.sweep(today, options['full'])
+        if not options['at']:
+            return
+
+        try:
+            datetime.strptime(options['at'], '%H:%M')
+        except ValueError:
+            raise CommandError(f"Invalid time {options['at']!r}, expected HH:MM")
+        while True:
+            time.sleep(seconds_until(options['at']))
+            self.sweep(None, False)
+
+    def sweep(self, today, full):
+        changes = sweep_expiry_alerts(today=today, full=full)
+        self.stdout.write(self.style.SUCCESS(f"Expiry alerts: {changes}"))
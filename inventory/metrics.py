@@ -0,0 +1,77 @@
+"""
+Inventory summary figures in a single query.
+
+``product_metrics`` computes the figures below over a product queryset
+with conditional aggregates, so a page's counters cost one query rather
+than a count() each:
+
+``total_products``
+    Products in the set.
+``out_of_stock``
+    Products with nothing on hand.
+``low_stock``
+    Products at or below their reorder level.
+``stock_units``
+    Units on hand.
+``total_value``
+    Only when a ``value`` expression is given, summed over the products
+    (e.g. ``'valuation__value'`` for historical cost).
+
+With ``group_by`` the same figures come back per group, e.g. per category,
+and ``combine`` adds the groups up into the overall figures, so a breakdown
+and its totals share one query. ``filter_products`` applies the category
+and stock-status filters the dashboards and reports accept.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, F, Q, Sum
+
+OUT_OF_STOCK = Q(quantity=0)
+LOW_STOCK = Q(quantity__lte=F('reorder_level'))
+STOCK_STATUSES = {'out_of_stock': OUT_OF_STOCK, 'low_stock': LOW_STOCK}
+METRIC_FIELDS = ('total_products', 'out_of_stock', 'low_stock', 'stock_units')
+
+
+def filter_products(products, category=None, stock_status=None):
+    """
+    Narrows a product queryset to a category (by id) and a stock status
+    (a key of STOCK_STATUSES; anything else is ignored)
+    """
+    if category:
+        products = products.filter(category_id=category)
+    if stock_status in STOCK_STATUSES:
+        products = products.filter(STOCK_STATUSES[stock_status])
+    return products
+
+
+def metric_aggregates(value=None):
+    aggregates = {
+        'total_products': Count('id'),
+        'out_of_stock': Count('id', filter=OUT_OF_STOCK),
+        'low_stock': Count('id', filter=LOW_STOCK),
+        'stock_units': Sum('quantity', default=0),
+    }
+    if value is not None:
+        aggregates['total_value'] = Sum(value, default=Decimal(0))
+    return aggregates
+
+
+def product_metrics(products, value=None, group_by=()):
+    """
+    The figures for ``products``, as a dict, or with ``group_by`` as a list
+    of dicts holding the grouped fields and each group's figures
+    """
+    if not group_by:
+        return products.aggregate(**metric_aggregates(value))
+    return list(products.values(*group_by).annotate(**metric_aggregates(value)).order_by())
+
+
+def combine(groups, fields=METRIC_FIELDS):
+    """
+    Adds up ``product_metrics`` groups into the overall figures
+    """
+    totals = dict.fromkeys(fields, 0)
+    for group in groups:
+        for field in fields:
+            totals[field] += group[field]
+    return totals
@@ -0,0 +1,67 @@
+from django.db import migrations
+
+# External-content FTS5 index over inventory_product, kept in sync by
+# triggers. The UPDATE trigger only fires for the indexed columns, so stock
+# postings (quantity/updated_at) don't touch the index. Only created on
+# SQLite; other databases use the LIKE search backend.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE inventory_product_fts USING fts5(
+        name, sku, barcode, description,
+        content='inventory_product', content_rowid='id',
+        tokenize="unicode61 tokenchars '-_'", prefix='2 3'
+    )
+    """,
+    "INSERT INTO inventory_product_fts(inventory_product_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 5.0, 1.0)')",
+    """
+    CREATE TRIGGER inventory_product_fts_insert AFTER INSERT ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts(rowid, name, sku, barcode, description)
+        VALUES (new.id, new.name, new.sku, new.barcode, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_product_fts_delete AFTER DELETE ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts(inventory_product_fts, rowid, name, sku, barcode, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_product_fts_update AFTER UPDATE OF name, sku, barcode, description ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts(inventory_product_fts, rowid, name, sku, barcode, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.description);
+        INSERT INTO inventory_product_fts(rowid, name, sku, barcode, description)
+        VALUES (new.id, new.name, new.sku, new.barcode, new.description);
+    END
+    """,
+    "INSERT INTO inventory_product_fts(inventory_product_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS inventory_product_fts_insert",
+    "DROP TRIGGER IF EXISTS inventory_product_fts_delete",
+    "DROP TRIGGER IF EXISTS inventory_product_fts_update",
+    "DROP TABLE IF EXISTS inventory_product_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in CREATE_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_sweepwatermark'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
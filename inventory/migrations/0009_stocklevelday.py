@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_product_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLevelDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('opening_quantity', models.IntegerField()),
+                ('closing_quantity', models.IntegerField()),
+                ('inflow', models.PositiveIntegerField(default=0)),
+                ('outflow', models.PositiveIntegerField(default=0)),
+                ('purchased', models.PositiveIntegerField(default=0)),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('returned', models.PositiveIntegerField(default=0)),
+                ('adjusted', models.PositiveIntegerField(default=0)),
+                ('transferred', models.PositiveIntegerField(default=0)),
+                ('lost', models.PositiveIntegerField(default=0)),
+                ('movement_count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_days', to='inventory.product')),
+            ],
+            options={
+                'ordering': ['product', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('product', 'date'), name='unique_stock_level_day')],
+            },
+        ),
+    ]
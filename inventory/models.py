@@ -1,9 +1,12 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.urls import reverse
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.contrib.auth.models import User
+from .stock import apply_stock_delta, post_movements, stock_delta
 
 class Supplier(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -32,7 +35,8 @@ class Supplier(models.Model):
         return self.products.count()
 
     def total_inventory_value(self):
-        return sum(product.total_value for product in self.products.all())
+        from .valuation import supplier_value
+        return supplier_value(self)
 
 class Category(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -63,15 +67,52 @@ class Category(models.Model):
     def get_absolute_url(self):
         return reverse('inventory:category_detail', args=[self.slug])
 
+    def clean(self):
+        if self.pk and self.parent_id and CategoryClosure.objects.filter(
+                ancestor_id=self.pk, descendant_id=self.parent_id).exists():
+            raise ValidationError("A category cannot be moved under itself or one of its subcategories")
+
     def product_count(self):
         return self.products.count()
 
     def get_all_children(self):
-        children = []
-        for child in self.children.all():
-            children.append(child)
-            children.extend(child.get_all_children())
-        return children
+        from .categories import descendants
+        return list(descendants(self))
+
+    def get_ancestors(self, include_self=False):
+        """
+        Returns the ancestors root first, from prefetched ``ancestor_links``
+        when available
+        """
+        if 'ancestor_links' in getattr(self, '_prefetched_objects_cache', {}):
+            links = sorted(self.ancestor_links.all(), key=lambda link: -link.depth)
+            return [link.ancestor for link in links if include_self or link.depth]
+        from .categories import ancestors
+        return list(ancestors(self, include_self=include_self))
+
+    def get_full_path(self, separator=' > '):
+        return separator.join(category.name for category in self.get_ancestors(include_self=True))
+
+class CategoryClosure(models.Model):
+    """
+    One row per (ancestor, descendant) pair of the category tree, including
+    each category paired with itself at depth 0. Maintained by
+    inventory.categories when categories are saved or moved.
+    """
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_category_closure'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='category_ancestors_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} > {self.descendant_id} ({self.depth})"
 
 class ProductManager(models.Manager):
     def active(self):
@@ -120,6 +161,8 @@ class Product(models.Model):
     class Meta:
         ordering = ['name']
         indexes = [
+            # Serves the product list's (name, id) keyset pagination
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
             models.Index(fields=['sku']),
             models.Index(fields=['barcode']),
             models.Index(fields=['quantity']),
@@ -170,6 +213,84 @@ class Product(models.Model):
             self.barcode = f"BC-{self.id:08d}"
             self.save()
 
+class InventorySnapshot(models.Model):
+    """
+    Single-row catalog summary, kept current by inventory.snapshot
+    """
+    total_products = models.IntegerField(default=0)
+    low_stock_count = models.IntegerField(default=0)
+    out_of_stock_count = models.IntegerField(default=0)
+    total_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    rebuilt_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Inventory snapshot ({self.total_products} products)"
+
+class SweepWatermark(models.Model):
+    """
+    Progress marker for a periodic sweep, such as the expiry alert sweep:
+    every date up to ``swept_through`` has been processed
+    """
+    name = models.CharField(max_length=50, unique=True)
+    swept_through = models.DateField()
+    products_checked = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} swept through {self.swept_through}"
+
+class ExportJob(models.Model):
+    """
+    A CSV export run in the background by the run_export_jobs command.
+
+    Rows are written in primary-key order into gzip chunk files; ``last_pk``
+    records the keyset position so an interrupted job resumes where it
+    stopped.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    export = models.CharField(max_length=50)
+    filters = models.JSONField(default=dict, blank=True)
+    filename = models.CharField(max_length=100)
+    token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    estimated_rows = models.PositiveIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    chunk_count = models.PositiveIntegerField(default=0)
+    last_pk = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.export} export #{self.pk} ({self.get_status_display()})"
+
+    def get_absolute_url(self):
+        return reverse('inventory:export_job_status', args=[self.pk])
+
+    @property
+    def progress(self):
+        if self.status == 'completed':
+            return 100
+        if not self.estimated_rows:
+            return 0
+        return min(99, self.rows_written * 100 // self.estimated_rows)
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='product_images/')
@@ -183,6 +304,13 @@ class ProductImage(models.Model):
     class Meta:
         ordering = ['-is_default', 'created_at']
 
+class StockMovementManager(models.Manager):
+    def post_batch(self, movements, batch_size=None):
+        """
+        Posts unsaved movements in bulk; see inventory.stock.post_movements
+        """
+        return post_movements(movements, using=self._db, batch_size=batch_size)
+
 class StockMovement(models.Model):
     MOVEMENT_TYPES = [
         ('purchase', 'Purchase'),
@@ -192,6 +320,8 @@ class StockMovement(models.Model):
         ('transfer', 'Transfer'),
         ('loss', 'Loss'),
     ]
+    # Fields that were posted to stock; fixed once the movement is saved
+    POSTED_FIELDS = ('product', 'movement_type', 'quantity')
 
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='movements')
     movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPES)
@@ -205,6 +335,8 @@ class StockMovement(models.Model):
     created_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = StockMovementManager()
+
     def __str__(self):
         return f"{self.get_movement_type_display()} of {self.product.name}"
 
@@ -216,27 +348,120 @@ class StockMovement(models.Model):
             models.Index(fields=['product']),
         ]
 
+    @property
+    def stock_delta(self):
+        return stock_delta(self.movement_type, self.quantity)
+
     def save(self, *args, **kwargs):
-        if not self.pk:  # Only for new records
-            self.before_quantity = self.product.quantity
-            
-            if self.movement_type in ['purchase', 'return']:
-                self.after_quantity = self.product.quantity + self.quantity
-            else:
-                self.after_quantity = self.product.quantity - self.quantity
-
-            if not self.unit_price:
-                self.unit_price = self.product.unit_price
-            self.total_price = self.unit_price * abs(self.quantity)
-            
-        super().save(*args, **kwargs)
-        
-        # Update product quantity
-        if self.movement_type in ['purchase', 'return']:
-            self.product.quantity += self.quantity
-        elif self.movement_type in ['sale', 'adjustment', 'loss']:
-            self.product.quantity -= self.quantity
-        self.product.save()
+        if self.pk:
+            # Posted movements are ledger entries: edits don't re-post stock,
+            # so the forms keep POSTED_FIELDS read-only
+            if self.unit_price:
+                self.total_price = self.unit_price * abs(self.quantity)
+            super().save(*args, **kwargs)
+            return
+
+        if not self.unit_price:
+            self.unit_price = self.product.unit_price
+        self.total_price = self.unit_price * abs(self.quantity)
+
+        # Post the stock change and record the movement together, so the
+        # before/after snapshot is exactly the change this row applied.
+        with transaction.atomic():
+            self.before_quantity, self.after_quantity = apply_stock_delta(
+                self.product, self.stock_delta)
+            super().save(*args, **kwargs)
+
+class StockLevelDay(models.Model):
+    """
+    One product's stock for one (local) day: opening and closing quantity,
+    total stock in and out, and the quantity moved by each movement type.
+    Maintained by inventory.history as movements post and quantities are
+    edited.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_days')
+    date = models.DateField()
+    opening_quantity = models.IntegerField()
+    closing_quantity = models.IntegerField()
+    inflow = models.PositiveIntegerField(default=0)
+    outflow = models.PositiveIntegerField(default=0)
+    purchased = models.PositiveIntegerField(default=0)
+    sold = models.PositiveIntegerField(default=0)
+    returned = models.PositiveIntegerField(default=0)
+    adjusted = models.PositiveIntegerField(default=0)
+    transferred = models.PositiveIntegerField(default=0)
+    lost = models.PositiveIntegerField(default=0)
+    movement_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['product', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='unique_stock_level_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.date}: {self.closing_quantity}"
+
+class ProductValuation(models.Model):
+    """
+    A product's stock at historical cost, maintained by inventory.valuation
+    as movements post. ``average_cost`` is the running weighted average.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='valuation')
+    quantity = models.IntegerField(default=0)
+    value = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    average_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity} valued at {self.value}"
+
+class CostLayer(models.Model):
+    """
+    A FIFO cost layer: stock received at one unit cost, of which
+    ``remaining`` units are still on hand
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cost_layers')
+    movement = models.ForeignKey(StockMovement, on_delete=models.SET_NULL, null=True, blank=True)
+    received_at = models.DateTimeField()
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4)
+    quantity = models.PositiveIntegerField()
+    remaining = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['product', 'id']
+        indexes = [
+            models.Index(fields=['product', 'id'], condition=models.Q(remaining__gt=0),
+                         name='open_cost_layer_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.remaining}/{self.quantity} of {self.product_id} at {self.unit_cost}"
+
+class ValuationTotal(models.Model):
+    """
+    Inventory value rolled up for the whole catalog (scope 'all', key 0), a
+    category or a supplier (key 0 for products without one)
+    """
+    SCOPES = [
+        ('all', 'All products'),
+        ('category', 'Category'),
+        ('supplier', 'Supplier'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPES)
+    key = models.PositiveIntegerField(default=0)
+    quantity = models.BigIntegerField(default=0)
+    value = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_valuation_total'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}: {self.value}"
 
 class InventoryAlert(models.Model):
     ALERT_TYPES = [
@@ -0,0 +1,82 @@
+"""
+Per-supplier and per-category aggregates.
+
+``with_rollups`` annotates a Supplier or Category queryset with the figures
+below, computed by the database in the same query as the rows, so a list of
+any length costs one query:
+
+``products_count``, ``active_products_count``
+    Products linked to the row, and how many of them are active.
+``stock_units``
+    Units on hand across those products.
+``low_stock_count``
+    Active products at or below their reorder level.
+``stock_value``
+    Inventory value at historical cost, read from the valuation rollups
+    (see inventory.valuation), or at current cost price until they are built.
+
+``subtree_rollups`` gives the same figures for a category and all its
+subcategories, using the category closure table.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .categories import descendant_ids
+from .models import Category, Product, Supplier, ValuationTotal
+
+ROLLUP_FIELDS = ('products_count', 'active_products_count', 'stock_units', 'low_stock_count', 'stock_value')
+SCOPES = {Supplier: 'supplier', Category: 'category'}
+
+
+def rollup_annotations(model):
+    """
+    The annotations for ``model`` (Supplier or Category)
+    """
+    active = Q(products__is_active=True)
+    value = ValuationTotal.objects.filter(scope=SCOPES[model], key=OuterRef('pk')).values('value')
+    # Once built every valued product is in a total, so a missing one means
+    # either no products or no valuations yet
+    current_value = Sum(F('products__quantity') * F('products__cost_price'))
+    return {
+        'products_count': Count('products'),
+        'active_products_count': Count('products', filter=active),
+        'stock_units': Coalesce(Sum('products__quantity'), 0, output_field=IntegerField()),
+        'low_stock_count': Count(
+            'products', filter=active & Q(products__quantity__lte=F('products__reorder_level'))),
+        'stock_value': Coalesce(
+            Subquery(value[:1]), current_value, Value(Decimal(0)),
+            output_field=DecimalField(max_digits=18, decimal_places=4)),
+    }
+
+
+def with_rollups(queryset):
+    """
+    Annotates a Supplier or Category queryset with the rollup figures
+    """
+    return queryset.annotate(**rollup_annotations(queryset.model))
+
+
+def rollup_values(row):
+    return {field: getattr(row, field) for field in ROLLUP_FIELDS}
+
+
+def subtree_rollups(category):
+    """
+    Rollup figures over the category's whole subtree, in two queries
+    """
+    subtree = descendant_ids(category)
+    active = Q(is_active=True)
+    rollups = Product.objects.filter(category_id__in=subtree).aggregate(
+        products_count=Count('pk'),
+        active_products_count=Count('pk', filter=active),
+        stock_units=Coalesce(Sum('quantity'), 0),
+        low_stock_count=Count('pk', filter=active & Q(quantity__lte=F('reorder_level'))),
+        current_value=Sum(F('quantity') * F('cost_price'), default=Decimal(0)),
+    )
+    current_value = rollups.pop('current_value')
+    valued = ValuationTotal.objects.filter(scope='category', key__in=subtree).aggregate(total=Sum('value'))['total']
+    rollups['stock_value'] = valued if valued is not None else current_value
+    return rollups
+
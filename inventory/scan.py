@@ -0,0 +1,158 @@
+"""
+Barcode/SKU scan lookups.
+
+Scanners resolve a code to a small product payload through a bounded,
+thread-safe LRU cache held in each worker process. Product saves, deletes,
+stock postings and catalog imports made by this process invalidate the
+cached entries, immediately and again when the transaction commits.
+Changes made by other worker processes are picked up when entries expire
+(``SCAN_CACHE_TTL`` seconds).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Product
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 30
+SCAN_FIELDS = ('id', 'name', 'sku', 'barcode', 'unit_price', 'quantity', 'reorder_level', 'is_active')
+
+
+class ScanCache:
+    """
+    LRU cache of scan payloads keyed by code. Unknown codes are cached too
+    (as None) so a stuck scanner doesn't hammer the database.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.codes_by_product = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, code):
+        """
+        Returns ``(found, payload)``; ``found`` is False on a miss
+        """
+        with self.lock:
+            entry = self.entries.get(code)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(code)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, code, payload):
+        with self.lock:
+            self._discard(code)
+            self.entries[code] = (time.monotonic() + self.ttl, payload)
+            if payload is not None:
+                self.codes_by_product.setdefault(payload['id'], set()).add(code)
+            while len(self.entries) > self.maxsize:
+                self._discard(next(iter(self.entries)))
+
+    def _discard(self, code):
+        entry = self.entries.pop(code, None)
+        if entry and entry[1] is not None:
+            codes = self.codes_by_product.get(entry[1]['id'])
+            if codes:
+                codes.discard(code)
+                if not codes:
+                    del self.codes_by_product[entry[1]['id']]
+
+    def invalidate(self, product_id=None, codes=()):
+        """
+        Drops every entry for the product and for the given codes (which
+        covers cached misses for a code that now exists)
+        """
+        self.invalidate_many([product_id], codes)
+
+    def invalidate_many(self, product_ids, codes=()):
+        with self.lock:
+            for product_id in product_ids:
+                for code in list(self.codes_by_product.get(product_id, ())):
+                    self._discard(code)
+            for code in codes:
+                if code:
+                    self._discard(code)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.codes_by_product.clear()
+            self.hits = self.misses = 0
+
+
+scan_cache = ScanCache(
+    maxsize=getattr(settings, 'SCAN_CACHE_SIZE', DEFAULT_CACHE_SIZE),
+    ttl=getattr(settings, 'SCAN_CACHE_TTL', DEFAULT_CACHE_TTL),
+)
+
+
+def stock_status(quantity, reorder_level):
+    # Same rules as Product.stock_status, without building an instance
+    if quantity == 0:
+        return "Out of Stock"
+    elif quantity <= reorder_level:
+        return "Low Stock"
+    return "In Stock"
+
+
+def load_payload(code):
+    """
+    Looks the code up as a SKU, then as a barcode, using the indexes on both
+    """
+    rows = list(Product.objects.filter(Q(sku=code) | Q(barcode=code)).values(*SCAN_FIELDS)[:2])
+    if not rows:
+        return None
+    row = next((row for row in rows if row['sku'] == code), rows[0])
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'sku': row['sku'],
+        'barcode': row['barcode'],
+        'price': str(row['unit_price']),
+        'quantity': row['quantity'],
+        'stock_status': stock_status(row['quantity'], row['reorder_level']),
+        'is_active': row['is_active'],
+    }
+
+
+def lookup(code):
+    """
+    Returns the scan payload for a SKU or barcode, or None when unknown
+    """
+    code = code.strip()
+    found, payload = scan_cache.get(code)
+    if not found:
+        payload = load_payload(code)
+        scan_cache.set(code, payload)
+    return payload
+
+
+def invalidate_product(product_id, codes=(), using=None):
+    """
+    Invalidates now and again on commit, so a lookup racing the
+    transaction can't leave the pre-commit row cached
+    """
+    codes = tuple(codes)
+    scan_cache.invalidate(product_id, codes)
+    transaction.on_commit(lambda: scan_cache.invalidate(product_id, codes), using=using)
+
+
+def invalidate_products(product_ids, codes=(), using=None):
+    """
+    As invalidate_product, for products written in bulk
+    """
+    product_ids, codes = tuple(product_ids), tuple(codes)
+    scan_cache.invalidate_many(product_ids, codes)
+    transaction.on_commit(lambda: scan_cache.invalidate_many(product_ids, codes), using=using)
@@ -0,0 +1,162 @@
+"""
+Pluggable product search.
+
+``search_products(queryset, term)`` filters a Product queryset with the
+configured backend (``settings.PRODUCT_SEARCH_BACKEND``, a dotted path) or,
+by default, the SQLite FTS5 backend when the index exists and the LIKE
+backend otherwise. Every backend first tries an exact SKU/barcode match,
+which is two indexed equality lookups, so scanner and SKU lookups never hit
+the text index.
+
+The FTS5 table ``inventory_product_fts`` indexes name, SKU, barcode and
+description. It is an external-content table kept in sync by triggers (see
+migration 0007), so bulk writes that skip model signals stay indexed too.
+SQLite drops a table's triggers when a migration remakes it, so
+``restore_search_triggers`` recreates any that are missing, and reindexes,
+after every migrate.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+FTS_TABLE = 'inventory_product_fts'
+TOKEN_RE = re.compile(r'[\w-]+')
+# As created by migration 0007
+FTS_TRIGGERS = {
+    'inventory_product_fts_insert': """
+        CREATE TRIGGER inventory_product_fts_insert AFTER INSERT ON inventory_product BEGIN
+            INSERT INTO inventory_product_fts(rowid, name, sku, barcode, description)
+            VALUES (new.id, new.name, new.sku, new.barcode, new.description);
+        END
+    """,
+    'inventory_product_fts_delete': """
+        CREATE TRIGGER inventory_product_fts_delete AFTER DELETE ON inventory_product BEGIN
+            INSERT INTO inventory_product_fts(inventory_product_fts, rowid, name, sku, barcode, description)
+            VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.description);
+        END
+    """,
+    'inventory_product_fts_update': """
+        CREATE TRIGGER inventory_product_fts_update AFTER UPDATE OF name, sku, barcode, description
+        ON inventory_product BEGIN
+            INSERT INTO inventory_product_fts(inventory_product_fts, rowid, name, sku, barcode, description)
+            VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.description);
+            INSERT INTO inventory_product_fts(rowid, name, sku, barcode, description)
+            VALUES (new.id, new.name, new.sku, new.barcode, new.description);
+        END
+    """,
+}
+
+
+class LikeSearchBackend:
+    """
+    Case-insensitive substring search, as the product list always did.
+    Works everywhere but scans the table.
+    """
+
+    def exact_matches(self, queryset, term):
+        return queryset.filter(Q(sku=term) | Q(barcode=term))
+
+    def search(self, queryset, term):
+        term = term.strip()
+        if not term:
+            return queryset
+        exact = self.exact_matches(queryset, term)
+        if exact.exists():
+            return exact
+        return self.text_search(queryset, term)
+
+    def text_search(self, queryset, term):
+        return queryset.filter(
+            Q(name__icontains=term) |
+            Q(sku__icontains=term) |
+            Q(barcode__icontains=term))
+
+
+class SQLiteFTSBackend(LikeSearchBackend):
+    """
+    FTS5 search ranked by bm25 (name weighted highest). Each word in the
+    term is matched as a prefix, and all words must match.
+    """
+
+    def match_expression(self, term):
+        tokens = TOKEN_RE.findall(term.lower())
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def text_search(self, queryset, term):
+        expression = self.match_expression(term)
+        if not expression:
+            return super().text_search(queryset, term)
+        table = queryset.model._meta.db_table
+        pk = queryset.model._meta.pk.column
+        # extra() is the only way to join the virtual table, which gives the
+        # planner a rowid join driven by the MATCH instead of a per-row
+        # subquery.
+        return queryset.extra(
+            select={'search_rank': f'{FTS_TABLE}.rank'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.{pk}', f'{FTS_TABLE} MATCH %s'],
+            params=[expression],
+        ).order_by('search_rank')
+
+
+def fts_available(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    if not hasattr(connection, 'product_fts_available'):
+        with connection.cursor() as cursor:
+            connection.product_fts_available = FTS_TABLE in connection.introspection.table_names(cursor)
+    return connection.product_fts_available
+
+
+def get_search_backend(using=None):
+    backend = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if backend:
+        return import_string(backend)()
+    connection = connections[using or router.db_for_read(Product)]
+    if fts_available(connection):
+        return SQLiteFTSBackend()
+    return LikeSearchBackend()
+
+
+def search_products(queryset, term):
+    """
+    Filters ``queryset`` by ``term``. Text matches come back ordered by
+    relevance; pass the result through order_by() to sort differently.
+    """
+    return get_search_backend(queryset.db).search(queryset, term)
+
+
+def rebuild_search_index(using=None):
+    connection = connections[using or router.db_for_write(Product)]
+    if fts_available(connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def restore_search_triggers(using=None):
+    """
+    Recreates the index triggers missing from the database and, if any
+    were, rebuilds the index (rows written without them aren't indexed).
+    Returns the names of the triggers recreated.
+    """
+    connection = connections[using or router.db_for_write(Product)]
+    # Migrations may just have created or dropped the table
+    connection.__dict__.pop('product_fts_available', None)
+    if not fts_available(connection):
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+            [Product._meta.db_table])
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in FTS_TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(FTS_TRIGGERS[name])
+        if missing:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return missing
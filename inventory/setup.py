@@ -1,5 +1,7 @@
 from django.db import transaction
+from .categories import rebuild_closure
 from .models import Category
+from .search import restore_search_triggers
 
 def create_initial_data(sender, **kwargs):
     """
@@ -14,4 +16,14 @@ def create_initial_data(sender, **kwargs):
                 Category(name="Clothing", slug="clothing", is_active=True),
                 Category(name="Office Supplies", slug="office-supplies", is_active=True),
             ])
-            print("Created initial inventory categories")
\ No newline at end of file
+            rebuild_closure()
+            print("Created initial inventory categories")
+
+def check_search_triggers(sender, using=None, **kwargs):
+    """
+    Restore the product search triggers after migrations that remade the
+    product table
+    """
+    restored = restore_search_triggers(using)
+    if restored:
+        print(f"Restored product search triggers: {', '.join(restored)}")
@@ -1,94 +1,150 @@
-from django.db.models.signals import post_save, pre_save
+from django.core.exceptions import ValidationError
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Product, InventoryAlert, StockMovement
+from .models import Category, CategoryClosure, Product, ProductImage, InventoryAlert, StockMovement
+from .alerts import EXPIRY_ALERT_TYPES, STOCK_ALERT_TYPES, evaluate_alerts
+from . import categories, history, scan, snapshot, valuation
+from store_manager.caching import bump
 
-@receiver(post_save, sender=Product)
-def handle_product_stock_changes(sender, instance, created, **kwargs):
+ALERT_FIELDS = ('quantity', 'reorder_level', 'expiry_date')
+
+@receiver(pre_save, sender=Category)
+def check_category_move(sender, instance, raw=False, using=None, **kwargs):
     """
-    Creates inventory alerts when stock levels change
+    Remembers the stored parent so a move can be relinked, and refuses moves
+    under the category's own subtree before anything is written
     """
-    # Skip if this is a new product with zero quantity
-    if created and instance.quantity == 0:
+    instance._stored_parent_id = None
+    if raw or not instance.pk:
         return
-    
-    # Check stock levels
-    if instance.quantity == 0:
-        alert_type = 'out_of_stock'
-        message = f"{instance.name} is out of stock"
-    elif instance.quantity <= instance.reorder_level:
-        alert_type = 'low_stock'
-        message = f"{instance.name} is low on stock (Current: {instance.quantity}, Reorder at: {instance.reorder_level})"
-    else:
-        # No alert needed for normal stock levels
-        return
-    
-    # Create or update existing unresolved alert
-    InventoryAlert.objects.update_or_create(
-        product=instance,
-        alert_type=alert_type,
-        is_resolved=False,
-        defaults={
-            'message': message,
-            'threshold': instance.reorder_level,
-            'days_to_expiry': None
-        }
-    )
+    instance._stored_parent_id = Category.objects.using(using).filter(
+        pk=instance.pk).values_list('parent_id', flat=True).first()
+    if instance.parent_id and instance.parent_id != instance._stored_parent_id and \
+            CategoryClosure.objects.using(using).filter(
+                ancestor_id=instance.pk, descendant_id=instance.parent_id).exists():
+        raise ValidationError("A category cannot be moved under itself or one of its subcategories")
+
+@receiver(post_save, sender=Category)
+def update_category_tree(sender, instance, created, raw=False, using=None, **kwargs):
+    if created or raw:
+        categories.add_category(instance, using=using)
+    elif instance.parent_id != getattr(instance, '_stored_parent_id', instance.parent_id):
+        categories.move_category(instance, using=using)
+
+@receiver(pre_delete, sender=Category)
+def detach_category_children(sender, instance, using=None, **kwargs):
+    categories.detach_children(instance, using=using)
 
 @receiver(pre_save, sender=Product)
-def check_expiry_dates(sender, instance, **kwargs):
+def remember_snapshot_state(sender, instance, **kwargs):
+    """
+    Reads the stored row before a product edit so the snapshot can apply the
+    difference and alerts are only re-evaluated when a rule input changed
+    """
+    instance._snapshot_state = None
+    instance._alert_state = None
+    instance._valuation_state = None
+    if instance.pk:
+        stored = Product.objects.filter(pk=instance.pk).values_list(
+            'quantity', 'reorder_level', 'cost_price', 'expiry_date', 'category_id', 'supplier_id').first()
+        if stored:
+            instance._snapshot_state = stored[:3]
+            instance._alert_state = (stored[0], stored[1], stored[3])
+            instance._valuation_state = (stored[0], stored[4], stored[5])
+
+@receiver(post_save, sender=Product)
+def update_snapshot_on_save(sender, instance, **kwargs):
+    snapshot.record_change(
+        getattr(instance, '_snapshot_state', None), snapshot.stock_state(instance))
+
+@receiver(post_delete, sender=Product)
+def update_snapshot_on_delete(sender, instance, **kwargs):
+    snapshot.record_change(snapshot.stock_state(instance), None)
+
+@receiver(post_save, sender=Product)
+def update_valuation_on_save(sender, instance, created, using=None, **kwargs):
     """
-    Creates expiry alerts when products are near expiry
+    Opens the valuation of new products and values direct quantity edits.
+    Recategorized products move their value between the rollups.
     """
-    if not instance.expiry_date:
+    stored = getattr(instance, '_valuation_state', None)
+    if created or stored is None:
+        valuation.open_product(instance, using=using)
         return
-    
-    days_to_expiry = (instance.expiry_date - timezone.now().date()).days
-    
-    if days_to_expiry < 0:
-        alert_type = 'expired'
-        message = f"{instance.name} has expired"
-    elif days_to_expiry <= 30:  # Alert for products expiring within 30 days
-        alert_type = 'expiring'
-        message = f"{instance.name} expires in {days_to_expiry} days"
-    else:
-        # No alert needed for products with distant expiry
+    quantity, category_id, supplier_id = stored
+    if (category_id, supplier_id) != (instance.category_id, instance.supplier_id):
+        valuation.move_product(
+            instance.pk, (category_id, supplier_id), (instance.category_id, instance.supplier_id), using=using)
+    valuation.record_adjustment(instance, instance.quantity - quantity, using=using)
+
+@receiver(post_save, sender=Product)
+def record_stock_history_edit(sender, instance, created, using=None, **kwargs):
+    """
+    Records the opening quantity of new products and direct quantity edits,
+    as record_stock_history does for movements
+    """
+    stored = getattr(instance, '_valuation_state', None)
+    before = 0 if created or stored is None else stored[0]
+    history.record_edit(instance.pk, before, instance.quantity, using=using)
+
+@receiver(pre_delete, sender=Product)
+def update_valuation_on_delete(sender, instance, using=None, **kwargs):
+    valuation.close_product(instance, using=using)
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_scan_cache(sender, instance, **kwargs):
+    scan.invalidate_product(instance.pk, [instance.sku, instance.barcode])
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=StockMovement)
+@receiver([post_save, post_delete], sender=InventoryAlert)
+def invalidate_cached_pages(sender, using=None, **kwargs):
+    bump('inventory', using=using)
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def touch_product_on_image_change(sender, instance, using=None, **kwargs):
+    # Product list rows are cached by updated_at and show the first image
+    Product.objects.using(using).filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+@receiver(post_save, sender=Product)
+def handle_product_alert_changes(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Re-evaluates stock and expiry alerts when quantity, reorder level or
+    expiry date changed
+    """
+    if update_fields is not None and not set(ALERT_FIELDS) & set(update_fields):
+        return
+    current = tuple(getattr(instance, field) for field in ALERT_FIELDS)
+    if not created and current == getattr(instance, '_alert_state', None):
         return
-    
-    # Create or update existing unresolved alert
-    InventoryAlert.objects.update_or_create(
-        product=instance,
-        alert_type=alert_type,
-        is_resolved=False,
-        defaults={
-            'message': message,
-            'threshold': None,
-            'days_to_expiry': days_to_expiry
-        }
-    )
+
+    if created and instance.quantity == 0:
+        # New products start empty; only their expiry date matters yet
+        evaluate_alerts([instance.pk], alert_types=EXPIRY_ALERT_TYPES)
+        return
+    evaluate_alerts([instance.pk])
+
+@receiver(post_save, sender=StockMovement)
+def record_stock_history(sender, instance, created, using=None, **kwargs):
+    if created:
+        history.record_movements([instance], using=using)
+
+@receiver(post_save, sender=StockMovement)
+def record_stock_valuation(sender, instance, created, using=None, **kwargs):
+    if created:
+        valuation.record_movements([instance], using=using)
 
 @receiver(post_save, sender=StockMovement)
-def resolve_related_alerts(sender, instance, created, **kwargs):
+def handle_movement_stock_changes(sender, instance, created, **kwargs):
     """
-    Automatically resolves stock-related alerts when stock is replenished
+    Re-evaluates stock alerts for stock posted by a movement, which no longer
+    goes through Product.save(). Alerts for replenished products are resolved.
     """
-    product = instance.product
-    
-    # Only check for purchase or return movements that increase stock
-    if instance.movement_type not in ['purchase', 'return']:
-        return
-    
-    # Check if stock is now above reorder level
-    if product.quantity > product.reorder_level:
-        # Resolve all low/out of stock alerts for this product
-        InventoryAlert.objects.filter(
-            product=product,
-            alert_type__in=['low_stock', 'out_of_stock'],
-            is_resolved=False
-        ).update(
-            is_resolved=True,
-            resolved_at=timezone.now()
-        )
+    if created:
+        evaluate_alerts([instance.product_id], alert_types=STOCK_ALERT_TYPES)
 
 @receiver(pre_save, sender=InventoryAlert)
 def set_resolved_by(sender, instance, **kwargs):
@@ -0,0 +1,124 @@
+"""
+Incrementally maintained inventory summary.
+
+InventorySnapshot holds the catalog-wide counters shown on the dashboard and
+product list. Stock postings and product edits apply deltas to the single
+row; ``rebuild_snapshot`` recomputes it from scratch.
+"""
+from decimal import Decimal
+
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import product_metrics
+from .models import InventorySnapshot, Product
+
+SNAPSHOT_PK = 1
+SNAPSHOT_FIELDS = ('total_products', 'low_stock_count', 'out_of_stock_count', 'total_value')
+
+
+def stock_state(product, quantity=None):
+    """
+    The part of a product the snapshot depends on, as a
+    ``(quantity, reorder_level, cost_price)`` tuple
+    """
+    if quantity is None:
+        quantity = product.quantity
+    cost_price = Product._meta.get_field('cost_price').to_python(product.cost_price)
+    return (quantity, product.reorder_level, cost_price)
+
+
+class SnapshotDelta:
+    """
+    Accumulates snapshot changes so a batch can apply them in one UPDATE
+    """
+
+    def __init__(self):
+        self.total_products = 0
+        self.low_stock_count = 0
+        self.out_of_stock_count = 0
+        self.total_value = Decimal(0)
+
+    def add(self, state, sign=1):
+        if state is None:
+            return
+        quantity, reorder_level, cost_price = state
+        self.total_products += sign
+        if quantity <= reorder_level:
+            self.low_stock_count += sign
+        if quantity == 0:
+            self.out_of_stock_count += sign
+        self.total_value += sign * quantity * cost_price
+
+    def change(self, old, new):
+        self.add(old, -1)
+        self.add(new)
+
+    def __bool__(self):
+        return any(getattr(self, field) for field in SNAPSHOT_FIELDS)
+
+    def apply(self):
+        if not self:
+            return
+        updated = InventorySnapshot.objects.filter(pk=SNAPSHOT_PK).update(
+            updated_at=timezone.now(),
+            **{field: F(field) + getattr(self, field) for field in SNAPSHOT_FIELDS}
+        )
+        if not updated:
+            # First use: the row doesn't exist yet, so build it from the
+            # products table, which already includes this change.
+            rebuild_snapshot()
+        self.__init__()
+
+
+def record_change(old, new):
+    """
+    Applies the change of one product from state ``old`` to ``new``
+    (either may be None for creation/deletion)
+    """
+    delta = SnapshotDelta()
+    delta.change(old, new)
+    delta.apply()
+
+
+def compute_snapshot():
+    """
+    Computes the summary from the products table in a single query
+    """
+    metrics = product_metrics(Product.objects.all(), value=F('quantity') * F('cost_price'))
+    return {
+        'total_products': metrics['total_products'],
+        'low_stock_count': metrics['low_stock'],
+        'out_of_stock_count': metrics['out_of_stock'],
+        'total_value': Decimal(metrics['total_value']).quantize(Decimal('0.01')),
+    }
+
+
+def rebuild_snapshot():
+    snapshot, _ = InventorySnapshot.objects.update_or_create(
+        pk=SNAPSHOT_PK,
+        defaults={**compute_snapshot(), 'rebuilt_at': timezone.now()}
+    )
+    return snapshot
+
+
+def get_snapshot():
+    """
+    Returns the current summary row, building it on first use
+    """
+    return InventorySnapshot.objects.filter(pk=SNAPSHOT_PK).first() or rebuild_snapshot()
+
+
+def snapshot_drift(snapshot=None):
+    """
+    Returns ``{field: (stored, actual)}`` for every counter that is out of
+    date
+    """
+    snapshot = snapshot or get_snapshot()
+    actual = compute_snapshot()
+    drift = {}
+    for field in SNAPSHOT_FIELDS:
+        stored = getattr(snapshot, field)
+        if stored != actual[field]:
+            drift[field] = (stored, actual[field])
+    return drift
@@ -0,0 +1,171 @@
+"""
+Stock posting engine.
+
+Stock levels are changed with a single conditional UPDATE
+(``quantity = quantity + delta``) so concurrent postings never lose updates,
+and without going through Product.save() and its signals.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from store_manager.caching import bump
+
+STOCK_IN_TYPES = ('purchase', 'return')
+STOCK_OUT_TYPES = ('sale', 'adjustment', 'loss')
+
+
+def stock_delta(movement_type, quantity):
+    """
+    Returns the signed change in product quantity for a movement
+    """
+    if movement_type in STOCK_IN_TYPES:
+        return quantity
+    if movement_type in STOCK_OUT_TYPES:
+        return -quantity
+    # Transfers move stock between locations without changing the total
+    return 0
+
+
+def supports_update_returning(connection):
+    """
+    UPDATE ... RETURNING is available on PostgreSQL and SQLite 3.35+
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+
+
+def apply_stock_delta(product, delta, using=None, snapshot=None):
+    """
+    Atomically adds ``delta`` to the product's quantity and returns the
+    ``(before, after)`` quantities seen by this posting.
+
+    The conditional WHERE clause refuses changes that would take stock below
+    zero; a ValidationError is raised in that case and nothing is written.
+    The in-memory product is refreshed with the posted row and its scan
+    cache entries are invalidated. The change is applied to the inventory
+    snapshot immediately, or accumulated into ``snapshot`` (a SnapshotDelta)
+    when the caller batches it.
+    """
+    from .scan import invalidate_product
+    from .snapshot import SnapshotDelta, stock_state
+
+    model = type(product)
+    using = using or router.db_for_write(model, instance=product)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = model._meta
+    table = qn(opts.db_table)
+    pk = qn(opts.pk.column)
+    quantity = qn(opts.get_field('quantity').column)
+    reorder_level_field = opts.get_field('reorder_level')
+    cost_price_field = opts.get_field('cost_price')
+    updated_at_field = opts.get_field('updated_at')
+    columns = f"{quantity}, {qn(reorder_level_field.column)}, {qn(cost_price_field.column)}"
+
+    now = timezone.now()
+    sql = (
+        f"UPDATE {table} SET {quantity} = {quantity} + %s, {qn(updated_at_field.column)} = %s "
+        f"WHERE {pk} = %s AND {quantity} + %s >= 0"
+    )
+    params = [delta, updated_at_field.get_db_prep_value(now, connection), product.pk, delta]
+
+    with connection.cursor() as cursor:
+        if supports_update_returning(connection):
+            cursor.execute(f"{sql} RETURNING {columns}", params)
+            row = cursor.fetchone()
+        else:
+            # Without RETURNING the read must happen inside the same
+            # transaction, while the UPDATE still holds the row lock.
+            with transaction.atomic(using=using):
+                cursor.execute(sql, params)
+                row = None
+                if cursor.rowcount:
+                    cursor.execute(f"SELECT {columns} FROM {table} WHERE {pk} = %s", [product.pk])
+                    row = cursor.fetchone()
+
+        if row is None:
+            cursor.execute(f"SELECT {quantity} FROM {table} WHERE {pk} = %s", [product.pk])
+            current = cursor.fetchone()
+            if current is None:
+                raise ValidationError(f"{product} no longer exists")
+            raise ValidationError(f"Not enough stock for {product}. Available: {current[0]}")
+
+    after, product.reorder_level, cost_price = row
+    product.quantity = after
+    product.cost_price = cost_price_field.to_python(cost_price).quantize(
+        Decimal(1).scaleb(-cost_price_field.decimal_places))
+    product.updated_at = now
+    before = after - delta
+    invalidate_product(product.pk, using=using)
+    bump('inventory', using=using)
+
+    delta_snapshot = snapshot if snapshot is not None else SnapshotDelta()
+    delta_snapshot.change(stock_state(product, before), stock_state(product))
+    if snapshot is None:
+        delta_snapshot.apply()
+    return before, after
+
+
+def post_movements(movements, using=None, batch_size=None):
+    """
+    Posts a batch of unsaved movements with one aggregated quantity UPDATE
+    per product and a single bulk insert.
+
+    Before/after quantities are computed in memory as a running total over
+    each product's movements, in the order given. The daily stock history,
+    the valuation and stock alerts for every touched product are updated
+    together at the end. Either the whole batch is posted or nothing is.
+    """
+    from .alerts import STOCK_ALERT_TYPES, evaluate_alerts
+    from .history import record_movements
+    from .snapshot import SnapshotDelta
+    from .valuation import record_movements as record_valuation
+
+    movements = list(movements)
+    if not movements:
+        return movements
+    model = type(movements[0])
+    product_model = model._meta.get_field('product').related_model
+    using = using or router.db_for_write(model)
+
+    by_product = defaultdict(list)
+    for movement in movements:
+        by_product[movement.product_id].append(movement)
+
+    products = product_model._base_manager.using(using).in_bulk(list(by_product))
+    missing = set(by_product) - set(products)
+    if missing:
+        raise ValidationError(f"Unknown product ids: {sorted(missing)}")
+
+    with transaction.atomic(using=using):
+        snapshot = SnapshotDelta()
+        for product_id, group in by_product.items():
+            product = products[product_id]
+            delta = sum(movement.stock_delta for movement in group)
+            running, _ = apply_stock_delta(product, delta, using=using, snapshot=snapshot)
+
+            for movement in group:
+                movement.product = product
+                if not movement.unit_price:
+                    movement.unit_price = product.unit_price
+                movement.total_price = movement.unit_price * abs(movement.quantity)
+                movement.before_quantity = running
+                running += movement.stock_delta
+                if running < 0:
+                    raise ValidationError(
+                        f"Not enough stock for {product}. Available: {movement.before_quantity}")
+                movement.after_quantity = running
+
+        model._base_manager.using(using).bulk_create(movements, batch_size=batch_size)
+        snapshot.apply()
+        record_movements(movements, using=using)
+        record_valuation(movements, using=using)
+
+        evaluate_alerts(list(products), alert_types=STOCK_ALERT_TYPES)
+
+    return movements
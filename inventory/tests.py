@@ -1,14 +1,51 @@
-from django.test import TestCase, RequestFactory
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.contrib import messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.db.models import F
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, timedelta
 from .models import (
     Category, Product, Supplier, 
-    StockMovement, ProductImage, InventoryAlert
+    StockMovement, ProductImage, InventoryAlert, ExportJob, SweepWatermark, StockLevelDay,
+    ValuationTotal, CategoryClosure
+)
+from . import export_jobs
+from .alerts import evaluate_alerts
+from .expiry import sweep_expiry_alerts
+from .categories import descendants, rebuild_closure, subtree_products
+from .history import as_of, rebuild_history, stock_series
+from .importers import import_products
+from .metrics import combine, filter_products, product_metrics
+from .rollups import rollup_values, subtree_rollups, with_rollups
+from .scan import scan_cache
+from store_manager.caching import cached_response
+from store_manager.benchmarks import SCENARIOS, compare_reports, run_benchmarks, run_render_benchmarks
+from store_manager.instrumentation import QueryBudgetExceeded, fingerprint, request_stats
+from store_manager.seed import SeedConfig, clear_seed, seed_store
+from store_manager.pagination import CursorPaginator, approximate_count
+from .search import (
+    LikeSearchBackend, SQLiteFTSBackend, get_search_backend, restore_search_triggers, search_products,
 )
 from .forms import ProductForm, StockMovementForm
-from .views import ProductCreateView
+from .snapshot import get_snapshot, snapshot_drift
+from . import valuation
+from .views import CategoryDetailView, ProductCreateView, ProductDetailView
 
 class InventoryTests(TestCase):
     @classmethod
@@ -292,4 +329,1211 @@ class InventoryTests(TestCase):
         for url in urls:
             response = self.client.get(url)
             self.assertEqual(response.status_code, 302)
-            self.assertIn('/accounts/login/', response.url)
\ No newline at end of file
+            self.assertIn('/accounts/login/', response.url)
+
+
+class StockPostingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name="Posting Widget",
+            slug="posting-widget",
+            unit_price=20,
+            cost_price=10,
+            quantity=10,
+            reorder_level=2,
+            sku="SKU-9001",
+        )
+
+    def test_sale_records_before_and_after(self):
+        movement = StockMovement.objects.create(
+            product=self.product, movement_type='sale', quantity=4)
+        self.assertEqual((movement.before_quantity, movement.after_quantity), (10, 6))
+        self.assertEqual(movement.total_price, 80)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 6)
+
+    def test_posting_uses_database_quantity_not_stale_instance(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        StockMovement.objects.create(product=self.product, movement_type='sale', quantity=3)
+        movement = StockMovement.objects.create(product=stale, movement_type='sale', quantity=3)
+        self.assertEqual((movement.before_quantity, movement.after_quantity), (7, 4))
+        self.assertEqual(stale.quantity, 4)
+
+    def test_posting_skips_product_save(self):
+        with mock.patch.object(Product, 'save') as save:
+            StockMovement.objects.create(product=self.product, movement_type='purchase', quantity=5)
+        save.assert_not_called()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 15)
+
+    def test_insufficient_stock_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            StockMovement.objects.create(product=self.product, movement_type='sale', quantity=11)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+        self.assertFalse(StockMovement.objects.filter(product=self.product).exists())
+
+    def test_editing_movement_does_not_repost(self):
+        movement = StockMovement.objects.create(
+            product=self.product, movement_type='sale', quantity=2)
+        movement.notes = "Counted twice"
+        movement.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 8)
+
+    def test_posted_fields_are_read_only_on_edit(self):
+        movement = StockMovement.objects.create(
+            product=self.product, movement_type='sale', quantity=2, unit_price=20)
+        form = StockMovementForm({
+            'product': self.product.pk, 'movement_type': 'purchase', 'quantity': 50,
+            'unit_price': '15.00', 'reference': 'INV-1', 'notes': '',
+        }, instance=movement)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        movement.refresh_from_db()
+        self.assertEqual((movement.movement_type, movement.quantity, movement.reference), ('sale', 2, 'INV-1'))
+        self.assertEqual(movement.total_price, Decimal('30.00'))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 8)
+
+    def test_low_stock_alert_raised_by_posting(self):
+        StockMovement.objects.create(product=self.product, movement_type='sale', quantity=9)
+        self.assertTrue(InventoryAlert.objects.filter(
+            product=self.product, alert_type='low_stock', is_resolved=False).exists())
+
+    # Batch posting
+    def test_post_batch_running_quantities(self):
+        other = Product.objects.create(
+            name="Other Widget", slug="other-widget", unit_price=5, cost_price=2,
+            quantity=0, reorder_level=1, sku="SKU-9002")
+        movements = StockMovement.objects.post_batch([
+            StockMovement(product_id=self.product.pk, movement_type='sale', quantity=3),
+            StockMovement(product_id=other.pk, movement_type='purchase', quantity=7),
+            StockMovement(product_id=self.product.pk, movement_type='purchase', quantity=5),
+        ])
+        self.assertTrue(all(movement.pk for movement in movements))
+        self.assertEqual(
+            [(m.before_quantity, m.after_quantity) for m in movements],
+            [(10, 7), (0, 7), (7, 12)])
+        self.product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.product.quantity, other.quantity), (12, 7))
+
+    def test_post_batch_rejects_negative_running_stock(self):
+        with self.assertRaises(ValidationError):
+            StockMovement.objects.post_batch([
+                StockMovement(product_id=self.product.pk, movement_type='sale', quantity=12),
+                StockMovement(product_id=self.product.pk, movement_type='purchase', quantity=5),
+            ])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+        self.assertFalse(StockMovement.objects.filter(product=self.product).exists())
+
+    def test_post_batch_query_count_is_constant(self):
+        def receipt(lines):
+            return [StockMovement(product_id=self.product.pk, movement_type='purchase', quantity=1)
+                    for _ in range(lines)]
+
+        with CaptureQueriesContext(connection) as small:
+            StockMovement.objects.post_batch(receipt(10))
+        with CaptureQueriesContext(connection) as large:
+            StockMovement.objects.post_batch(receipt(1000))
+        # Only the bulk INSERT is split by the backend's parameter limit
+        def non_inserts(queries):
+            return [q for q in queries if not q['sql'].startswith('INSERT')]
+        self.assertEqual(len(non_inserts(small)), len(non_inserts(large)))
+        self.assertLess(len(large), 25)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 1020)
+
+
+class InventorySnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name="Snapshot Widget", slug="snapshot-widget", unit_price=20,
+            cost_price=10, quantity=10, reorder_level=2, sku="SKU-9101")
+
+    def assertNoDrift(self):
+        self.assertEqual(snapshot_drift(), {})
+
+    def test_snapshot_tracks_product_create_edit_delete(self):
+        other = Product.objects.create(
+            name="Snapshot Gadget", slug="snapshot-gadget", unit_price=8,
+            cost_price=4.5, quantity=0, reorder_level=3, sku="SKU-9102")
+        snapshot = get_snapshot()
+        self.assertEqual(snapshot.total_products, 2)
+        self.assertEqual(snapshot.out_of_stock_count, 1)
+        self.assertEqual(snapshot.low_stock_count, 1)
+        self.assertEqual(snapshot.total_value, 100)
+
+        other.quantity = 4
+        other.cost_price = 5
+        other.save()
+        self.assertNoDrift()
+        other.delete()
+        self.assertNoDrift()
+
+    def test_snapshot_tracks_stock_postings(self):
+        get_snapshot()
+        StockMovement.objects.create(product=self.product, movement_type='sale', quantity=8)
+        self.assertEqual(get_snapshot().low_stock_count, 1)
+        StockMovement.objects.post_batch([
+            StockMovement(product_id=self.product.pk, movement_type='sale', quantity=2),
+            StockMovement(product_id=self.product.pk, movement_type='purchase', quantity=1),
+        ])
+        self.assertEqual(get_snapshot().total_value, 10)
+        self.assertNoDrift()
+
+    def test_rebuild_fixes_drift(self):
+        get_snapshot()
+        Product.objects.filter(pk=self.product.pk).update(quantity=0)
+        self.assertIn('out_of_stock_count', snapshot_drift())
+        call_command('rebuild_inventory_snapshot', stdout=StringIO())
+        self.assertNoDrift()
+
+
+class ExportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('exporter', password='pass12345')
+        for i in range(5):
+            Product.objects.create(
+                name=f"Export {i}", slug=f"export-{i}", unit_price=10,
+                cost_price=5, quantity=10, sku=f"SKU-93{i:02d}")
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, EXPORT_ASYNC_THRESHOLD=3)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.user)
+
+    def download(self, job):
+        response = self.client.get(reverse('inventory:export_job_download', args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        return gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+
+    def test_large_export_is_queued_and_written_in_chunks(self):
+        response = self.client.get(reverse('orders:export_products'))
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, job.get_absolute_url(), fetch_redirect_response=False)
+        self.assertEqual(job.requested_by, self.user)
+        self.assertEqual(job.estimated_rows, 5)
+
+        export_jobs.run_pending_jobs(chunk_rows=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written, job.chunk_count), ('completed', 5, 3))
+
+        status = self.client.get(job.get_absolute_url()).json()
+        self.assertEqual(status['progress'], 100)
+        lines = self.download(job)
+        self.assertEqual(lines[0].split(',')[0], 'Product ID')
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], [f"Export {i}" for i in range(5)])
+
+    def test_small_export_streams_directly(self):
+        Product.objects.filter(sku__in=['SKU-9300', 'SKU-9301']).delete()
+        response = self.client.get(reverse('inventory:product_export'))
+        self.assertTrue(response.streaming)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_interrupted_job_resumes_from_last_chunk(self):
+        job = export_jobs.enqueue_export('products', user=self.user)
+        write_chunk = export_jobs.write_chunk
+        calls = []
+
+        def failing_write(path, header, rows):
+            calls.append(path)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            write_chunk(path, header, rows)
+
+        with mock.patch.object(export_jobs, 'write_chunk', failing_write), \
+                self.assertLogs('inventory.export_jobs', 'ERROR'):
+            export_jobs.run_pending_jobs(chunk_rows=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written), ('failed', 2))
+
+        job.status = 'queued'
+        job.save()
+        export_jobs.run_pending_jobs(chunk_rows=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written), ('completed', 5))
+        self.assertEqual(len(self.download(job)), 6)
+
+    def test_other_users_cannot_see_jobs(self):
+        job = export_jobs.enqueue_export('products', user=self.user)
+        self.client.force_login(User.objects.create_user('someone', password='pass12345'))
+        response = self.client.get(job.get_absolute_url())
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductImportTests(TestCase):
+    def catalog(self, *lines, name='catalog.csv'):
+        upload = BytesIO('\n'.join(lines).encode() + b'\n')
+        upload.name = name
+        return upload
+
+    def test_csv_import_creates_products_categories_and_alerts(self):
+        report = import_products(self.catalog(
+            'sku,name,category,supplier,unit_price,cost_price,quantity,reorder_level',
+            'A-1,Widget,Gadgets,Acme,10.00,6.00,50,5',
+            ',Gizmo,Gadgets,Acme,8.00,4.00,2,5',
+            'A-3,Broken,Gadgets,,1.00,2.00,1,5',
+            'A-4,,Gadgets,,1.00,0.50,1,5',
+        ))
+        self.assertEqual((report.created, report.updated), (2, 0))
+        self.assertEqual([line for line, _ in report.errors], [4, 5])
+
+        widget = Product.objects.get(sku='SKU-A-1')
+        self.assertEqual((widget.category.name, widget.supplier.name), ('Gadgets', 'Acme'))
+        self.assertEqual(widget.slug, 'widget-sku-a-1')
+        gizmo = Product.objects.get(name='Gizmo')
+        self.assertEqual(gizmo.sku, f'SKU-{gizmo.pk:04d}')
+        self.assertTrue(InventoryAlert.objects.filter(product=gizmo, alert_type='low_stock').exists())
+        self.assertEqual(snapshot_drift(), {})
+        self.assertEqual(as_of(widget, timezone.localdate()), 50)
+        self.assertEqual(StockLevelDay.objects.get(product=gizmo).opening_quantity, 0)
+
+    def test_reimport_updates_only_provided_columns(self):
+        import_products(self.catalog(
+            'sku,name,description,unit_price,cost_price,quantity',
+            'SKU-B-1,Bolt,Steel bolt,2.00,1.00,100',
+        ))
+        product = Product.objects.get(sku='SKU-B-1')
+
+        report = import_products(self.catalog(
+            '{"sku": "B-1", "unit_price": "2.50", "quantity": 5}',
+            'not json',
+            name='catalog.jsonl',
+        ))
+        self.assertEqual((report.created, report.updated, len(report.errors)), (0, 1, 1))
+        product.refresh_from_db()
+        self.assertEqual(product.unit_price, Decimal('2.50'))
+        self.assertEqual(product.description, 'Steel bolt')
+        self.assertEqual(product.quantity, 100)
+        self.assertEqual(product.slug, 'bolt-sku-b-1')
+
+    def test_names_match_existing_rows_case_insensitively(self):
+        existing = Category.objects.get(slug='office-supplies')
+        Category.objects.create(name="Cables", slug="cables-and-leads")
+        report = import_products(self.catalog(
+            'sku,name,category,unit_price,cost_price',
+            'E-1,Stapler,office supplies,4.00,2.00',
+            'E-2,Lead,Cables and Leads,3.00,1.00',
+            'E-3,Binder,Office-Supplies,2.00,1.00',
+            f'E-4,Pen,{"x" * 60},1.00,0.50',
+        ))
+        self.assertEqual(report.created, 3)
+        self.assertEqual([line for line, _ in report.errors], [5])
+        self.assertEqual(Product.objects.get(sku='SKU-E-1').category, existing)
+        self.assertEqual(Product.objects.get(sku='SKU-E-3').category, existing)
+        self.assertEqual(Product.objects.get(sku='SKU-E-2').category.slug, 'cables-and-leads')
+        self.assertFalse(Category.objects.filter(name__iexact='office supplies').exclude(pk=existing.pk).exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        lines = ['sku,name,category,unit_price,cost_price,quantity']
+        lines += [f'C-{i},Item {i},Bulk,3.00,1.00,50' for i in range(600)]
+        with CaptureQueriesContext(connection) as queries:
+            report = import_products(self.catalog(*lines), batch_size=300)
+        self.assertEqual(report.created, 600)
+        self.assertLess(len(queries), 40)
+
+    def test_import_command_reports_throughput(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as catalog:
+            catalog.write('sku,name,unit_price,cost_price\nD-1,Nut,1.00,0.50\n')
+        self.addCleanup(os.remove, catalog.name)
+        out = StringIO()
+        call_command('import_products', catalog.name, stdout=out)
+        self.assertIn('rows/s', out.getvalue())
+        self.assertTrue(Product.objects.filter(sku='SKU-D-1').exists())
+
+
+class AlertEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name="Milk", slug="milk", unit_price=2, cost_price=1,
+            quantity=20, reorder_level=5, sku="SKU-9501",
+            expiry_date=timezone.now().date() + timedelta(days=10))
+
+    def alerts(self, **filters):
+        return InventoryAlert.objects.filter(product=self.product, is_resolved=False, **filters)
+
+    def test_new_product_gets_expiry_alert(self):
+        alert = self.alerts().get()
+        self.assertEqual((alert.alert_type, alert.days_to_expiry), ('expiring', 10))
+
+    def test_unrelated_edits_skip_alert_work(self):
+        self.product.description = "Fresh"
+        with CaptureQueriesContext(connection) as queries:
+            self.product.save()
+        self.assertFalse([q for q in queries if 'inventory_inventoryalert' in q['sql']])
+
+    def test_changes_move_alerts_between_rules(self):
+        self.product.expiry_date = timezone.now().date() - timedelta(days=1)
+        self.product.quantity = 2
+        self.product.save()
+        self.assertEqual(
+            sorted(self.alerts().values_list('alert_type', 'days_to_expiry')),
+            [('expired', None), ('low_stock', None)])
+        self.assertTrue(InventoryAlert.objects.filter(
+            product=self.product, alert_type='expiring', is_resolved=True).exists())
+
+        StockMovement.objects.create(product=self.product, movement_type='purchase', quantity=50)
+        self.assertFalse(self.alerts(alert_type='low_stock').exists())
+
+    def test_sweep_is_set_based_and_idempotent(self):
+        Product.objects.bulk_create([
+            Product(name=f"Bulk {i}", slug=f"bulk-{i}", unit_price=2, cost_price=1,
+                    quantity=i % 2, reorder_level=5, sku=f"SKU-96{i:02d}")
+            for i in range(40)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            changes = evaluate_alerts()
+        self.assertEqual(changes.created, 40)
+        self.assertLessEqual(len(queries), 4)
+        self.assertEqual(InventoryAlert.objects.filter(alert_type='out_of_stock').count(), 20)
+
+        out = StringIO()
+        call_command('evaluate_inventory_alerts', stdout=out)
+        self.assertIn('0 created, 0 updated, 0 resolved', out.getvalue())
+
+
+class ExpirySweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = timezone.now().date()
+        # bulk_create skips the save signals, like a product expiring quietly
+        cls.soon, cls.today_expiring, cls.later = Product.objects.bulk_create([
+            Product(name=name, slug=name.lower(), unit_price=2, cost_price=1, quantity=50,
+                    sku=f"SKU-97{i:02d}", expiry_date=cls.today + timedelta(days=days))
+            for i, (name, days) in enumerate([('Yogurt', 31), ('Bread', 0), ('Rice', 300)])
+        ])
+
+    def open_alerts(self):
+        return set(InventoryAlert.objects.filter(is_resolved=False).values_list('product__name', 'alert_type'))
+
+    def test_first_sweep_covers_the_warning_window(self):
+        changes = sweep_expiry_alerts(today=self.today)
+        self.assertEqual(changes.created, 1)
+        self.assertEqual(self.open_alerts(), {('Bread', 'expiring')})
+        self.assertEqual(SweepWatermark.objects.get().swept_through, self.today)
+
+    def test_later_sweeps_only_visit_products_that_changed(self):
+        sweep_expiry_alerts(today=self.today)
+        tomorrow = self.today + timedelta(days=1)
+        with CaptureQueriesContext(connection) as queries:
+            sweep_expiry_alerts(today=tomorrow)
+        self.assertEqual(self.open_alerts(), {('Bread', 'expired'), ('Yogurt', 'expiring')})
+        self.assertEqual(SweepWatermark.objects.get().products_checked, 2)
+        self.assertLess(len(queries), 15)
+
+        changes = sweep_expiry_alerts(today=tomorrow)
+        self.assertEqual(str(changes), '0 created, 0 updated, 0 resolved')
+
+    def test_sweep_catches_up_missed_days(self):
+        sweep_expiry_alerts(today=self.today - timedelta(days=5))
+        out = StringIO()
+        call_command('sweep_expiry_alerts', date=str(self.today + timedelta(days=1)), stdout=out)
+        self.assertIn('created', out.getvalue())
+        self.assertEqual(self.open_alerts(), {('Bread', 'expired'), ('Yogurt', 'expiring')})
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('searcher', password='pass12345')
+        cls.mouse = Product.objects.create(
+            name="Wireless Mouse", slug="wireless-mouse", unit_price=20, cost_price=10,
+            sku="SKU-9801", barcode="BC-77001", description="Ergonomic laptop accessory")
+        cls.stand = Product.objects.create(
+            name="Laptop Stand", slug="laptop-stand", unit_price=30, cost_price=15,
+            sku="SKU-9802", barcode="BC-77002")
+        Product.objects.create(
+            name="Desk Lamp", slug="desk-lamp", unit_price=25, cost_price=12, sku="SKU-9803")
+
+    def names(self, term):
+        return [product.name for product in search_products(Product.objects.all(), term)]
+
+    def test_sqlite_uses_fts_backend(self):
+        self.assertIsInstance(get_search_backend(), SQLiteFTSBackend)
+
+    def test_results_are_ranked_by_relevance(self):
+        self.assertEqual(self.names('lapt'), ['Laptop Stand', 'Wireless Mouse'])
+        self.assertEqual(self.names('wireless mou'), ['Wireless Mouse'])
+        self.assertEqual(len(self.names('sku-980')), 3)
+
+    def test_exact_sku_and_barcode_fast_path(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.names('BC-77002'), ['Laptop Stand'])
+        self.assertFalse([q for q in queries if 'inventory_product_fts' in q['sql']])
+
+    def test_index_follows_bulk_writes(self):
+        Product.objects.filter(pk=self.stand.pk).update(name="Monitor Riser")
+        StockMovement.objects.create(product=self.mouse, movement_type='purchase', quantity=5)
+        self.assertEqual(self.names('riser'), ['Monitor Riser'])
+        self.assertEqual(self.names('stand'), [])
+        self.mouse.delete()
+        self.assertEqual(self.names('wireless'), [])
+
+    def test_dropped_triggers_are_restored(self):
+        # As when a migration remakes the product table
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER inventory_product_fts_update")
+        Product.objects.filter(pk=self.stand.pk).update(name="Monitor Riser")
+        self.assertEqual(self.names('riser'), [])
+        self.assertEqual(restore_search_triggers(), ['inventory_product_fts_update'])
+        self.assertEqual(self.names('riser'), ['Monitor Riser'])
+        self.assertEqual(restore_search_triggers(), [])
+
+    def test_like_backend_matches_substrings(self):
+        backend = LikeSearchBackend()
+        self.assertEqual(backend.search(Product.objects.all(), 'amp').get(), Product.objects.get(sku='SKU-9803'))
+
+    def test_product_list_search(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('inventory:product_list'), {'search': 'laptop'})
+        self.assertEqual([p.name for p in response.context['products']], ['Laptop Stand', 'Wireless Mouse'])
+
+
+class ProductScanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('scanner', password='pass12345')
+        cls.product = Product.objects.create(
+            name="Barcode Scanner", slug="barcode-scanner", unit_price=80, cost_price=50,
+            sku="SKU-9901", barcode="0012345678905", quantity=12, reorder_level=5)
+
+    def setUp(self):
+        scan_cache.clear()
+        self.client.force_login(self.user)
+
+    def scan(self, code, **extra):
+        return self.client.get(reverse('inventory:product_scan', args=[code]), **extra)
+
+    def test_lookup_by_sku_and_barcode(self):
+        for code in ('SKU-9901', '0012345678905'):
+            response = self.scan(code)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual(data['id'], self.product.pk)
+            self.assertEqual(data['price'], '80.00')
+            self.assertEqual(data['stock_status'], 'In Stock')
+
+    def test_repeat_scans_are_served_from_cache(self):
+        self.scan('SKU-9901')
+        with CaptureQueriesContext(connection) as queries:
+            self.scan('SKU-9901')
+        self.assertFalse([q for q in queries if 'inventory_product' in q['sql']])
+        self.assertEqual(scan_cache.hits, 1)
+
+    def test_unknown_code(self):
+        response = self.scan('NOPE')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['code'], 'NOPE')
+
+    def test_save_invalidates(self):
+        self.scan('0012345678905')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.unit_price = 90
+            self.product.barcode = '0099999999999'
+            self.product.save()
+        self.assertEqual(self.scan('0012345678905').status_code, 404)
+        self.assertEqual(self.scan('0099999999999').json()['price'], '90.00')
+
+    def test_import_invalidates(self):
+        self.scan('SKU-9901')
+        self.assertEqual(self.scan('SKU-NEW-1').status_code, 404)
+        catalog = BytesIO(b'sku,name,unit_price,cost_price\n'
+                          b'9901,Barcode Scanner,95.00,50.00\nNEW-1,Scanner Stand,20.00,8.00\n')
+        catalog.name = 'catalog.csv'
+        with self.captureOnCommitCallbacks(execute=True):
+            import_products(catalog)
+        self.assertEqual(self.scan('SKU-9901').json()['price'], '95.00')
+        self.assertEqual(self.scan('SKU-NEW-1').json()['price'], '20.00')
+
+    def test_stock_movement_invalidates(self):
+        self.assertEqual(self.scan('SKU-9901').json()['quantity'], 12)
+        with self.captureOnCommitCallbacks(execute=True):
+            StockMovement.objects.create(product=self.product, movement_type='sale', quantity=10)
+        data = self.scan('SKU-9901').json()
+        self.assertEqual(data['quantity'], 2)
+        self.assertEqual(data['stock_status'], 'Low Stock')
+
+    @override_settings(SCAN_API_TOKEN='secret-token')
+    def test_token_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.scan('SKU-9901').status_code, 401)
+        self.assertEqual(self.scan('SKU-9901', HTTP_X_SCAN_TOKEN='wrong').status_code, 403)
+        self.assertEqual(self.scan('SKU-9901', HTTP_X_SCAN_TOKEN='secret-token').status_code, 200)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pager', password='pass12345')
+        cls.product = Product.objects.create(
+            name="Paged Product", slug="paged-product", unit_price=10, cost_price=5, sku="SKU-9951")
+        for quantity in range(1, 9):
+            StockMovement.objects.create(product=cls.product, movement_type='purchase', quantity=quantity)
+        # Ties on created_at must still page without gaps or repeats
+        tied = timezone.now() - timedelta(days=1)
+        StockMovement.objects.filter(quantity__in=[2, 3, 4]).update(created_at=tied)
+        cls.expected = list(StockMovement.objects.order_by('-created_at', 'id').values_list('pk', flat=True))
+
+    def test_walks_forward_and_back(self):
+        paginator = CursorPaginator(StockMovement.objects.all(), ('-created_at', 'id'), 3)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([m.pk for page in pages for m in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = paginator.page(page.previous_cursor)
+            self.assertEqual([m.pk for m in page], [m.pk for m in expected])
+        self.assertFalse(page.has_previous())
+
+    def test_deep_pages_skip_offset_and_count(self):
+        paginator = CursorPaginator(StockMovement.objects.all(), ('-created_at', 'id'), 3, count_mode=None)
+        cursor = paginator.page().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            list(paginator.page(cursor))
+        sql = queries[0]['sql'].upper()
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT(', sql)
+
+    def test_approximate_count(self):
+        self.assertEqual(approximate_count(StockMovement.objects.all()), (8, True))
+        self.assertEqual(approximate_count(StockMovement.objects.filter(quantity__gt=2), limit=4), (4, True))
+        self.assertEqual(approximate_count(StockMovement.objects.filter(quantity__gt=6)), (2, False))
+
+    def test_movement_list_view(self):
+        self.client.force_login(self.user)
+        url = reverse('inventory:movement_list')
+        first = self.client.get(url, {'product': self.product.pk})
+        page = first.context['page_obj']
+        self.assertEqual([m.pk for m in page], self.expected)
+        self.assertFalse(page.has_other_pages())
+
+        response = self.client.get(url, {'cursor': 'tampered'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_results_page_by_offset(self):
+        for i in range(30):
+            Product.objects.create(
+                name=f"Gadget {i:02d}", slug=f"gadget-{i:02d}", unit_price=10, cost_price=5, sku=f"SKU-96{i:02d}")
+        self.client.force_login(self.user)
+        url = reverse('inventory:product_list')
+        first = self.client.get(url, {'search': 'gadget'}).context['page_obj']
+        second = self.client.get(url + first.next_link).context['page_obj']
+        self.assertEqual(len(first) + len(second), 30)
+        self.assertFalse(set(first) & set(second))
+
+
+@override_settings(API_TOKEN='api-secret')
+class InventoryApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('apiuser', password='pass12345')
+        cls.category = Category.objects.create(name="API Gadgets", slug="api-gadgets")
+        for i in range(5):
+            Product.objects.create(
+                name=f"Api Product {i}", slug=f"api-product-{i}", unit_price=10, cost_price=5,
+                sku=f"SKU-97{i:02d}", quantity=i * 10, reorder_level=5, category=cls.category)
+
+    def get(self, name, params=None, **headers):
+        headers.setdefault('HTTP_X_API_TOKEN', 'api-secret')
+        return self.client.get(reverse(f'api:{name}'), params or {}, **headers)
+
+    def test_sparse_fields_and_filters(self):
+        response = self.get('products', {'fields': 'sku,quantity', 'stock_status': 'low'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{'sku': 'SKU-9700', 'quantity': 0}])
+        self.assertEqual(self.get('products', {'fields': 'sku,secret'}).status_code, 400)
+
+    def test_search(self):
+        response = self.get('products', {'fields': 'sku', 'search': 'api product'})
+        self.assertEqual(len(response.json()['results']), 5)
+        response = self.get('products', {'fields': 'name', 'search': 'SKU-9702'})
+        self.assertEqual(response.json()['results'], [{'name': 'Api Product 2'}])
+
+    def test_cursor_pages(self):
+        first = self.get('products', {'fields': 'sku', 'limit': 3, 'category': self.category.pk}).json()
+        self.assertEqual(len(first['results']), 3)
+        second = self.client.get(first['next'], HTTP_X_API_TOKEN='api-secret').json()
+        self.assertEqual([r['sku'] for r in first['results'] + second['results']],
+                         [f"SKU-97{i:02d}" for i in range(5)])
+        self.assertIsNone(second['next'])
+
+    def test_etag_not_modified(self):
+        response = self.get('products', {'fields': 'sku'})
+        etag = response['ETag']
+        self.assertEqual(self.get('products', {'fields': 'sku'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Product.objects.filter(sku='SKU-9700').update(sku='SKU-9799')
+        self.assertEqual(self.get('products', {'fields': 'sku'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_movements_and_alerts(self):
+        product = Product.objects.get(sku='SKU-9703')
+        StockMovement.objects.create(product=product, movement_type='sale', quantity=28)
+        movements = self.get('movements', {'product': product.pk, 'count': 'exact'}).json()
+        self.assertEqual(movements['count'], 1)
+        self.assertEqual(movements['results'][0]['after_quantity'], 2)
+        alerts = self.get('alerts', {'fields': 'sku,alert_type', 'resolved': 'false'}).json()['results']
+        self.assertIn({'sku': 'SKU-9703', 'alert_type': 'low_stock'}, alerts)
+
+    def test_authentication(self):
+        response = self.client.get(reverse('api:products'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.get('products', HTTP_X_API_TOKEN='nope').status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('api:products')).status_code, 200)
+
+
+class StockHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('historian', password='pass12345')
+        cls.product = Product.objects.create(
+            name="History Product", slug="history-product", unit_price=10, cost_price=5,
+            sku="SKU-9961", quantity=20)
+
+    def post(self, movement_type, quantity, days_ago=0):
+        movement = StockMovement.objects.create(
+            product=self.product, movement_type=movement_type, quantity=quantity, created_by=self.user)
+        if days_ago:
+            created_at = timezone.now() - timedelta(days=days_ago)
+            StockMovement.objects.filter(pk=movement.pk).update(created_at=created_at)
+        return movement
+
+    def test_postings_update_the_day(self):
+        self.post('purchase', 10)
+        self.post('sale', 4)
+        StockMovement.objects.post_batch([
+            StockMovement(product=self.product, movement_type='loss', quantity=1),
+            StockMovement(product=self.product, movement_type='transfer', quantity=3),
+        ])
+        # The product opened with 20 the same day
+        day = StockLevelDay.objects.get(product=self.product)
+        self.assertEqual((day.opening_quantity, day.closing_quantity), (0, 25))
+        self.assertEqual((day.inflow, day.outflow), (30, 5))
+        self.assertEqual((day.purchased, day.sold, day.lost, day.transferred, day.adjusted), (10, 4, 1, 3, 20))
+        self.assertEqual(day.movement_count, 4)
+
+    def test_direct_edits_are_recorded(self):
+        self.post('purchase', 10)
+        self.product.refresh_from_db()
+        self.product.quantity = 26
+        self.product.save()
+        day = StockLevelDay.objects.get(product=self.product)
+        self.assertEqual((day.closing_quantity, day.adjusted, day.movement_count), (26, 24, 1))
+        self.assertEqual(as_of(self.product, timezone.localdate()), 26)
+        days = StockLevelDay.objects.values_list('date', 'opening_quantity', 'closing_quantity', 'inflow', 'adjusted')
+        expected = list(days)
+        rebuild_history()
+        self.assertEqual(list(days), expected)
+
+    def test_rebuild_matches_incremental(self):
+        self.post('purchase', 10)
+        self.post('sale', 4)
+        expected = list(StockLevelDay.objects.values())
+        self.assertEqual(rebuild_history(), 1)
+        self.assertEqual(list(StockLevelDay.objects.values('opening_quantity', 'closing_quantity', 'inflow')),
+                         [{k: row[k] for k in ('opening_quantity', 'closing_quantity', 'inflow')} for row in expected])
+
+    def test_as_of_and_series(self):
+        Product.objects.filter(pk=self.product.pk).update(created_at=timezone.now() - timedelta(days=30))
+        self.post('purchase', 10, days_ago=5)
+        self.post('sale', 12, days_ago=2)
+        self.post('return', 1)
+        rebuild_history()
+        today = timezone.localdate()
+        self.assertEqual(as_of(self.product, today - timedelta(days=10)), 20)
+        self.assertEqual(as_of(self.product, today - timedelta(days=4)), 30)
+        self.assertEqual(as_of(self.product.pk, today - timedelta(days=2)), 18)
+        self.assertEqual(as_of(self.product, today), 19)
+
+        series = stock_series(self.product, today - timedelta(days=6), today)
+        self.assertEqual(series['closing'], [20, 30, 30, 30, 18, 18, 19])
+        self.assertEqual(series['sold'], [0, 0, 0, 0, 12, 0, 0])
+        self.assertEqual(len(series['dates']), 7)
+
+    def test_product_page_chart(self):
+        self.post('purchase', 5)
+        request = RequestFactory().get('/')
+        request.user = self.user
+        response = ProductDetailView.as_view()(request, slug=self.product.slug)
+        self.assertEqual(response.context_data['stock_history']['closing'][-1], 25)
+
+
+class InventoryValuationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('valuer', password='pass12345')
+        cls.supplier = Supplier.objects.create(name="Valuation Supplier", contact_person="V", email="v@example.com",
+                                               phone="0700000000", address="Nairobi")
+        cls.category = Category.objects.create(name="Valued")
+        cls.other_category = Category.objects.create(name="Revalued")
+        cls.product = Product.objects.create(
+            name="Valued Product", slug="valued-product", unit_price=10, cost_price=5,
+            sku="SKU-9971", quantity=20, category=cls.category, supplier=cls.supplier)
+        valuation.rebuild_valuation()
+
+    def post(self, movement_type, quantity):
+        return StockMovement.objects.create(
+            product=self.product, movement_type=movement_type, quantity=quantity, created_by=self.user)
+
+    def receive_at_new_cost(self):
+        # 20 on hand at 5, then 10 bought at 8 and 25 sold
+        self.product.cost_price = 8
+        self.product.save()
+        self.post('purchase', 10)
+        self.post('sale', 25)
+
+    def test_opening_stock_valued_at_cost(self):
+        self.assertEqual(valuation.total_value(), Decimal('100.00'))
+        self.assertEqual(valuation.category_value(self.category), Decimal('100.00'))
+        self.assertEqual(self.supplier.total_inventory_value(), Decimal('100.00'))
+
+    def test_fifo_consumes_oldest_layers(self):
+        self.receive_at_new_cost()
+        self.assertEqual(valuation.product_value(self.product), Decimal('40.00'))
+        self.assertEqual(valuation.total_value(), Decimal('40.00'))
+        self.assertEqual(valuation.category_value(self.category), Decimal('40.00'))
+        self.assertEqual(self.supplier.total_inventory_value(), Decimal('40.00'))
+        self.assertEqual(list(self.product.cost_layers.filter(remaining__gt=0).values_list('remaining', 'unit_cost')),
+                         [(5, Decimal('8.0000'))])
+
+    @override_settings(INVENTORY_VALUATION_METHOD='average')
+    def test_weighted_average(self):
+        self.receive_at_new_cost()
+        self.assertEqual(self.product.valuation.average_cost, Decimal('6.0000'))
+        self.assertEqual(valuation.product_value(self.product), Decimal('30.00'))
+        self.assertEqual(valuation.total_value(), Decimal('30.00'))
+
+    def test_batch_posting_is_valued(self):
+        StockMovement.objects.post_batch([
+            StockMovement(product=self.product, movement_type='purchase', quantity=5),
+            StockMovement(product=self.product, movement_type='sale', quantity=22),
+        ])
+        self.assertEqual(valuation.product_value(self.product), Decimal('15.00'))
+        self.assertEqual(valuation.total_value(), Decimal('15.00'))
+
+    def test_product_edits_update_rollups(self):
+        self.product.category = self.other_category
+        self.product.quantity = 25
+        self.product.save()
+        self.assertEqual(valuation.category_value(self.category), Decimal('0.00'))
+        self.assertEqual(valuation.category_value(self.other_category), Decimal('125.00'))
+
+        Product.objects.create(name="Second", slug="second-valued", unit_price=3, cost_price=2,
+                               sku="SKU-9972", quantity=4, supplier=self.supplier)
+        self.assertEqual(valuation.total_value(), Decimal('133.00'))
+        self.assertEqual(valuation.category_values()[None], Decimal('8.00'))
+
+        self.product.delete()
+        self.assertEqual(valuation.total_value(), Decimal('8.00'))
+        self.assertEqual(self.supplier.total_inventory_value(), Decimal('8.00'))
+
+    def test_rebuild_matches_incremental(self):
+        self.post('purchase', 10)
+        self.post('sale', 25)
+        self.post('return', 2)
+        expected = list(ValuationTotal.objects.order_by('scope', 'key').values_list('scope', 'key', 'quantity', 'value'))
+        call_command('rebuild_inventory_valuation', stdout=StringIO())
+        self.assertEqual(
+            list(ValuationTotal.objects.order_by('scope', 'key').values_list('scope', 'key', 'quantity', 'value')),
+            expected)
+        self.assertEqual(valuation.total_value(), Decimal('35.00'))
+
+    def test_unbuilt_totals_use_current_cost(self):
+        ValuationTotal.objects.all().delete()
+        self.post('purchase', 10)
+        with self.assertNumQueries(2):
+            self.assertEqual(valuation.total_value(), Decimal('150.00'))
+        self.assertEqual(valuation.category_values(), {self.category.pk: Decimal('150.00')})
+        self.assertEqual(self.supplier.total_inventory_value(), Decimal('150.00'))
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('dashboard')).context['total_value'], Decimal('150.00'))
+        # Reads never build it
+        self.assertFalse(valuation.is_built())
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('rollup-admin', 'admin@example.com', 'pass12345')
+        cls.category = Category.objects.create(name="Rolled Up")
+        cls.suppliers = [
+            Supplier.objects.create(name=f"Rollup Supplier {i}", contact_person="R", email="r@example.com",
+                                    phone="0700000000", address="Nairobi")
+            for i in range(3)
+        ]
+        for i, (quantity, reorder_level, is_active) in enumerate([(10, 5, True), (2, 5, True), (0, 5, False)]):
+            Product.objects.create(
+                name=f"Rollup Product {i}", slug=f"rollup-product-{i}", unit_price=10, cost_price=4,
+                sku=f"SKU-998{i}", quantity=quantity, reorder_level=reorder_level, is_active=is_active,
+                category=cls.category, supplier=cls.suppliers[0])
+
+    def test_annotated_figures(self):
+        supplier = with_rollups(Supplier.objects.filter(pk=self.suppliers[0].pk)).get()
+        self.assertEqual(rollup_values(supplier), {
+            'products_count': 3, 'active_products_count': 2, 'stock_units': 12,
+            'low_stock_count': 1, 'stock_value': Decimal('48'),
+        })
+        empty = with_rollups(Supplier.objects.filter(pk=self.suppliers[1].pk)).get()
+        self.assertEqual((empty.products_count, empty.stock_units, empty.stock_value), (0, 0, 0))
+
+    def test_stock_value_before_and_after_build(self):
+        # Current cost until the valuations are built, historical cost after
+        self.assertEqual(subtree_rollups(self.category)['stock_value'], Decimal('48'))
+        self.assertFalse(valuation.is_built())
+        valuation.rebuild_valuation()
+        Product.objects.filter(supplier=self.suppliers[0]).update(cost_price=5)
+        supplier = with_rollups(Supplier.objects.filter(pk=self.suppliers[0].pk)).get()
+        self.assertEqual(supplier.stock_value, Decimal('48'))
+        self.assertEqual(subtree_rollups(self.category)['stock_value'], Decimal('48'))
+
+    def test_changelists_use_fixed_queries(self):
+        self.client.force_login(self.admin)
+        # Warm up, so one-off lookups on the first request aren't compared
+        self.client.get(reverse('admin:inventory_supplier_changelist'))
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(reverse('admin:inventory_supplier_changelist')).status_code, 200)
+        for i in range(3, 8):
+            Supplier.objects.create(name=f"Rollup Supplier {i}", contact_person="R", email="r@example.com",
+                                    phone="0700000000", address="Nairobi")
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.client.get(reverse('admin:inventory_supplier_changelist')).status_code, 200)
+        self.assertEqual(len(few), len(many))
+
+
+class InventoryMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('metrics-admin', 'admin@example.com', 'pass12345')
+        cls.categories = [Category.objects.create(name=f"Metrics {i}") for i in range(2)]
+        stock = [(10, 5, 0), (5, 5, 0), (0, 5, 1), (3, 2, 1)]
+        for i, (quantity, reorder_level, category) in enumerate(stock):
+            Product.objects.create(
+                name=f"Metrics Product {i}", slug=f"metrics-product-{i}", unit_price=10, cost_price=4,
+                sku=f"SKU-997{i}", quantity=quantity, reorder_level=reorder_level,
+                category=cls.categories[category])
+
+    def test_metrics_in_one_query(self):
+        with self.assertNumQueries(1):
+            metrics = product_metrics(Product.objects.all(), value=F('quantity') * F('cost_price'))
+        self.assertEqual(metrics, {
+            'total_products': 4, 'out_of_stock': 1, 'low_stock': 2, 'stock_units': 18,
+            'total_value': Decimal('72'),
+        })
+        low = filter_products(Product.objects.all(), self.categories[1].pk, 'low_stock')
+        self.assertEqual(product_metrics(low)['total_products'], 1)
+
+    def test_groups_add_up(self):
+        groups = product_metrics(Product.objects.all(), group_by=('category_id',))
+        self.assertEqual({group['category_id']: group['low_stock'] for group in groups},
+                         {self.categories[0].pk: 1, self.categories[1].pk: 1})
+        self.assertEqual(combine(groups), product_metrics(Product.objects.all()))
+
+    def test_report_figures(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('inventory:inventory_report'))
+        summary = response.context['inventory_summary']
+        self.assertEqual((summary['total_products'], summary['out_of_stock'], summary['low_stock']), (4, 1, 2))
+        self.assertEqual([row['count'] for row in response.context['categories']], [2, 2])
+        response = self.client.get(reverse('inventory:inventory_report'), {'stock_status': 'out_of_stock'})
+        summary = response.context['inventory_summary']
+        self.assertEqual((summary['total_products'], summary['total_value']), (1, 0))
+        self.assertEqual(response.context['categories'][0]['percentage'], 100)
+
+class CategoryTreeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('tree-admin', 'tree@example.com', 'pass12345')
+        cls.root = Category.objects.create(name="Tree Root")
+        cls.branch = Category.objects.create(name="Tree Branch", parent=cls.root)
+        cls.leaf = Category.objects.create(name="Tree Leaf", parent=cls.branch)
+        cls.other = Category.objects.create(name="Other Root")
+        for i, category in enumerate([cls.root, cls.branch, cls.leaf]):
+            Product.objects.create(
+                name=f"Tree Product {i}", slug=f"tree-product-{i}", unit_price=10, cost_price=2,
+                sku=f"SKU-997{i}", quantity=5, reorder_level=1, category=category)
+
+    def closure(self):
+        return set(CategoryClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def test_subtree_and_path_queries(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(set(self.root.get_all_children()), {self.branch, self.leaf})
+        with self.assertNumQueries(1):
+            self.assertEqual(self.leaf.get_full_path(), "Tree Root > Tree Branch > Tree Leaf")
+        self.assertEqual(subtree_products(self.branch).count(), 2)
+        rollups = subtree_rollups(self.root)
+        self.assertEqual((rollups['products_count'], rollups['stock_units']), (3, 15))
+        self.assertEqual(rollups['stock_value'], Decimal('30'))
+
+    def test_move_relinks_subtree(self):
+        self.branch.parent = self.other
+        self.branch.save()
+        self.assertEqual(self.leaf.get_ancestors(), [self.other, self.branch])
+        self.assertEqual(subtree_products(self.root).count(), 1)
+        self.assertEqual(subtree_products(self.other).count(), 2)
+
+        incremental = self.closure()
+        self.assertEqual(rebuild_closure(), len(incremental))
+        self.assertEqual(self.closure(), incremental)
+
+    def test_cannot_move_under_own_subtree(self):
+        self.root.parent = self.leaf
+        with self.assertRaises(ValidationError):
+            self.root.full_clean()
+        with self.assertRaises(ValidationError):
+            self.root.save()
+        self.assertEqual(self.leaf.get_ancestors(), [self.root, self.branch])
+
+    def test_delete_detaches_children(self):
+        self.branch.delete()
+        self.leaf.refresh_from_db()
+        self.assertIsNone(self.leaf.parent)
+        self.assertEqual(self.leaf.get_ancestors(), [])
+        self.assertEqual(list(descendants(self.root)), [])
+
+    def test_detail_and_admin_pages(self):
+        self.client.force_login(self.admin)
+        request = RequestFactory().get('/')
+        request.user = self.admin
+        response = CategoryDetailView.as_view()(request, pk=self.root.pk)
+        self.assertEqual(len(response.context_data['products']), 3)
+        self.assertEqual(response.context_data['product_count'], 3)
+
+        url = reverse('admin:inventory_category_changelist')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as few:
+            self.assertContains(self.client.get(url), "Tree Root &gt; Tree Branch &gt; Tree Leaf")
+        for i in range(5):
+            Category.objects.create(name=f"Deep {i}", parent=self.leaf)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(few), len(many))
+
+
+class RequestInstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('profiler', 'profiler@example.com', 'pass12345')
+        cls.user = User.objects.create_user('viewer', password='pass12345')
+        category = Category.objects.create(name="Measured")
+        supplier = Supplier.objects.create(name="Measured Supplier", contact_person="M", email="m@example.com",
+                                           phone="0700000000", address="Nairobi")
+        for i in range(6):
+            Product.objects.create(
+                name=f"Measured {i}", slug=f"measured-{i}", unit_price=10, cost_price=5,
+                sku=f"SKU-996{i}", quantity=i, reorder_level=2, category=category, supplier=supplier)
+
+    def setUp(self):
+        request_stats.clear()
+
+    def test_records_per_view_stats(self):
+        self.client.force_login(self.user)
+        for _ in range(3):
+            self.client.get(reverse('inventory:category_list'))
+        stats = request_stats.summary()['inventory:category_list']
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['budget'], 6)
+        self.assertGreater(stats['queries']['p50'], 0)
+        self.assertGreater(stats['response_bytes']['p99'], 0)
+        self.assertIsNotNone(stats['render_ms'])
+
+    def test_over_budget_fails_under_strict_mode(self):
+        self.client.force_login(self.user)
+        with override_settings(QUERY_BUDGETS={'inventory:category_list': 1}, QUERY_BUDGET_STRICT=True):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('inventory:category_list'))
+        with override_settings(QUERY_BUDGETS={'inventory:category_list': 1}, QUERY_BUDGET_STRICT=False):
+            with self.assertLogs('store_manager.instrumentation', 'WARNING'):
+                self.assertEqual(self.client.get(reverse('inventory:category_list')).status_code, 200)
+        self.assertEqual(request_stats.summary()['inventory:category_list']['over_budget'], 2)
+
+    def test_duplicate_fingerprints(self):
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'x'"),
+                         fingerprint("SELECT * FROM t WHERE id = 3 AND name = 'y'"))
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s)"), "SELECT * FROM t WHERE id IN (...)")
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('inventory:category_list'))
+        self.assertEqual(self.client.get(reverse('request_stats')).status_code, 302)
+        self.client.force_login(self.staff)
+        data = self.client.get(reverse('request_stats')).json()
+        self.assertIn('inventory:category_list', data['views'])
+
+    def test_budgeted_pages(self):
+        # Runs under QUERY_BUDGET_STRICT, so a page over budget raises
+        self.client.force_login(self.staff)
+        for name in ('dashboard', 'inventory:product_list', 'inventory:category_list', 'inventory:movement_list',
+                     'inventory:alert_list', 'inventory:inventory_report', 'api:products',
+                     'admin:inventory_product_changelist', 'admin:inventory_supplier_changelist',
+                     'admin:inventory_category_changelist'):
+            with override_settings(QUERY_BUDGET_STRICT=True):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200, name)
+        self.assertFalse(any(stats['over_budget'] for stats in request_stats.summary().values()))
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=60, CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'response-cache-tests'}})
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('cache-admin', 'admin@example.com', 'pass12345')
+
+    def setUp(self):
+        cache.clear()
+        # Versions move on commit, so every write runs its callbacks
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                name="Cached Product", slug="cached-product", unit_price=10, cost_price=4, sku="SKU-9960",
+                quantity=10, reorder_level=2)
+        self.client.force_login(self.admin)
+
+    def get(self, name, query=None):
+        return self.client.get(reverse(name), query or {})
+
+    def test_repeated_reads_are_served_from_cache(self):
+        url = reverse('inventory:inventory_report')
+        first = self.client.get(f'{url}?stock_status=&movement_type=in&category={self.product.pk}')
+        with CaptureQueriesContext(connection) as queries:
+            again = self.client.get(f'{url}?category={self.product.pk}&movement_type=in')
+        self.assertIsNone(again.context)
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(len(queries), 0)
+        self.assertIsNotNone(self.get('inventory:inventory_report', {'stock_status': 'low_stock'}).context)
+
+    def test_stock_postings_and_edits_invalidate(self):
+        self.get('dashboard')
+        with self.captureOnCommitCallbacks(execute=True):
+            StockMovement.objects.create(product=self.product, movement_type='purchase', quantity=5)
+        response = self.get('dashboard')
+        self.assertIsNotNone(response.context)
+        self.assertIsNone(self.get('dashboard').context)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.reorder_level = 20
+            self.product.save()
+        self.assertEqual(self.get('dashboard').context['low_stock'], 1)
+
+    def test_order_changes_invalidate_order_pages(self):
+        from orders.models import Customer, Order, OrderItem
+        self.get('orders:orders_dashboard')
+        self.get('inventory:inventory_report')
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=Customer.objects.create(name="Cache Customer", email="c@example.com"))
+            OrderItem.objects.create(order=order, product=self.product, quantity=2, price=10)
+        self.assertEqual(self.get('orders:orders_dashboard').context['total_revenue'], 20)
+        self.assertIsNone(self.get('inventory:inventory_report').context)
+
+    def test_pending_messages_skip_the_cache(self):
+        rendered = []
+
+        def render(request):
+            rendered.append(request)
+            return HttpResponse("page")
+
+        request = RequestFactory().get('/report/')
+        request._messages = CookieStorage(request)
+        cached_response(request, 'report', ('inventory',), lambda: render(request))
+        cached_response(request, 'report', ('inventory',), lambda: render(request))
+        self.assertEqual(len(rendered), 1)
+        messages.info(request, "Saved")
+        cached_response(request, 'report', ('inventory',), lambda: render(request))
+        self.assertEqual(len(rendered), 2)
+
+class SeedBenchmarkTests(TestCase):
+    def seed(self):
+        config = SeedConfig(products=40, movements=400, orders=30, customers=5, categories=8,
+                            suppliers=2, until=date(2026, 3, 31))
+        seed_store(config)
+        return config
+
+    def dataset(self, config):
+        products = Product.objects.filter(sku__startswith=config.sku_prefix)
+        movements = StockMovement.objects.filter(product__in=products)
+        return (
+            list(products.order_by('sku').values_list('sku', 'quantity', 'unit_price', 'category__slug')),
+            list(movements.order_by('created_at', 'pk').values_list(
+                'product__sku', 'movement_type', 'quantity', 'after_quantity', 'created_at')),
+        )
+
+    def test_seed_is_consistent(self):
+        config = self.seed()
+        self.assertEqual(Product.objects.filter(sku__startswith=config.sku_prefix).count(), 40)
+        self.assertEqual(StockMovement.objects.count(), 400)
+        for product in Product.objects.filter(sku__startswith=config.sku_prefix):
+            last = product.movements.order_by('-created_at', '-pk').first()
+            self.assertEqual(product.quantity, last.after_quantity if last else 0)
+        start, end = config.window()
+        self.assertFalse(StockMovement.objects.exclude(created_at__range=(start, end)).exists())
+        from orders.models import Order
+        for order in Order.objects.prefetch_related('items'):
+            self.assertEqual(order.total, sum(item.get_total() for item in order.items.all()))
+        self.assertEqual(snapshot_drift(), {})
+        self.assertTrue(valuation.is_built())
+        self.assertEqual(CategoryClosure.objects.filter(ancestor__slug__startswith=config.slug_prefix).values(
+            'descendant').distinct().count(), 8)
+
+    def test_seed_is_reproducible_and_clearable(self):
+        config = self.seed()
+        first = self.dataset(config)
+        self.assertGreater(clear_seed(), 0)
+        self.assertFalse(Product.objects.filter(sku__startswith=config.sku_prefix).exists())
+        self.assertFalse(Category.objects.filter(slug__startswith=config.slug_prefix).exists())
+        self.assertFalse(StockMovement.objects.exists())
+        self.seed()
+        self.assertEqual(self.dataset(config), first)
+
+    def test_benchmark_report(self):
+        self.seed()
+        scenarios = [scenario for scenario in SCENARIOS
+                     if scenario.name in ('product_list', 'product_scan', 'order_list', 'export_orders')]
+        report = run_benchmarks(scenarios, iterations=2)
+        json.dumps(report)
+        self.assertEqual(report['dataset']['inventory.Product'], Product.objects.count())
+        for name in ('product_list', 'product_scan', 'order_list', 'export_orders'):
+            result = report['scenarios'][name]
+            self.assertEqual(result['status'], 200, result)
+            self.assertGreater(result['queries'], 0)
+            self.assertGreater(result['wall_ms']['p50'], 0)
+            self.assertGreater(result['peak_memory_kb'], 0)
+        self.assertGreater(report['scenarios']['export_orders']['response_bytes'], 30 * 20)
+        self.assertFalse(User.objects.filter(username='bench-runner').exists())
+
+        rows = compare_reports(report, report)
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(all(ratio == 1 for _, _, _, ratio, _, _ in rows))
+
+    def test_render_benchmark(self):
+        config = SeedConfig(products=120, movements=0, orders=110, customers=105, categories=4,
+                            suppliers=1, until=date(2026, 3, 31))
+        seed_store(config)
+        report = run_render_benchmarks(iterations=1)
+        self.assertEqual({name: result['rows'] for name, result in report.items()},
+                         {'product_list': 100, 'order_list': 100, 'customer_list': 100})
+        for result in report.values():
+            self.assertGreater(result['cold_ms']['p50'], 0)
+            self.assertLessEqual(result['warm_queries'], result['cold_queries'])
+
+    def test_bench_command_writes_and_compares_reports(self):
+        self.seed()
+        path = os.path.join(tempfile.mkdtemp(), 'bench.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        out = StringIO()
+        call_command('bench_store', scenario=['supplier_list'], iterations=1, no_memory=True,
+                     output=path, stdout=out)
+        with open(path) as report_file:
+            report = json.load(report_file)
+        self.assertIsNone(report['scenarios']['supplier_list']['peak_memory_kb'])
+        call_command('bench_store', scenario=['supplier_list'], iterations=1, compare=path, stdout=out)
+        self.assertIn('Against', out.getvalue())
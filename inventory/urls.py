@@ -7,6 +7,10 @@ urlpatterns = [
     # Products
     path('products/', views.ProductListView.as_view(), name='product_list'),
     path('products/create/', views.ProductCreateView.as_view(), name='product_create'),
+    # Must come before the slug routes, which would otherwise match 'export'
+    path('products/export/', views.product_export, name='product_export'),
+    path('products/import/', views.ProductImportView.as_view(), name='product_import'),
+    path('scan/<str:code>/', views.product_scan, name='product_scan'),
     path('products/<slug:slug>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('products/<slug:slug>/update/', views.ProductUpdateView.as_view(), name='product_update'),
     path('products/<slug:slug>/delete/', views.ProductDeleteView.as_view(), name='product_delete'),
@@ -27,7 +31,8 @@ urlpatterns = [
     # Stock Movements
     path('movements/', views.StockMovementListView.as_view(), name='movement_list'),
     path('movements/create/', views.StockMovementCreateView.as_view(), name='movement_create'),
-    path('products/export/', views.product_export, name='product_export'),
+    path('exports/<int:pk>/', views.ExportJobStatusView.as_view(), name='export_job_status'),
+    path('exports/<int:pk>/download/', views.ExportJobDownloadView.as_view(), name='export_job_download'),
     path('alerts/', views.InventoryAlertListView.as_view(), name='alert_list'),
     path('categories/<int:pk>/', views.CategoryDetailView.as_view(), name='category_detail'),
     path('alerts/<int:pk>/resolve/', views.resolve_alert, name='resolve_alert'),
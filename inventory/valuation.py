@@ -0,0 +1,444 @@
+"""
+Inventory valuation at historical cost.
+
+Every product has a ProductValuation row holding its quantity and value as
+movements post, using the method in ``settings.INVENTORY_VALUATION_METHOD``:
+
+``'fifo'`` (default)
+    Receipts add a CostLayer; issues consume the oldest open layers.
+``'average'``
+    A running weighted-average cost; issues are valued at the average.
+
+Receipts are valued at the product's cost price when they post; returns go
+back in at the current average cost. Stock on hand before a product's first
+valued movement is opened at its cost price.
+
+ValuationTotal keeps the value rolled up for the whole catalog, each
+category and each supplier, updated with the same deltas, so every total is
+a single-row read. Everything is built by replaying the ledger with
+``rebuild_valuation`` (the ``rebuild_inventory_valuation`` command, run once
+on deploy); until then postings skip valuation entirely and the totals fall
+back to stock on hand at current cost price.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import CostLayer, Product, ProductValuation, StockMovement, ValuationTotal
+from .stock import stock_delta
+
+METHODS = ('fifo', 'average')
+VALUE_PLACES = Decimal('0.0001')
+BATCH_SIZE = 500
+
+
+def valuation_method():
+    method = getattr(settings, 'INVENTORY_VALUATION_METHOD', 'fifo')
+    if method not in METHODS:
+        raise ValueError(f"Unknown valuation method {method!r}")
+    return method
+
+
+def quantize(value):
+    return Decimal(value).quantize(VALUE_PLACES)
+
+
+class ProductBook:
+    """
+    In-memory valuation of one product while movements are applied to it
+    """
+
+    def __init__(self, product, valuation, layers, method):
+        self.product_id = product.pk
+        self.category_id = product.category_id
+        self.supplier_id = product.supplier_id
+        self.cost_price = Decimal(product.cost_price)
+        self.valuation = valuation
+        self.layers = layers
+        self.method = method
+        self.new_layers = []
+        self.changed_layers = {}
+        self.is_new = valuation._state.adding
+        self.before = (valuation.quantity, Decimal(valuation.value))
+
+    def receive(self, quantity, unit_cost, movement_id=None, received_at=None):
+        valuation = self.valuation
+        valuation.quantity += quantity
+        valuation.value = Decimal(valuation.value) + quantity * unit_cost
+        if self.method == 'fifo':
+            self.add_layer(quantity, unit_cost, movement_id, received_at)
+        valuation.average_cost = quantize(valuation.value / valuation.quantity) if valuation.quantity > 0 else 0
+
+    def add_layer(self, quantity, unit_cost, movement_id, received_at):
+        last = self.layers[-1] if self.layers else None
+        if last is not None and not last.pk and last.unit_cost == unit_cost:
+            # Receipts at the same cost within one posting share a layer
+            last.quantity += quantity
+            last.remaining += quantity
+            return
+        layer = CostLayer(
+            product_id=self.product_id, movement_id=movement_id,
+            received_at=received_at or timezone.now(),
+            unit_cost=unit_cost, quantity=quantity, remaining=quantity)
+        self.layers.append(layer)
+        self.new_layers.append(layer)
+
+    def issue(self, quantity):
+        valuation = self.valuation
+        if self.method == 'fifo':
+            cost = Decimal(0)
+            remaining = quantity
+            while remaining and self.layers:
+                layer = self.layers[0]
+                taken = min(layer.remaining, remaining)
+                layer.remaining -= taken
+                remaining -= taken
+                cost += taken * Decimal(layer.unit_cost)
+                if layer.pk:
+                    self.changed_layers[layer.pk] = layer
+                if not layer.remaining:
+                    self.layers.pop(0)
+        else:
+            cost = quantity * Decimal(valuation.average_cost)
+        valuation.quantity -= quantity
+        valuation.value = max(Decimal(valuation.value) - cost, Decimal(0))
+        if valuation.quantity <= 0:
+            valuation.value = Decimal(0)
+        elif self.method == 'fifo':
+            valuation.average_cost = quantize(valuation.value / valuation.quantity)
+
+    def apply(self, movement_type, delta, movement_id=None, received_at=None):
+        if delta > 0:
+            if movement_type == 'return' and self.valuation.average_cost:
+                unit_cost = Decimal(self.valuation.average_cost)
+            else:
+                unit_cost = self.cost_price
+            self.receive(delta, unit_cost, movement_id, received_at)
+        elif delta < 0:
+            self.issue(-delta)
+
+    @property
+    def change(self):
+        """
+        ``(quantity, value)`` added since the book was opened
+        """
+        return (self.valuation.quantity - self.before[0], Decimal(self.valuation.value) - self.before[1])
+
+
+class TotalsDelta:
+    """
+    Accumulates changes to the ValuationTotal rows
+    """
+
+    def __init__(self):
+        self.changes = defaultdict(lambda: [0, Decimal(0)])
+
+    def add(self, category_id, supplier_id, quantity, value):
+        if not quantity and not value:
+            return
+        for key in (('all', 0), ('category', category_id or 0), ('supplier', supplier_id or 0)):
+            self.changes[key][0] += quantity
+            self.changes[key][1] += value
+
+    def apply(self, using=None):
+        if not self.changes:
+            return
+        totals = ValuationTotal.objects.using(using)
+        totals.bulk_create(
+            [ValuationTotal(scope=scope, key=key) for scope, key in self.changes], ignore_conflicts=True)
+        for (scope, key), (quantity, value) in self.changes.items():
+            totals.filter(scope=scope, key=key).update(
+                quantity=F('quantity') + quantity, value=F('value') + quantize(value))
+        self.changes.clear()
+
+
+def is_built(using=None):
+    """
+    Whether the valuations have been built; the 'all' total marks it
+    """
+    return ValuationTotal.objects.using(using).filter(scope='all', key=0).exists()
+
+
+def open_books(products, opening_quantities, method, using=None, lock=True):
+    """
+    Loads (or opens) the valuation of each product. Products without one
+    are opened with ``opening_quantities[pk]`` at cost price.
+    """
+    ids = [product.pk for product in products]
+    valuations = ProductValuation.objects.using(using)
+    if lock:
+        valuations = valuations.select_for_update()
+    valuations = valuations.in_bulk(ids)
+    layers = defaultdict(list)
+    if method == 'fifo':
+        for layer in CostLayer.objects.using(using).filter(product_id__in=ids, remaining__gt=0).order_by('id'):
+            layers[layer.product_id].append(layer)
+
+    books = {}
+    for product in products:
+        valuation = valuations.get(product.pk)
+        if valuation is not None:
+            books[product.pk] = ProductBook(product, valuation, layers[product.pk], method)
+            continue
+        # New valuations start from zero, so the opening stock is part of
+        # the change added to the totals
+        book = ProductBook(product, ProductValuation(product_id=product.pk), [], method)
+        opening = max(opening_quantities.get(product.pk, product.quantity), 0)
+        if opening:
+            book.receive(opening, book.cost_price)
+        books[product.pk] = book
+    return books
+
+
+def save_books(books, using=None, totals=True):
+    """
+    Writes the books back and applies their changes to the totals
+    """
+    now = timezone.now()
+    new, existing, new_layers, changed_layers = [], [], [], []
+    delta = TotalsDelta()
+    for book in books.values():
+        book.valuation.value = quantize(book.valuation.value)
+        book.valuation.updated_at = now
+        (new if book.is_new else existing).append(book.valuation)
+        new_layers.extend(book.new_layers)
+        changed_layers.extend(book.changed_layers.values())
+        delta.add(book.category_id, book.supplier_id, *book.change)
+
+    manager = ProductValuation.objects.using(using)
+    manager.bulk_create(new, batch_size=BATCH_SIZE)
+    manager.bulk_update(existing, ['quantity', 'value', 'average_cost', 'updated_at'], batch_size=BATCH_SIZE)
+    CostLayer.objects.using(using).bulk_create(new_layers, batch_size=BATCH_SIZE)
+    CostLayer.objects.using(using).bulk_update(changed_layers, ['remaining'], batch_size=BATCH_SIZE)
+    if totals:
+        delta.apply(using)
+
+
+def record_movements(movements, using=None):
+    """
+    Values posted movements (with before quantities set), in order
+    """
+    movements = list(movements)
+    if not movements or not is_built(using):
+        return
+    by_product = defaultdict(list)
+    products = {}
+    for movement in movements:
+        by_product[movement.product_id].append(movement)
+        products.setdefault(movement.product_id, movement.product)
+
+    with transaction.atomic(using=using):
+        books = open_books(
+            list(products.values()),
+            {pk: group[0].before_quantity for pk, group in by_product.items()},
+            valuation_method(), using=using)
+        for product_id, group in by_product.items():
+            book = books[product_id]
+            for movement in group:
+                book.apply(movement.movement_type, movement.stock_delta, movement.pk, movement.created_at)
+        save_books(books, using)
+
+
+def record_adjustment(product, delta, using=None):
+    """
+    Values a stock change made without a movement (a direct edit of the
+    product's quantity) as a receipt at cost price or an issue
+    """
+    if not delta or not is_built(using):
+        return
+    with transaction.atomic(using=using):
+        books = open_books([product], {product.pk: product.quantity - delta}, valuation_method(), using=using)
+        books[product.pk].apply('adjustment', delta)
+        save_books(books, using)
+
+
+def open_product(product, using=None):
+    """
+    Opens a new product's valuation with its initial stock at cost price
+    """
+    if not is_built(using):
+        return
+    with transaction.atomic(using=using):
+        save_books(open_books([product], {product.pk: product.quantity}, valuation_method(), using=using), using)
+
+
+def move_product(product_id, old_keys, new_keys, using=None):
+    """
+    Moves a product's value between category/supplier totals after it was
+    recategorized or changed supplier. Keys are ``(category_id, supplier_id)``.
+    """
+    valuation = ProductValuation.objects.using(using).filter(product_id=product_id).values_list(
+        'quantity', 'value').first()
+    if not valuation:
+        return
+    quantity, value = valuation
+    delta = TotalsDelta()
+    delta.add(*old_keys, -quantity, -value)
+    delta.add(*new_keys, quantity, value)
+    delta.apply(using)
+
+
+def close_product(product, using=None):
+    """
+    Removes a product that is being deleted from the totals
+    """
+    valuation = ProductValuation.objects.using(using).filter(product_id=product.pk).values_list(
+        'quantity', 'value').first()
+    if valuation:
+        delta = TotalsDelta()
+        delta.add(product.category_id, product.supplier_id, -valuation[0], -valuation[1])
+        delta.apply(using)
+
+
+def sync_products(product_ids, batch_size=BATCH_SIZE):
+    """
+    Brings the valuations of products written in bulk (bypassing save() and
+    movements) up to date: missing valuations are opened and quantity
+    differences valued as adjustments. The totals are then recomputed, as
+    the products may also have changed category or supplier.
+    """
+    if not is_built():
+        return
+    method = valuation_method()
+    products = Product.objects.only('pk', 'quantity', 'cost_price', 'category_id', 'supplier_id')
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), batch_size):
+        with transaction.atomic():
+            chunk = list(products.filter(pk__in=product_ids[start:start + batch_size]))
+            books = open_books(chunk, {}, method)
+            for product in chunk:
+                book = books[product.pk]
+                if not book.is_new:
+                    book.apply('adjustment', product.quantity - book.valuation.quantity)
+            save_books(books, totals=False)
+    rebuild_totals()
+
+
+def rebuild_totals():
+    """
+    Recomputes every ValuationTotal from the product valuations
+    """
+    valuations = ProductValuation.objects.all()
+    rows = [ValuationTotal(scope='all', key=0, **{
+        name: total or 0 for name, total in valuations.aggregate(
+            quantity=Sum('quantity'), value=Sum('value')).items()
+    })]
+    for scope in ('category', 'supplier'):
+        for row in valuations.values(f'product__{scope}_id').annotate(
+                total_quantity=Sum('quantity'), total_value=Sum('value')).order_by():
+            rows.append(ValuationTotal(
+                scope=scope, key=row[f'product__{scope}_id'] or 0,
+                quantity=row['total_quantity'], value=row['total_value']))
+    with transaction.atomic():
+        ValuationTotal.objects.all().delete()
+        ValuationTotal.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def rebuild_valuation(product_ids=None, batch_size=BATCH_SIZE):
+    """
+    Replays the movement ledger into fresh valuations (each product opening
+    with the stock it had before its first movement, at current cost price)
+    and rebuilds the totals. Returns the number of products valued.
+    """
+    method = valuation_method()
+    if not is_built():
+        # A partial rebuild can't produce the totals
+        product_ids = None
+    products = Product.objects.only('pk', 'quantity', 'cost_price', 'category_id', 'supplier_id').order_by('pk')
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+
+    valued = 0
+    with transaction.atomic():
+        valuations = ProductValuation.objects.all()
+        layers = CostLayer.objects.all()
+        if product_ids is not None:
+            valuations = valuations.filter(product_id__in=product_ids)
+            layers = layers.filter(product_id__in=product_ids)
+        layers.delete()
+        valuations.delete()
+
+        ids = list(products.values_list('pk', flat=True))
+        for start in range(0, len(ids), batch_size):
+            chunk = list(products.filter(pk__in=ids[start:start + batch_size]))
+            movements = defaultdict(list)
+            for row in StockMovement.objects.filter(product_id__in=[p.pk for p in chunk]).order_by(
+                    'created_at', 'pk').values_list(
+                    'pk', 'product_id', 'movement_type', 'quantity', 'before_quantity', 'created_at'):
+                movements[row[1]].append(row)
+            opening = {pk: rows[0][4] for pk, rows in movements.items()}
+            books = open_books(chunk, opening, method, lock=False)
+            for product_id, rows in movements.items():
+                for pk, _, movement_type, quantity, _, created_at in rows:
+                    books[product_id].apply(movement_type, stock_delta(movement_type, quantity), pk, created_at)
+            save_books(books, totals=False)
+            valued += len(chunk)
+        rebuild_totals()
+    return valued
+
+
+def current_cost_values(scope='all'):
+    """
+    Stock on hand at current cost price, as for the totals of ``scope``:
+    a dict of key to value (0 for products without a category or supplier)
+    """
+    value = Sum(F('quantity') * F('cost_price'), default=Decimal(0))
+    if scope == 'all':
+        return {0: Product.objects.aggregate(value=value)['value']}
+    return {
+        key or 0: total
+        for key, total in Product.objects.order_by().values_list(f'{scope}_id').annotate(value=value)
+    }
+
+
+def get_totals(scope, key=None):
+    """
+    The values of ``scope`` keyed as in ValuationTotal (only ``key`` when
+    given), at current cost until the valuations are built
+    """
+    wanted = Q(scope=scope) if key is None else Q(scope=scope, key=key)
+    # The 'all' row comes back with them and shows whether they're built
+    rows = ValuationTotal.objects.filter(wanted | Q(scope='all', key=0)).values_list('scope', 'key', 'value')
+    totals, built = {}, False
+    for row_scope, row_key, value in rows:
+        built = built or (row_scope, row_key) == ('all', 0)
+        if row_scope == scope and (key is None or row_key == key):
+            totals[row_key] = value
+    if built:
+        return totals
+    totals = current_cost_values(scope)
+    return totals if key is None else {key: totals.get(key, Decimal(0))}
+
+
+def total_value(scope='all', key=0):
+    value = get_totals(scope, key).get(key)
+    return quantize(value).quantize(Decimal('0.01')) if value is not None else Decimal('0.00')
+
+
+def category_value(category):
+    return total_value('category', getattr(category, 'pk', category) or 0)
+
+
+def supplier_value(supplier):
+    return total_value('supplier', getattr(supplier, 'pk', supplier) or 0)
+
+
+def category_values():
+    """
+    Maps category id (None for uncategorized) to inventory value
+    """
+    return {
+        key or None: quantize(value).quantize(Decimal('0.01'))
+        for key, value in get_totals('category').items()
+    }
+
+
+def product_value(product):
+    valuation = ProductValuation.objects.filter(product_id=product.pk).values_list('value', flat=True).first()
+    if valuation is None:
+        return product.quantity * product.cost_price
+    return valuation.quantize(Decimal('0.01'))
@@ -1,4 +1,11 @@
+import csv
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from django.views import View
+from django.views.decorators.http import require_GET
 from django.views.generic import (
     ListView, DetailView, CreateView, 
     UpdateView, DeleteView, TemplateView
@@ -9,17 +16,35 @@ from django.shortcuts import render
 from datetime import timedelta
 from orders.models import OrderItem # Import OrderItem from orders app
 from .models import Product  # and any other models you need
-from django.http import HttpResponse
-from django.urls import reverse_lazy
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse, reverse_lazy
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.shortcuts import get_object_or_404, redirect
+from django.db import IntegrityError
 from django.db.models import Sum, F, Q, Count
 from django.contrib import messages
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from orders.models import Order, Customer
+from orders.sales import sales_totals, top_products
 from inventory.models import Category  # and any other inventory models you need
-from .models import Product, Supplier, StockMovement, ProductImage, InventoryAlert, Category
+from .models import Product, Supplier, StockMovement, ProductImage, InventoryAlert, Category, ExportJob
 from django.contrib.auth.forms import UserCreationForm
+from store_manager.caching import CachedResponseMixin, cache_response
+from store_manager.instrumentation import query_budget
+from store_manager.pagination import CursorPaginationMixin
+from .categories import subtree_products
+from .rollups import rollup_values, subtree_rollups, with_rollups
+from .snapshot import get_snapshot
+from . import valuation
+from .exports import BLOCK_SIZE
+from .export_jobs import chunk_paths, export_or_enqueue
+from .history import stock_series
+from .metrics import METRIC_FIELDS, STOCK_STATUSES, combine, filter_products, product_metrics
+from .importers import import_products
+from .scan import lookup as scan_lookup
+from .search import search_products
 from .forms import (
     ProductForm, StockMovementForm, 
     CategoryForm, SupplierForm, ProductImageForm,InventoryAlertForm
@@ -36,19 +61,21 @@ def register(request):
         form = UserCreationForm()
     return render(request, 'registration/register.html', {'form': form})
 
-class DashboardView(LoginRequiredMixin, TemplateView):
+class DashboardView(LoginRequiredMixin, CachedResponseMixin, TemplateView):
     template_name = 'inventory/dashboard.html'
+    query_budget = 10
+    cache_domains = ('inventory',)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
         # Inventory summary
         products = Product.objects.all()
-        context['total_products'] = products.count()
-        context['low_stock'] = products.filter(quantity__lte=F('reorder_level')).count()
-        context['out_of_stock'] = products.filter(quantity=0).count()
-        context['total_value'] = products.aggregate(
-            total=Sum(F('quantity') * F('cost_price')))['total'] or 0
+        snapshot = get_snapshot()
+        context['total_products'] = snapshot.total_products
+        context['low_stock'] = snapshot.low_stock_count
+        context['out_of_stock'] = snapshot.out_of_stock_count
+        context['total_value'] = valuation.total_value()
         
         # Recent activity
         context['recent_movements'] = StockMovement.objects.select_related(
@@ -67,25 +94,29 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         
         return context
 
-class ProductListView(LoginRequiredMixin, ListView):
+class ProductListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Product
     template_name = 'inventory/product_list.html'
     context_object_name = 'products'
     paginate_by = 25
+    cursor_ordering = ('name', 'id')
+    query_budget = 12
+
+    def get_cursor_ordering(self):
+        # Search results keep their relevance order and page by offset
+        if self.request.GET.get('search'):
+            return None
+        return self.cursor_ordering
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related('category', 'supplier')
+        # The row thumbnails come from the prefetched images
+        queryset = super().get_queryset().select_related('category', 'supplier').prefetch_related('images')
         search = self.request.GET.get('search')
         category = self.request.GET.get('category')
         supplier = self.request.GET.get('supplier')
         stock_status = self.request.GET.get('stock_status')
         expiry_status = self.request.GET.get('expiry_status')
 
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(sku__icontains=search) |
-                Q(barcode__icontains=search))
         if category:
             queryset = queryset.filter(category__id=category)
         if supplier:
@@ -101,16 +132,21 @@ class ProductListView(LoginRequiredMixin, ListView):
         elif expiry_status == 'expired':
             queryset = queryset.filter(expiry_date__lt=timezone.now().date())
 
+        if search:
+            # Results come back ordered by relevance
+            return search_products(queryset, search)
         return queryset.order_by('name')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = Category.objects.filter(is_active=True)
         context['suppliers'] = Supplier.objects.filter(is_active=True)
-        context['total_value'] = Product.objects.aggregate(
-            total=Sum(F('quantity') * F('cost_price')))['total'] or 0
+        context['total_value'] = valuation.total_value()
         return context
 
+# Days of stock history charted on the product page
+STOCK_CHART_DAYS = 90
+
 class ProductDetailView(LoginRequiredMixin, DetailView):
     model = Product
     template_name = 'inventory/product_detail.html'
@@ -123,6 +159,9 @@ class ProductDetailView(LoginRequiredMixin, DetailView):
         context['images'] = self.object.images.all()
         context['alerts'] = self.object.inventoryalert_set.filter(
             is_resolved=False).order_by('-created_at')
+        today = timezone.localdate()
+        context['stock_history'] = stock_series(
+            self.object, today - timedelta(days=STOCK_CHART_DAYS - 1), today)
         return context
 
 class ProductCreateView(LoginRequiredMixin, CreateView):
@@ -182,20 +221,10 @@ class CategoryListView(LoginRequiredMixin, ListView):
     model = Category
     template_name = 'inventory/category_list.html'
     context_object_name = 'categories'
+    query_budget = 6
 
     def get_queryset(self):
-        return Category.objects.filter(parent__isnull=True, is_active=True)
-
-from django.db.models import Count
-
-class CategoryDetailView(LoginRequiredMixin, DetailView):
-    model = Category
-    template_name = 'inventory/category_detail.html'
-    context_object_name = 'category'
-    
-    def get_queryset(self):
-        return super().get_queryset().annotate(
-            active_products_count=Count('products', filter=Q(products__is_active=True)))
+        return with_rollups(Category.objects.filter(parent__isnull=True, is_active=True))
 
 class CategoryCreateView(LoginRequiredMixin, CreateView):
     model = Category
@@ -229,6 +258,7 @@ class SupplierListView(LoginRequiredMixin, ListView):
     template_name = 'inventory/supplier_list.html'
     context_object_name = 'suppliers'
     paginate_by = 20
+    query_budget = 6
 
     def get_queryset(self):
         return Supplier.objects.filter(is_active=True).order_by('name')
@@ -238,11 +268,14 @@ class SupplierDetailView(LoginRequiredMixin, DetailView):
     template_name = 'inventory/supplier_detail.html'
     context_object_name = 'supplier'
 
+    def get_queryset(self):
+        return with_rollups(super().get_queryset())
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['products'] = self.object.products.filter(is_active=True)
-        context['total_inventory_value'] = sum(
-            product.total_value for product in context['products'])
+        context['total_inventory_value'] = self.object.stock_value.quantize(Decimal('0.01'))
+        context['rollups'] = rollup_values(self.object)
         return context
 
 class SupplierCreateView(LoginRequiredMixin, CreateView):
@@ -271,11 +304,13 @@ class SupplierDeleteView(LoginRequiredMixin, DeleteView):
         messages.success(request, f"Supplier '{supplier.name}' deactivated.")
         return redirect(self.success_url)
 
-class StockMovementListView(LoginRequiredMixin, ListView):
+class StockMovementListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = StockMovement
-    template_name = 'inventory/movement_list.html'
+    template_name = 'inventory/stockmovement_list.html'
     context_object_name = 'movements'
     paginate_by = 50
+    cursor_ordering = ('-created_at', 'id')
+    query_budget = 6
 
     def get_queryset(self):
         queryset = super().get_queryset().select_related('product', 'created_by')
@@ -294,7 +329,7 @@ class StockMovementListView(LoginRequiredMixin, ListView):
             week_ago = timezone.now() - timezone.timedelta(days=7)
             queryset = queryset.filter(created_at__gte=week_ago)
             
-        return queryset.order_by('-created_at')
+        return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -328,26 +363,6 @@ class StockMovementDetailView(LoginRequiredMixin, DetailView):
     template_name = 'inventory/movement_detail.html'
     context_object_name = 'movement'
 
-class InventoryAlertListView(LoginRequiredMixin, ListView):
-    model = InventoryAlert
-    template_name = 'inventory/alert_list.html'
-    context_object_name = 'alerts'
-    paginate_by = 25
-
-    def get_queryset(self):
-        queryset = super().get_queryset().select_related('product', 'resolved_by')
-        alert_type = self.request.GET.get('type')
-        resolved = self.request.GET.get('resolved')
-        
-        if alert_type:
-            queryset = queryset.filter(alert_type=alert_type)
-        if resolved == 'true':
-            queryset = queryset.filter(is_resolved=True)
-        elif resolved == 'false':
-            queryset = queryset.filter(is_resolved=False)
-            
-        return queryset.order_by('-created_at')
-
 class ResolveAlertView(LoginRequiredMixin, View):
     def post(self, request, pk):
         alert = get_object_or_404(InventoryAlert, pk=pk)
@@ -356,10 +371,98 @@ class ResolveAlertView(LoginRequiredMixin, View):
         return redirect('inventory:alert_list')
     
 
+@login_required
 def product_export(request):
-    # Implement your export logic here
-    return HttpResponse("Export not implemented yet.")
-# Note: This is a placeholder function. You can implement CSV or Excel export functionality as needed.
+    return export_or_enqueue(request, 'products')
+
+
+@require_GET
+@query_budget(3)
+def product_scan(request, code):
+    """
+    JSON lookup for barcode scanners. Scanners send the X-Scan-Token header
+    (settings.SCAN_API_TOKEN) so no session is loaded; browsers fall back to
+    the logged-in user.
+    """
+    if 'X-Scan-Token' in request.headers:
+        token = getattr(settings, 'SCAN_API_TOKEN', None)
+        if not token or not constant_time_compare(request.headers['X-Scan-Token'], token):
+            return JsonResponse({'error': "Invalid scan token"}, status=403)
+    elif not request.user.is_authenticated:
+        return JsonResponse({'error': "Authentication required"}, status=401)
+
+    payload = scan_lookup(code)
+    if payload is None:
+        return JsonResponse({'error': "Unknown code", 'code': code}, status=404)
+    return JsonResponse(payload)
+
+
+class ProductImportView(LoginRequiredMixin, View):
+    template_name = 'inventory/product_import.html'
+
+    def get(self, request):
+        return render(request, self.template_name)
+
+    def post(self, request):
+        catalog = request.FILES.get('catalog_file')
+        if not catalog:
+            messages.error(request, "Please choose a CSV or JSON Lines file")
+            return render(request, self.template_name)
+
+        try:
+            report = import_products(catalog, create_missing=bool(request.POST.get('create_missing')))
+        except (ValidationError, IntegrityError, UnicodeDecodeError, csv.Error) as e:
+            messages.error(request, f"Error importing file: {getattr(e, 'message', e)}")
+            return render(request, self.template_name)
+
+        messages.success(
+            request,
+            f"Imported {report.rows} rows in {report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s): "
+            f"{report.created} created, {report.updated} updated, {len(report.errors)} skipped."
+        )
+        if not report.errors:
+            return redirect('inventory:product_list')
+        return render(request, self.template_name, {'report': report})
+
+
+def get_export_job(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk)
+    # Jobs without a requester are staff-only
+    if not request.user.is_staff and (job.requested_by_id is None or job.requested_by_id != request.user.pk):
+        raise Http404("No such export job")
+    return job
+
+
+class ExportJobStatusView(LoginRequiredMixin, View):
+    def get(self, request, pk):
+        job = get_export_job(request, pk)
+        return JsonResponse({
+            'id': job.pk,
+            'export': job.export,
+            'status': job.status,
+            'progress': job.progress,
+            'rows_written': job.rows_written,
+            'estimated_rows': job.estimated_rows,
+            'error': job.error,
+            'download_url': reverse('inventory:export_job_download', args=[job.pk])
+            if job.status == 'completed' else None,
+        })
+
+
+class ExportJobDownloadView(LoginRequiredMixin, View):
+    def get(self, request, pk):
+        job = get_export_job(request, pk)
+        if job.status != 'completed':
+            return JsonResponse({'status': job.status, 'error': "Export is not ready yet"}, status=409)
+
+        def chunks():
+            for path in chunk_paths(job):
+                with open(path, 'rb') as chunk:
+                    yield from iter(lambda: chunk.read(BLOCK_SIZE), b'')
+
+        response = StreamingHttpResponse(chunks(), content_type='application/gzip')
+        response['Content-Disposition'] = f'attachment; filename="{job.filename}.gz"'
+        return response
 
 class CategoryDetailView(LoginRequiredMixin, DetailView):
     model = Category
@@ -367,9 +470,15 @@ class CategoryDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'category'
 
     def get_context_data(self, **kwargs):
+        # Products and figures cover the whole subtree, not only this level
         context = super().get_context_data(**kwargs)
-        context['products'] = self.object.products.filter(is_active=True)
+        rollups = subtree_rollups(self.object)
+        context['products'] = subtree_products(self.object).filter(is_active=True).order_by('name')
         context['child_categories'] = self.object.children.filter(is_active=True)
+        context['breadcrumbs'] = self.object.get_ancestors(include_self=True)
+        context['product_count'] = rollups['products_count']
+        context['active_product_count'] = rollups['active_products_count']
+        context['rollups'] = rollups
         return context      
 class CategoryCreateView(LoginRequiredMixin, CreateView):
     model = Category
@@ -536,11 +645,13 @@ class InventoryAlertResolveView(LoginRequiredMixin, View):
         alert.resolve(request.user)
         messages.success(request, "Alert marked as resolved.")
         return redirect('inventory:alert_list') 
-class InventoryAlertListView(LoginRequiredMixin, ListView): 
+class InventoryAlertListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = InventoryAlert
-    template_name = 'inventory/alert_list.html'
+    template_name = 'inventory/inventoryalert_list.html'
     context_object_name = 'alerts'
     paginate_by = 25
+    cursor_ordering = ('-created_at', 'id')
+    query_budget = 6
 
     def get_queryset(self):
         queryset = super().get_queryset().select_related('product', 'resolved_by')
@@ -554,7 +665,7 @@ class InventoryAlertListView(LoginRequiredMixin, ListView):
         elif resolved == 'false':
             queryset = queryset.filter(is_resolved=False)
             
-        return queryset.order_by('-created_at') 
+        return queryset
 class InventoryAlertDetailView(LoginRequiredMixin, DetailView):
     model = InventoryAlert
     template_name = 'inventory/alert_detail.html'
@@ -607,89 +718,61 @@ class InventoryAlertResolveView(LoginRequiredMixin, View):
         messages.success(request, "Alert marked as resolved.")
         return redirect('inventory:alert_list') 
     
+@cache_response('inventory')
 def low_stock_report(request):
     low_stock_items = Product.objects.filter(quantity__lt=10)  # example threshold
     return render(request, 'inventory/low_stock.html', {'items': low_stock_items})
 
 
+@cache_response('orders', 'inventory')
+@query_budget(6)
 def sales_report(request):
-    # Get today's date
-    today = timezone.now().date()
+    """
+    Sales totals and top products, read from the precomputed sales facts
+    (see orders.sales); dates are local order dates
+    """
+    today = timezone.localdate()
     last_week = today - timedelta(days=7)
     last_month = today - timedelta(days=30)
-    
+
     # Get filter parameters from request
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
     status = request.GET.get('status')
     product_id = request.GET.get('product')
-    
-    # Base queryset
-    order_items = OrderItem.objects.select_related('order', 'product')
-    
-    # Apply filters
-    if status:
-        order_items = order_items.filter(order__status=status)
-    if product_id:
-        order_items = order_items.filter(product_id=product_id)
-    
-    # Date filtering
-    date_filter_applied = False
-    if start_date and end_date:
-        try:
-            order_items = order_items.filter(
-                order__order_date__date__range=[start_date, end_date]
-            )
-            date_filter_applied = True
-        except:
-            pass
-    
-    # Calculate sales data
-    daily_sales = order_items.filter(
-        order__order_date__date=today
-    ).aggregate(
-        total_sales=Sum(F('quantity') * F('price')),
-        total_orders=Count('order', distinct=True)
-    ) if not date_filter_applied else None
-    
-    weekly_sales = order_items.filter(
-        order__order_date__date__gte=last_week
-    ).aggregate(
-        total_sales=Sum(F('quantity') * F('price')),
-        total_orders=Count('order', distinct=True)
-    ) if not date_filter_applied else None
-    
-    monthly_sales = order_items.filter(
-        order__order_date__date__gte=last_month
-    ).aggregate(
-        total_sales=Sum(F('quantity') * F('price')),
-        total_orders=Count('order', distinct=True)
-    )
-    
-    # Filtered results (when date range is applied)
-    filtered_sales = order_items.aggregate(
-        total_sales=Sum(F('quantity') * F('price')),
-        total_orders=Count('order', distinct=True)
-    ) if date_filter_applied else None
-    
-    # Top selling products
-    top_products = order_items.values(
-        'product__name',
-        'product__sku'
-    ).annotate(
-        total_sold=Sum('quantity'),
-        revenue=Sum(F('quantity') * F('price'))
-    ).order_by('-revenue')[:10]
-    
-    # Prepare context
+    sku = request.GET.get('sku', '').strip()
+    # The catalog is too large for a product dropdown: filter by SKU
+    selected_product = None
+    if sku:
+        selected_product = Product.objects.filter(sku=sku).only('pk', 'name', 'sku').first()
+    elif product_id and product_id.isdigit():
+        selected_product = Product.objects.filter(pk=product_id).only('pk', 'name', 'sku').first()
+    product_id = selected_product.pk if selected_product else None
+    if (sku or request.GET.get('product')) and selected_product is None:
+        messages.warning(request, "No product matches that filter; showing all products.")
+
+    try:
+        start, end = parse_date(start_date or ''), parse_date(end_date or '')
+    except ValueError:
+        start = end = None
+    date_filter_applied = bool(start and end)
+
+    if date_filter_applied:
+        periods = {'filtered': (start, end)}
+        top_range = (start, end)
+    else:
+        periods = {'daily': (today, today), 'weekly': (last_week, None), 'monthly': (last_month, None)}
+        top_range = (last_month, None)
+    totals = sales_totals(periods, status=status, product=product_id)
+
     context = {
-        'daily_sales': daily_sales or {'total_sales': 0, 'total_orders': 0},
-        'weekly_sales': weekly_sales or {'total_sales': 0, 'total_orders': 0},
-        'monthly_sales': monthly_sales or {'total_sales': 0, 'total_orders': 0},
-        'filtered_sales': filtered_sales,
-        'top_products': top_products,
+        'daily_sales': totals.get('daily', {'total_sales': 0, 'total_orders': 0}),
+        'weekly_sales': totals.get('weekly', {'total_sales': 0, 'total_orders': 0}),
+        'monthly_sales': totals.get('monthly', {'total_sales': 0, 'total_orders': 0}),
+        'filtered_sales': totals.get('filtered'),
+        'top_products': top_products(*top_range, status=status, product=product_id),
         'status_choices': Order.STATUS_CHOICES,
-        'all_products': Product.objects.all(),
+        'selected_product': selected_product,
         'date_filter_applied': date_filter_applied,
         'report_date': today,
         'start_date': start_date,
@@ -698,6 +781,8 @@ def sales_report(request):
     
     return render(request, 'inventory/reports/sales.html', context)
 
+@cache_response('inventory')
+@query_budget(12)
 def inventory_report(request):
     # Get filter parameters
     category_id = request.GET.get('category')
@@ -706,28 +791,28 @@ def inventory_report(request):
     movement_start = request.GET.get('movement_start')
     movement_end = request.GET.get('movement_end')
     
-    # Base product queryset
-    products = Product.objects.all()
-    
-    # Category filter
-    if category_id:
-        products = products.filter(category_id=category_id)
-    
-    # Stock status filter
-    if stock_status == 'out_of_stock':
-        products = products.filter(quantity=0)
-    elif stock_status == 'low_stock':
-        products = products.filter(quantity__lt=F('reorder_level'))
+    products = filter_products(Product.objects.all(), category_id, stock_status)
     
-    # Inventory summary
-    inventory_summary = {
-        'total_products': products.count(),
-        'out_of_stock': products.filter(quantity=0).count(),
-        'low_stock': products.filter(quantity__lt=F('reorder_level')).count(),
-        'total_value': products.aggregate(
-            total=Sum(F('quantity') * F('cost_price'))
-        )['total'] or 0
-    }
+    # Inventory summary and category distribution from one grouped query,
+    # valued from the rollups unless filtered by stock status
+    group_by = ('category__name', 'category__id')
+    if stock_status in STOCK_STATUSES:
+        categories = product_metrics(products, value='valuation__value', group_by=group_by)
+        inventory_summary = combine(categories, METRIC_FIELDS + ('total_value',))
+    else:
+        categories = product_metrics(products, group_by=group_by)
+        category_values = valuation.category_values()
+        for category in categories:
+            category['total_value'] = category_values.get(category['category__id'], 0)
+        inventory_summary = combine(categories)
+        if category_id:
+            inventory_summary['total_value'] = valuation.category_value(int(category_id))
+        else:
+            inventory_summary['total_value'] = valuation.total_value()
+    categories.sort(key=lambda category: category['total_products'], reverse=True)
+    for category in categories:
+        category['count'] = category['total_products']
+        category['percentage'] = 100 * category['count'] / inventory_summary['total_products']
     
     # Stock movements filtering
     stock_movements = StockMovement.objects.select_related('product')
@@ -747,14 +832,6 @@ def inventory_report(request):
     
     stock_movements = stock_movements.order_by('-created_at')[:20]
     
-    # Category distribution (with current filters)
-    categories = products.values(
-        'category__name', 'category__id'
-    ).annotate(
-        count=Count('id'),
-        total_value=Sum(F('quantity') * F('cost_price'))
-    ).order_by('-count')
-    
     context = {
         'inventory_summary': inventory_summary,
         'stock_movements': stock_movements,
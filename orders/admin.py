@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.html import format_html
 from .models import Customer, Order, OrderItem
 
@@ -37,11 +38,17 @@ class CustomerAdmin(admin.ModelAdmin):
     readonly_fields = ['preview_image']
 
     def preview_image(self, obj):
-        if obj.image:
-            return format_html('<img src="{}" width="60" style="border-radius:5px;" />', obj.image.url)
+        # Customer has no image field yet
+        image = getattr(obj, 'image', None)
+        if image:
+            return format_html('<img src="{}" width="60" style="border-radius:5px;" />', image.url)
         return "No Image"
     preview_image.short_description = 'Image'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(orders_count=Count('order'))
+
     def order_count(self, obj):
-        return obj.order_set.count()
+        return obj.orders_count
     order_count.short_description = 'Orders'
+    order_count.admin_order_field = 'orders_count'
@@ -0,0 +1,32 @@
+"""
+JSON API endpoints for orders and customers (see store_manager.api)
+"""
+from store_manager.api import ApiListView
+from .views import CustomerListView, OrderListView
+
+
+class OrderApiView(ApiListView):
+    list_view = OrderListView
+    page_size = OrderListView.paginate_by
+    fields = {
+        'id': 'id',
+        'customer': 'customer_id',
+        'customer_name': 'customer__name',
+        'order_date': 'order_date',
+        'status': 'status',
+        'total': 'total',
+    }
+
+
+class CustomerApiView(ApiListView):
+    list_view = CustomerListView
+    page_size = CustomerListView.paginate_by
+    ordering = ('name', 'id')
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'email': 'email',
+        'phone': 'phone',
+        'address': 'address',
+        'created_at': 'created_at',
+    }
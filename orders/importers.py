@@ -0,0 +1,142 @@
+"""
+Streaming CSV import of order items.
+
+The upload is decoded line by line and processed in chunks. Each chunk
+resolves its orders and products with one ``in_bulk`` query apiece,
+validates rows in memory and inserts the valid ones with ``bulk_create``.
+The whole import runs in one transaction, so every affected order total is
+recomputed once, at commit.
+"""
+import codecs
+import csv
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from inventory.models import Product
+from .models import Order, OrderItem
+
+CHUNK_SIZE = 1000
+COLUMNS = ('order_id', 'product_id', 'quantity', 'price')
+# OrderItem.price holds 10 digits, 2 of them decimals
+MAX_PRICE = Decimal('100000000')
+
+
+class ImportReport:
+    """
+    Outcome of an import: how many items were created and why the other
+    rows were skipped
+    """
+
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+        self.order_ids = set()
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def skipped(self):
+        return len(self.errors)
+
+
+def read_rows(uploaded_file, require_order=True):
+    """
+    Yields ``(line_number, row)`` for each data row without reading the
+    whole file into memory
+    """
+    reader = csv.DictReader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+    required = COLUMNS if require_order else COLUMNS[1:]
+    missing = [column for column in required if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValidationError(f"Missing column(s): {', '.join(missing)}")
+    for row in reader:
+        yield reader.line_num, row
+
+
+def parse_row(row, order=None):
+    """
+    Returns ``(order_id, product_id, quantity, price)``; price is None when
+    the column is blank. Raises ValueError with a readable message.
+    """
+    values = {}
+    for column in ('order_id', 'product_id', 'quantity'):
+        raw = (row.get(column) or '').strip()
+        if column == 'order_id' and order is not None and not raw:
+            values[column] = order.pk
+            continue
+        try:
+            values[column] = int(raw)
+        except ValueError:
+            raise ValueError(f"{column} must be a whole number, got {raw!r}")
+    if values['quantity'] <= 0:
+        raise ValueError("quantity must be positive")
+    if order is not None and values['order_id'] != order.pk:
+        raise ValueError(f"Row belongs to order {values['order_id']}, not order {order.pk}")
+
+    # A blank price means the product's unit price; 0 is a free item
+    raw = (row.get('price') or '').strip()
+    price = None
+    if raw != '':
+        try:
+            price = Decimal(raw)
+        except InvalidOperation:
+            raise ValueError(f"price must be a number, got {raw!r}")
+        if not price.is_finite():
+            raise ValueError(f"price must be a number, got {raw!r}")
+        if price >= MAX_PRICE:
+            raise ValueError(f"price must be less than {MAX_PRICE}, got {raw}")
+        if price < 0 or price != price.quantize(Decimal('0.01')):
+            raise ValueError(f"price must be a positive amount with at most 2 decimals, got {raw}")
+        # Drops the sign of -0
+        price = price.copy_abs()
+    return values['order_id'], values['product_id'], values['quantity'], price
+
+
+def import_chunk(rows, report, order=None):
+    parsed = []
+    for line, row in rows:
+        try:
+            parsed.append((line, *parse_row(row, order)))
+        except ValueError as e:
+            report.add_error(line, str(e))
+
+    orders = Order.objects.in_bulk({row[1] for row in parsed}) if order is None else {order.pk: order}
+    products = Product.objects.only('id', 'unit_price').in_bulk({row[2] for row in parsed})
+
+    items = []
+    for line, order_id, product_id, quantity, price in parsed:
+        if order_id not in orders:
+            report.add_error(line, f"Order {order_id} does not exist")
+        elif product_id not in products:
+            report.add_error(line, f"Product {product_id} does not exist")
+        else:
+            items.append(OrderItem(
+                order_id=order_id, product_id=product_id, quantity=quantity,
+                price=price if price is not None else products[product_id].unit_price,
+            ))
+
+    OrderItem.objects.bulk_create(items, batch_size=500)
+    report.imported += len(items)
+    report.order_ids.update(item.order_id for item in items)
+
+
+def import_order_items(uploaded_file, order=None, chunk_size=CHUNK_SIZE):
+    """
+    Imports order items from a CSV upload with the columns
+    ``order_id,product_id,quantity,price``. When ``order`` is given, rows
+    belong to that order and ``order_id`` may be left out. Invalid rows are
+    skipped and listed in the returned ImportReport.
+    """
+    report = ImportReport()
+    rows = read_rows(uploaded_file, require_order=order is None)
+    with transaction.atomic():
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            import_chunk(chunk, report, order)
+    return report
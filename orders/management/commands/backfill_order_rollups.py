@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders.rollups import backfill_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the hourly order revenue rollups from existing order history"
+
+    def handle(self, *args, **options):
+        buckets = backfill_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {buckets} revenue rollup buckets"))
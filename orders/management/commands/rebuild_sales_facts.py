@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.sales import rebuild_sales
+
+
+class Command(BaseCommand):
+    help = "Recomputes the daily sales facts from the order items"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = rebuild_sales(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} sales fact rows"))
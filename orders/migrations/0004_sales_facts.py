@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def build_sales_facts(apps, schema_editor):
+    # Same aggregation as orders.sales.rebuild_sales, on the historical models
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    SalesFact = apps.get_model('orders', 'SalesFact')
+    SalesDay = apps.get_model('orders', 'SalesDay')
+    items = OrderItem.objects.annotate(date=TruncDate('order__order_date'))
+    totals = {
+        'total_units': Sum('quantity'),
+        'total_revenue': Sum(F('quantity') * F('price')),
+        'orders': Count('order_id', distinct=True),
+    }
+    SalesFact.objects.bulk_create([
+        SalesFact(date=row['date'], product_id=row['product_id'], status=row['order__status'],
+                  units=row['total_units'], revenue=row['total_revenue'], order_count=row['orders'])
+        for row in items.values('date', 'product_id', 'order__status').annotate(**totals).order_by()
+    ], batch_size=1000)
+    SalesDay.objects.bulk_create([
+        SalesDay(date=row['date'], status=row['order__status'], units=row['total_units'],
+                 revenue=row['total_revenue'], order_count=row['orders'])
+        for row in items.values('date', 'order__status').annotate(**totals).order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_category_closure'),
+        ('orders', '0003_order_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['date', 'status'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'status'), name='unique_sales_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sales_facts', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'date'], name='sales_fact_product_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product', 'status'), name='unique_sales_fact')],
+            },
+        ),
+        migrations.RunPython(build_sales_facts, migrations.RunPython.noop),
+    ]
@@ -8,6 +8,7 @@ class Customer(models.Model):
     phone = models.CharField(max_length=20, blank=True)
     address = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
@@ -27,6 +28,14 @@ class Order(models.Model):
     order_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Also moved by the total refresh, which writes with update()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Matches the order list's keyset pagination
+            models.Index(fields=['-order_date', 'id'], name='order_date_id_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.customer.name}"
@@ -35,17 +44,128 @@ class Order(models.Model):
         return reverse('orders:order_detail', args=[self.id])
     
     def update_total(self):
-        self.total = sum(item.get_total() for item in self.items.all())
-        self.save()
+        """
+        Recomputes the total in SQL and writes only the total column
+        """
+        from .totals import refresh_totals
+        self.total = refresh_totals([self.pk]).get(self.pk, self.total)
+
+class OrderItemQuerySet(models.QuerySet):
+    """
+    Bulk item operations skip the item signals, so they schedule the
+    affected order totals and sales facts themselves
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .sales import schedule_sales_refresh
+        from .totals import schedule_total_refresh
+        objs = super().bulk_create(objs, *args, **kwargs)
+        schedule_total_refresh({obj.order_id for obj in objs}, using=self.db)
+        schedule_sales_refresh({(obj.order_id, obj.product_id) for obj in objs}, using=self.db)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        from .sales import schedule_sales_refresh
+        from .totals import schedule_total_refresh
+        objs = list(objs)
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        schedule_total_refresh({obj.order_id for obj in objs}, using=self.db)
+        # A product swap leaves its old product unknown: recount whole days
+        moved = {'product', 'product_id'} & set(fields)
+        schedule_sales_refresh(
+            {(obj.order_id, None if moved else obj.product_id) for obj in objs}, using=self.db)
+        return rows
+
+    def update(self, **kwargs):
+        from .sales import schedule_sales_refresh
+        from .totals import schedule_total_refresh
+        if not {'quantity', 'price', 'order', 'order_id', 'product', 'product_id'} & set(kwargs):
+            return super().update(**kwargs)
+        cells = set(self.values_list('order_id', 'product_id'))
+        rows = super().update(**kwargs)
+        new_order = kwargs.get('order', kwargs.get('order_id'))
+        new_product = kwargs.get('product', kwargs.get('product_id'))
+        new_order = getattr(new_order, 'pk', new_order)
+        new_product = getattr(new_product, 'pk', new_product)
+        cells |= {(new_order or order_id, new_product or product_id) for order_id, product_id in cells}
+        schedule_total_refresh({order_id for order_id, _ in cells}, using=self.db)
+        schedule_sales_refresh(cells, using=self.db)
+        return rows
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    objects = OrderItemQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
     
     def get_total(self):
-        return self.quantity * self.price
\ No newline at end of file
+        return self.quantity * self.price
+
+class OrderRevenueRollup(models.Model):
+    """
+    Order count and revenue per hour and status, kept current by
+    orders.rollups; daily figures are sums over a date's hours
+    """
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['date', 'hour', 'status']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'hour', 'status'], name='unique_revenue_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.hour:02d}:00 {self.status}: {self.order_count} orders"
+
+class SalesFact(models.Model):
+    """
+    Units, revenue and orders per local order date, product and status,
+    kept current by orders.sales
+    """
+    date = models.DateField()
+    # Indexed by sales_fact_product_idx
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_facts', db_index=False)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product', 'status'], name='unique_sales_fact'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'date'], name='sales_fact_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.product_id} {self.status}: {self.units} units"
+
+class SalesDay(models.Model):
+    """
+    The day's SalesFact rows summed per status, with ``order_count``
+    counting each order once however many products it has
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date', 'status']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='unique_sales_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.order_count} orders"
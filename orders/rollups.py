@@ -0,0 +1,116 @@
+"""
+Order revenue rollups.
+
+OrderRevenueRollup keeps order counts and revenue per (date, hour, status).
+Order changes apply deltas to the affected buckets, so dashboards read a
+table that grows by at most one row per hour and status instead of scanning
+every order.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Order, OrderRevenueRollup
+
+
+def order_bucket(order_date):
+    local = timezone.localtime(order_date)
+    return local.date(), local.hour
+
+
+def _apply(date, hour, status, count, revenue):
+    lookup = {'date': date, 'hour': hour, 'status': status}
+    updated = OrderRevenueRollup.objects.filter(**lookup).update(
+        order_count=F('order_count') + count,
+        revenue=F('revenue') + revenue,
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            OrderRevenueRollup.objects.create(order_count=count, revenue=revenue, **lookup)
+    except IntegrityError:
+        # Another writer created the bucket first
+        OrderRevenueRollup.objects.filter(**lookup).update(
+            order_count=F('order_count') + count,
+            revenue=F('revenue') + revenue,
+        )
+
+
+def record_order_change(order_date, old, new):
+    """
+    Moves an order's contribution from ``old`` to ``new``, each a
+    ``(status, total)`` pair or None for creation/deletion
+    """
+    if old == new:
+        return
+    date, hour = order_bucket(order_date)
+    changes = defaultdict(lambda: [0, Decimal(0)])
+    if old is not None:
+        changes[old[0]][0] -= 1
+        changes[old[0]][1] -= Decimal(old[1])
+    if new is not None:
+        changes[new[0]][0] += 1
+        changes[new[0]][1] += Decimal(new[1])
+    for status, (count, revenue) in changes.items():
+        if count or revenue:
+            _apply(date, hour, status, count, revenue)
+
+
+def status_totals():
+    """
+    Returns ``{status: {'orders': n, 'revenue': amount}}`` for all time
+    """
+    totals = {status: {'orders': 0, 'revenue': Decimal(0)} for status, _ in Order.STATUS_CHOICES}
+    rows = OrderRevenueRollup.objects.values('status').annotate(
+        orders=Sum('order_count'), total=Sum('revenue'))
+    for row in rows:
+        totals[row['status']] = {'orders': row['orders'] or 0, 'revenue': row['total'] or Decimal(0)}
+    return totals
+
+
+def overall_totals():
+    """
+    Returns ``(order count, revenue)`` across every status
+    """
+    totals = OrderRevenueRollup.objects.aggregate(orders=Sum('order_count'), revenue=Sum('revenue'))
+    return totals['orders'] or 0, totals['revenue'] or Decimal(0)
+
+
+def daily_revenue(start, end, status=None):
+    """
+    Returns ``[{'date', 'orders', 'revenue'}]`` for each date in
+    ``[start, end]`` that had orders
+    """
+    rows = OrderRevenueRollup.objects.filter(date__range=(start, end))
+    if status:
+        rows = rows.filter(status=status)
+    return list(rows.values('date').annotate(
+        orders=Sum('order_count'), revenue=Sum('revenue')).order_by('date'))
+
+
+def backfill_rollups():
+    """
+    Rebuilds every bucket from the orders table
+    """
+    buckets = Order.objects.annotate(bucket=TruncHour('order_date')).values(
+        'bucket', 'status').annotate(order_count=Count('id'), revenue=Sum('total')).order_by()
+    merged = defaultdict(lambda: [0, Decimal(0)])
+    for row in buckets.iterator():
+        # Keyed on local time, so a repeated DST hour folds into one bucket
+        date, hour = order_bucket(row['bucket'])
+        bucket = merged[date, hour, row['status']]
+        bucket[0] += row['order_count']
+        bucket[1] += row['revenue'] or 0
+    rollups = [
+        OrderRevenueRollup(date=date, hour=hour, status=status, order_count=count, revenue=revenue)
+        for (date, hour, status), (count, revenue) in merged.items()
+    ]
+    with transaction.atomic():
+        OrderRevenueRollup.objects.all().delete()
+        OrderRevenueRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
@@ -0,0 +1,264 @@
+"""
+Sales facts.
+
+SalesFact holds units, revenue and distinct orders per (date, product,
+status), and SalesDay the same per (date, status); dates are local order
+dates. Changing an item or an order's status marks its (date, product)
+cells, and when the transaction commits each marked date recounts the
+marked products' facts and the day's totals from that day's orders,
+writing only the rows that changed.
+Reports then read day rows with range scans on ``date`` instead of joining
+every item to its order.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import router, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from inventory.models import Product
+from store_manager.caching import bump
+
+from .models import Order, OrderItem, SalesDay, SalesFact
+from .rollups import order_bucket
+
+BATCH_SIZE = 1000
+# Past this many products a day's facts are recounted whole
+MAX_PRODUCTS = 500
+
+
+def sales_date(order_date):
+    return order_bucket(order_date)[0]
+
+
+def day_bounds(date):
+    """
+    The ``[start, end)`` datetimes of a local date
+    """
+    start = timezone.make_aware(datetime.combine(date, datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(date + timedelta(days=1), datetime.min.time()))
+    return start, end
+
+
+def fact_rows(items, *group):
+    return items.values(*group, 'product_id', 'order__status').annotate(
+        total_units=Sum('quantity'),
+        total_revenue=Sum(F('quantity') * F('price')),
+        orders=Count('order_id', distinct=True),
+    ).order_by()
+
+
+def day_rows(items, *group):
+    return items.values(*group, 'order__status').annotate(
+        total_units=Sum('quantity'),
+        total_revenue=Sum(F('quantity') * F('price')),
+        orders=Count('order_id', distinct=True),
+    ).order_by()
+
+
+def sync_rows(model, existing, computed, using, **fixed):
+    """
+    Writes the difference between ``existing`` (``{key: row}``) and
+    ``computed`` (``{key: {field: value}}``): a day's recount usually
+    changes a handful of rows, not all of them
+    """
+    created, changed = [], []
+    for key, values in computed.items():
+        row = existing.pop(key, None)
+        if row is None:
+            created.append(model(**fixed, **values))
+        elif any(getattr(row, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(row, field, value)
+            changed.append(row)
+    manager = model.objects.using(using)
+    if existing:
+        manager.filter(pk__in=[row.pk for row in existing.values()]).delete()
+    if created:
+        manager.bulk_create(created, batch_size=BATCH_SIZE)
+    if changed:
+        manager.bulk_update(changed, ['units', 'revenue', 'order_count'], batch_size=BATCH_SIZE)
+
+
+def refresh_day(date, product_ids=None, using=None):
+    """
+    Recounts a local date's facts for the given products (every product
+    when None) and its day totals, from that day's orders
+    """
+    using = using or router.db_for_write(SalesFact)
+    start, end = day_bounds(date)
+    items = OrderItem.objects.using(using).filter(order__order_date__gte=start, order__order_date__lt=end)
+    product_items = items
+    facts = SalesFact.objects.using(using).filter(date=date)
+    if product_ids is not None:
+        product_items = items.filter(product_id__in=product_ids)
+        facts = facts.filter(product_id__in=product_ids)
+    with transaction.atomic(using=using):
+        sync_rows(
+            SalesFact,
+            {(row.product_id, row.status): row for row in facts},
+            {(row['product_id'], row['order__status']): {
+                'product_id': row['product_id'], 'status': row['order__status'], 'units': row['total_units'],
+                'revenue': row['total_revenue'], 'order_count': row['orders'],
+            } for row in fact_rows(product_items)},
+            using, date=date,
+        )
+        sync_rows(
+            SalesDay,
+            {row.status: row for row in SalesDay.objects.using(using).filter(date=date)},
+            {row['order__status']: {
+                'status': row['order__status'], 'units': row['total_units'],
+                'revenue': row['total_revenue'], 'order_count': row['orders'],
+            } for row in day_rows(items)},
+            using, date=date,
+        )
+        bump('orders', using=using)
+
+
+def refresh_sales(items=(), days=(), using=None):
+    """
+    Recounts sales cells: ``items`` are ``(order_id, product_id)`` pairs and
+    ``days`` ``(date, product_id)`` pairs, a None product standing for the
+    whole day
+    """
+    using = using or router.db_for_write(SalesFact)
+    items, cells = set(items), defaultdict(set)
+    order_ids = {order_id for order_id, _ in items}
+    order_dates = dict(Order.objects.using(using).filter(pk__in=order_ids).values_list(
+        'pk', 'order_date')) if order_ids else {}
+    for order_id, product_id in items:
+        if order_id in order_dates:
+            cells[sales_date(order_dates[order_id])].add(product_id)
+    for date, product_id in days:
+        cells[date].add(product_id)
+    for date, product_ids in sorted(cells.items()):
+        if None in product_ids or len(product_ids) > MAX_PRODUCTS:
+            product_ids = None
+        refresh_day(date, product_ids, using=using)
+
+
+class PendingSales:
+    """
+    Sales cells waiting for a recount when the current transaction commits
+    """
+
+    def __init__(self, using):
+        self.using = using
+        self.items = set()
+        self.days = set()
+
+    def is_registered(self, connection):
+        return any(entry[1] == self.flush for entry in connection.run_on_commit)
+
+    def flush(self):
+        connection = transaction.get_connection(self.using)
+        if getattr(connection, 'pending_sales', None) is self:
+            connection.pending_sales = None
+        refresh_sales(self.items, self.days, using=self.using)
+
+
+def schedule_sales_refresh(items=(), days=(), using=None):
+    """
+    Marks sales cells (as for refresh_sales) as needing a recount: once at
+    commit inside a transaction, straight away in autocommit mode
+    """
+    items, days = set(items), set(days)
+    if not items and not days:
+        return
+    using = using or router.db_for_write(SalesFact)
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        refresh_sales(items, days, using=using)
+        return
+
+    # As for order totals: a rolled back block drops its callbacks
+    pending = getattr(connection, 'pending_sales', None)
+    if pending is None or not pending.is_registered(connection):
+        pending = PendingSales(using)
+        connection.pending_sales = pending
+        transaction.on_commit(pending.flush, using=using)
+    pending.items.update(items)
+    pending.days.update(days)
+
+
+def rebuild_sales(batch_size=BATCH_SIZE):
+    """
+    Recomputes every fact from the order items and returns the number of
+    fact rows written
+    """
+    items = OrderItem.objects.annotate(date=TruncDate('order__order_date'))
+    written = 0
+    with transaction.atomic():
+        SalesFact.objects.all().delete()
+        SalesDay.objects.all().delete()
+        batch = []
+        for row in fact_rows(items, 'date').iterator(chunk_size=batch_size):
+            batch.append(SalesFact(
+                date=row['date'], product_id=row['product_id'], status=row['order__status'],
+                units=row['total_units'], revenue=row['total_revenue'], order_count=row['orders']))
+            if len(batch) == batch_size:
+                written += len(SalesFact.objects.bulk_create(batch))
+                batch = []
+        written += len(SalesFact.objects.bulk_create(batch))
+        SalesDay.objects.bulk_create([
+            SalesDay(date=row['date'], status=row['order__status'], units=row['total_units'],
+                     revenue=row['total_revenue'], order_count=row['orders'])
+            for row in day_rows(items, 'date')
+        ], batch_size=batch_size)
+    return written
+
+
+def sales_filter(start=None, end=None, status=None, product=None):
+    lookups = Q()
+    if start:
+        lookups &= Q(date__gte=start)
+    if end:
+        lookups &= Q(date__lte=end)
+    if status:
+        lookups &= Q(status=status)
+    if product:
+        lookups &= Q(product_id=product)
+    return lookups
+
+
+def sales_totals(periods, status=None, product=None):
+    """
+    Returns ``{name: {'total_sales', 'total_orders', 'total_units'}}`` for
+    ``periods``, a ``{name: (start, end)}`` of local dates (either may be
+    None), in one query. Without a product the day rows are read, where each
+    order counts once; an order is only ever in one fact row per product.
+    """
+    rows = SalesFact.objects.filter(product_id=product) if product else SalesDay.objects.all()
+    if status:
+        rows = rows.filter(status=status)
+    aggregates, keys = {}, {}
+    for name, (start, end) in periods.items():
+        lookups = sales_filter(start, end)
+        for field, column in (('total_sales', 'revenue'), ('total_orders', 'order_count'),
+                              ('total_units', 'units')):
+            key = f'{name}_{field}'
+            aggregates[key] = Sum(column, filter=lookups, default=0)
+            keys[key] = (name, field)
+    totals = defaultdict(dict)
+    for key, value in rows.aggregate(**aggregates).items():
+        name, field = keys[key]
+        totals[name][field] = value
+    return dict(totals)
+
+
+def top_products(start=None, end=None, status=None, product=None, limit=10):
+    """
+    The best-selling products by revenue between two local dates, as
+    ``[{'product__name', 'product__sku', 'total_sold', 'revenue'}]``. The
+    facts are grouped on product id alone and only the winners are joined
+    to their products.
+    """
+    rows = list(SalesFact.objects.filter(sales_filter(start, end, status, product)).values(
+        'product_id').annotate(total_sold=Sum('units'), revenue=Sum('revenue')).order_by('-revenue')[:limit])
+    products = Product.objects.in_bulk([row['product_id'] for row in rows])
+    for row in rows:
+        row['product__name'] = products[row['product_id']].name
+        row['product__sku'] = products[row['product_id']].sku
+    return rows
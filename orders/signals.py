@@ -1,18 +1,80 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from orders.models import OrderItem
-import logging
+from orders.models import Customer, Order, OrderItem
+from orders.rollups import record_order_change
+from orders.sales import sales_date, schedule_sales_refresh
+from orders.totals import schedule_total_refresh
+from store_manager.caching import bump
 
-logger = logging.getLogger(__name__)
-
-def update_order_total_safe(order):
-    try:
-        order.update_total()
-        logger.debug(f"Updated total for Order #{order.id}")
-    except Exception as e:
-        logger.error(f"Failed to update total for Order #{order.id if order else 'N/A'}: {e}")
+@receiver(pre_save, sender=OrderItem)
+def remember_sales_cell(sender, instance, **kwargs):
+    # The stored order and product, so an item moved elsewhere also
+    # updates the ones it left
+    instance._sales_cell = None
+    if instance.pk:
+        instance._sales_cell = OrderItem.objects.filter(pk=instance.pk).values_list(
+            'order_id', 'product_id').first()
 
 @receiver([post_save, post_delete], sender=OrderItem)
 def update_order_total_on_change(sender, instance, **kwargs):
-    if instance.order:
-        update_order_total_safe(instance.order)
+    # Items can only be cascade-deleted through their order; when that
+    # happens the order itself is going away and needs no new total
+    origin = kwargs.get('origin')
+    if origin is not None and getattr(origin, 'model', type(origin)) is not OrderItem:
+        return
+    order_ids = {instance.order_id}
+    if getattr(instance, '_sales_cell', None):
+        order_ids.add(instance._sales_cell[0])
+    schedule_total_refresh(order_ids)
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def update_sales_on_item_change(sender, instance, **kwargs):
+    origin = kwargs.get('origin')
+    if origin is not None and getattr(origin, 'model', type(origin)) is not OrderItem:
+        return
+    cells = {(instance.order_id, instance.product_id)}
+    if getattr(instance, '_sales_cell', None):
+        cells.add(instance._sales_cell)
+    schedule_sales_refresh(cells)
+
+@receiver(pre_save, sender=Order)
+def remember_rollup_state(sender, instance, **kwargs):
+    instance._rollup_state = None
+    if instance.pk:
+        instance._rollup_state = Order.objects.filter(pk=instance.pk).values_list(
+            'status', 'total').first()
+
+@receiver(post_save, sender=Order)
+def update_rollups_on_save(sender, instance, **kwargs):
+    record_order_change(
+        instance.order_date,
+        getattr(instance, '_rollup_state', None),
+        (instance.status, instance.total))
+
+@receiver(pre_delete, sender=Order)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    stored = Order.objects.filter(pk=instance.pk).values_list('status', 'total').first()
+    if stored:
+        record_order_change(instance.order_date, stored, None)
+
+@receiver(post_save, sender=Order)
+def update_sales_on_status_change(sender, instance, created, **kwargs):
+    stored = getattr(instance, '_rollup_state', None)
+    if created or not stored or stored[0] == instance.status:
+        return
+    schedule_sales_refresh(
+        (instance.pk, product_id)
+        for product_id in instance.items.values_list('product_id', flat=True).distinct())
+
+@receiver(pre_delete, sender=Order)
+def update_sales_on_delete(sender, instance, **kwargs):
+    # Counted after the commit, once the order and its items are gone
+    date = sales_date(instance.order_date)
+    schedule_sales_refresh(days=(
+        (date, product_id)
+        for product_id in instance.items.values_list('product_id', flat=True).distinct()))
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=Customer)
+def invalidate_cached_order_pages(sender, using=None, **kwargs):
+    bump('orders', using=using)
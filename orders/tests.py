@@ -1,7 +1,21 @@
-from django.test import TestCase
+from decimal import Decimal
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from unittest import mock
+from django.db import connection, transaction
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
 from django.urls import reverse
-from inventory.models import Product
-from .models import Customer, Order, OrderItem
+from django.utils import timezone
+from inventory.models import Product, StockMovement
+from .models import Customer, Order, OrderItem, OrderRevenueRollup, SalesDay, SalesFact
+from .rollups import backfill_rollups, overall_totals, status_totals
+from .sales import rebuild_sales, sales_totals
+from . import totals
+from .importers import import_order_items
 
 class OrdersTests(TestCase):
     @classmethod
@@ -43,4 +57,478 @@ class OrdersTests(TestCase):
     def test_order_list_view(self):
         response = self.client.get(reverse('orders:order_list'))
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, f"Order #{self.order.id}")
\ No newline at end of file
+        self.assertContains(response, f"Order #{self.order.id}")
+
+
+class OrderRevenueRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name="Rollup Product", slug="rollup-product", unit_price=50,
+            cost_price=30, quantity=100, sku="SKU-8001")
+        cls.customer = Customer.objects.create(name="Rollup Customer", email="rollup@example.com")
+
+    def create_order(self, quantity=2, status='pending'):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer, status=status)
+            OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=50)
+        order.refresh_from_db()
+        return order
+
+    def rollup_rows(self):
+        return list(OrderRevenueRollup.objects.exclude(order_count=0).values_list(
+            'date', 'hour', 'status', 'order_count', 'revenue'))
+
+    def test_rollups_follow_totals_and_status(self):
+        order = self.create_order()
+        self.create_order(quantity=1, status='completed')
+        totals = status_totals()
+        self.assertEqual(totals['pending'], {'orders': 1, 'revenue': Decimal('100.00')})
+        self.assertEqual(totals['completed'], {'orders': 1, 'revenue': Decimal('50.00')})
+
+        order.status = 'completed'
+        order.save()
+        totals = status_totals()
+        self.assertEqual(totals['pending']['orders'], 0)
+        self.assertEqual(totals['completed'], {'orders': 2, 'revenue': Decimal('150.00')})
+
+        order.delete()
+        self.assertEqual(overall_totals(), (1, Decimal('50.00')))
+
+        self.customer.delete()
+        self.assertEqual(overall_totals(), (0, Decimal('0.00')))
+
+    def test_backfill_matches_incremental_rollups(self):
+        self.create_order()
+        self.create_order(quantity=3, status='cancelled')
+        incremental = self.rollup_rows()
+        backfill_rollups()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_dashboard_uses_rollups(self):
+        from django.contrib.auth.models import User
+        self.create_order()
+        self.client.force_login(User.objects.create_user('rollups', password='pass12345'))
+        response = self.client.get(reverse('orders:orders_dashboard'))
+        self.assertEqual(response.context['total_orders'], 1)
+        self.assertEqual(response.context['total_revenue'], Decimal('100.00'))
+
+
+class OrderTotalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name="Total Product", slug="total-product", unit_price=10,
+            cost_price=5, quantity=100, sku="SKU-8101")
+        cls.customer = Customer.objects.create(name="Total Customer", email="total@example.com")
+        cls.order = Order.objects.create(customer=cls.customer)
+
+    def add_items(self, count):
+        for _ in range(count):
+            OrderItem.objects.create(order=self.order, product=self.product, quantity=2, price=10)
+
+    def test_item_changes_coalesce_into_one_refresh(self):
+        with mock.patch.object(totals, 'refresh_totals', wraps=totals.refresh_totals) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.add_items(50)
+        self.assertEqual(refresh.call_count, 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal('1000.00'))
+
+    def test_rolled_back_changes_do_not_block_later_refreshes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.add_items(1)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.add_items(2)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal('40.00'))
+
+    def test_moved_item_refreshes_both_orders(self):
+        other = Order.objects.create(customer=self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_items(2)
+        item = self.order.items.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            item.order = other
+            item.save()
+        self.order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.order.total, other.total), (Decimal('20.00'), Decimal('20.00')))
+
+    def test_bulk_operations_refresh_totals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.bulk_create([
+                OrderItem(order=self.order, product=self.product, quantity=1, price=10)
+                for _ in range(3)
+            ])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal('30.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.filter(order=self.order).update(price=20)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal('60.00'))
+
+    def test_update_total_writes_only_total(self):
+        self.add_items(2)
+        with CaptureQueriesContext(connection) as queries:
+            self.order.update_total()
+        self.assertEqual(self.order.total, Decimal('40.00'))
+        item_queries = [q['sql'] for q in queries if 'orders_orderitem' in q['sql']]
+        order_updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "orders_order" ')]
+        self.assertEqual(len(item_queries), 1)
+        self.assertEqual(len(order_updates), 1)
+        self.assertIn('SET "total" =', order_updates[0])
+        self.assertNotIn('"status"', order_updates[0])
+
+
+class CsvExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name="Export Product", slug="export-product", unit_price=10,
+            cost_price=5, quantity=100, sku="SKU-8201")
+        cls.customer = Customer.objects.create(name="Export Customer", email="export@example.com")
+        cls.order = Order.objects.create(customer=cls.customer, status='completed')
+        OrderItem.objects.create(order=cls.order, product=cls.product, quantity=3, price=10)
+        cls.order.update_total()
+        cls.user = User.objects.create_user('csv-exporter', password='pass12345')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get_rows(self, url):
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        return [line.split(',') for line in content.splitlines()]
+
+    def test_orders_export_streams_rows(self):
+        rows = self.get_rows(reverse('orders:export_orders'))
+        self.assertEqual(rows[0], ['Order ID', 'Customer Name', 'Order Date', 'Status', 'Total'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][0], str(self.order.pk))
+        self.assertEqual(rows[1][1], 'Export Customer')
+        self.assertEqual(rows[1][3:], ['Completed', '30.00'])
+
+    def test_order_items_export(self):
+        response = self.client.get(reverse('orders:export_order_items', args=[self.order.pk]))
+        self.assertIn(f'order_{self.order.pk}_items.csv', response['Content-Disposition'])
+        rows = self.get_rows(reverse('orders:export_order_items', args=[self.order.pk]))
+        self.assertEqual(rows[1], [str(self.order.pk), 'Export Product', '3', '10.00', '30.00'])
+
+    def test_exports_do_not_build_model_instances(self):
+        from inventory.exports import EXPORTS
+        with mock.patch.object(Product, '__init__', side_effect=AssertionError):
+            rows = list(EXPORTS['products'].rows())
+        self.assertEqual(rows, [(self.product.pk, 'Export Product', 'SKU-8201', '', '', 100,
+                                 Decimal('5.00'), Decimal('10.00'))])
+
+    def test_movement_and_alert_exports(self):
+        movements = self.get_rows(reverse('orders:export_stock_movements'))
+        self.assertEqual(movements[0][:3], ['Movement ID', 'Product', 'Movement Type'])
+        alerts = self.get_rows(reverse('orders:export_inventory_alerts'))
+        self.assertEqual(alerts[0][0], 'Alert ID')
+
+    def test_exports_require_login(self):
+        self.client.logout()
+        for url in (reverse('orders:export_orders'), reverse('orders:export_products'),
+                    reverse('orders:export_order_items', args=[self.order.pk]),
+                    reverse('inventory:product_export')):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 302)
+            self.assertIn(settings.LOGIN_URL, response['Location'])
+
+
+class OrderItemImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name="Import Product", slug="import-product", unit_price=10,
+            cost_price=5, quantity=100, sku="SKU-8301")
+        cls.customer = Customer.objects.create(name="Import Customer", email="import@example.com")
+        cls.orders = [Order.objects.create(customer=cls.customer) for _ in range(2)]
+
+    def upload(self, lines):
+        content = '\n'.join(['order_id,product_id,quantity,price', *lines]) + '\n'
+        return SimpleUploadedFile('items.csv', content.encode(), content_type='text/csv')
+
+    def test_import_creates_items_and_reports_bad_rows(self):
+        first, second = self.orders
+        upload = self.upload([
+            f'{first.pk},{self.product.pk},2,10.00',
+            f'{second.pk},{self.product.pk},1,',
+            f'{first.pk},999999,1,5',
+            f'999999,{self.product.pk},1,5',
+            f'{first.pk},{self.product.pk},zero,5',
+            f'{first.pk},{self.product.pk},3,4.50',
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            report = import_order_items(upload, chunk_size=2)
+
+        self.assertEqual(report.imported, 3)
+        self.assertEqual([line for line, _ in report.errors], [4, 5, 6])
+        self.assertIn('Product 999999', report.errors[0][1])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.total, Decimal('33.50'))
+        self.assertEqual(second.total, Decimal('10.00'))
+
+    def test_price_cells(self):
+        first = self.orders[0]
+        upload = self.upload([
+            f'{first.pk},{self.product.pk},1,0',
+            f'{first.pk},{self.product.pk},1,-0',
+            *(f'{first.pk},{self.product.pk},1,{price}' for price in ('NaN', 'Infinity', 'sNaN', '1e30', '1.005')),
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            report = import_order_items(upload)
+        self.assertEqual(report.imported, 2)
+        self.assertEqual([line for line, _ in report.errors], [4, 5, 6, 7, 8])
+        self.assertEqual(list(first.items.values_list('price', flat=True)), [Decimal('0.00')] * 2)
+        first.refresh_from_db()
+        self.assertEqual(first.total, 0)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        order = self.orders[0]
+        upload = self.upload([f'{order.pk},{self.product.pk},1,1'] * 3000)
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                report = import_order_items(upload, chunk_size=1000)
+        self.assertEqual(report.imported, 3000)
+        self.assertLess(len(queries), 40)
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('3000.00'))
+
+    def test_import_into_order_shows_error_report(self):
+        from django.contrib.auth.models import User
+        order = self.orders[0]
+        self.client.force_login(User.objects.create_user('importer', password='pass12345'))
+        upload = self.upload([f',{self.product.pk},2,', f'{self.orders[1].pk},{self.product.pk},1,1'])
+        response = self.client.post(
+            reverse('orders:import_order_items', args=[order.pk]), {'csv_file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report'].imported, 1)
+        self.assertContains(response, f'not order {order.pk}')
+        self.assertEqual(list(order.items.values_list('quantity', 'price')), [(2, Decimal('10.00'))])
+
+
+class OrderListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('orderpager', password='pass12345')
+        customer = Customer.objects.create(name="Paged Customer", email="paged@example.com")
+        Order.objects.bulk_create([Order(customer=customer) for _ in range(30)])
+
+    def test_pages_by_cursor_without_count(self):
+        self.client.force_login(self.user)
+        url = reverse('orders:order_list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'].upper()])
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 25)
+
+        second = self.client.get(url + page.next_link).context['page_obj']
+        self.assertEqual(len(second), 5)
+        self.assertFalse(second.has_next())
+        expected = list(Order.objects.order_by('-order_date', 'id').values_list('pk', flat=True))
+        self.assertEqual([o.pk for o in page] + [o.pk for o in second], expected)
+
+
+class OrderApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('orderapi', password='pass12345')
+        cls.alice = Customer.objects.create(name="Alice Api", email="alice@example.com")
+        cls.bob = Customer.objects.create(name="Bob Api", email="bob@example.com")
+        Order.objects.create(customer=cls.alice, status='completed')
+        Order.objects.create(customer=cls.bob, status='pending')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_orders_use_list_filters(self):
+        response = self.client.get(reverse('api:orders'), {'status': 'pending', 'fields': 'customer_name,status'})
+        self.assertEqual(response.json()['results'], [{'customer_name': 'Bob Api', 'status': 'pending'}])
+
+    def test_customers(self):
+        response = self.client.get(reverse('api:customers'), {'fields': 'name', 'search': 'alice'})
+        self.assertEqual(response.json()['results'], [{'name': 'Alice Api'}])
+
+
+class OrderQueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('budgeter', 'budget@example.com', 'pass12345')
+        for i in range(5):
+            customer = Customer.objects.create(name=f"Budget Customer {i}", email=f"budget{i}@example.com")
+            Order.objects.bulk_create([Order(customer=customer) for _ in range(i)])
+
+    def test_pages_stay_within_budget(self):
+        # The test runner enforces budgets: an N+1 here raises QueryBudgetExceeded
+        self.client.force_login(self.staff)
+        for name in ('orders:order_list', 'orders:customer_list', 'api:orders', 'admin:orders_customer_changelist'):
+            self.assertEqual(self.client.get(reverse(name)).status_code, 200, name)
+
+    def test_customer_changelist_counts_orders(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('admin:orders_customer_changelist') + '?o=5')
+        self.assertEqual([c.orders_count for c in response.context['cl'].result_list], [0, 1, 2, 3, 4])
+
+
+class SalesFactTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('salesfacts', password='pass12345')
+        cls.customer = Customer.objects.create(name="Fact Customer", email="facts@example.com")
+        cls.kettle = Product.objects.create(
+            name="Fact Kettle", slug="fact-kettle", unit_price=40, cost_price=20, quantity=100, sku="SKU-8801")
+        cls.lamp = Product.objects.create(
+            name="Fact Lamp", slug="fact-lamp", unit_price=15, cost_price=8, quantity=100, sku="SKU-8802")
+
+    def create_order(self, items, status='pending'):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer, status=status)
+            for product, quantity, price in items:
+                OrderItem.objects.create(order=order, product=product, quantity=quantity, price=price)
+        return order
+
+    def facts(self):
+        return sorted(SalesFact.objects.values_list('product__sku', 'status', 'units', 'revenue', 'order_count'))
+
+    def test_facts_follow_items_status_and_deletes(self):
+        order = self.create_order([(self.kettle, 2, 40), (self.lamp, 1, 15), (self.kettle, 1, 40)])
+        self.create_order([(self.kettle, 1, 40)], status='completed')
+        self.assertEqual(self.facts(), [
+            ('SKU-8801', 'completed', 1, Decimal('40.00'), 1),
+            ('SKU-8801', 'pending', 3, Decimal('120.00'), 1),
+            ('SKU-8802', 'pending', 1, Decimal('15.00'), 1),
+        ])
+        day = SalesDay.objects.get(status='pending')
+        self.assertEqual((day.units, day.revenue, day.order_count), (4, Decimal('135.00'), 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'completed'
+            order.save()
+        self.assertEqual(SalesDay.objects.get(status='completed').order_count, 2)
+        self.assertFalse(SalesFact.objects.filter(status='pending').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.items.get(product=self.lamp).delete()
+        self.assertFalse(SalesFact.objects.filter(product=self.lamp).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(self.facts(), [('SKU-8801', 'completed', 1, Decimal('40.00'), 1)])
+
+    def test_bulk_item_writes_refresh_facts(self):
+        order = self.create_order([])
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=self.kettle, quantity=2, price=40),
+                OrderItem(order=order, product=self.lamp, quantity=4, price=15),
+            ])
+        self.assertEqual(len(self.facts()), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.filter(product=self.lamp).update(product=self.kettle)
+        self.assertEqual(self.facts(), [('SKU-8801', 'pending', 6, Decimal('140.00'), 1)])
+
+    def test_rebuild_matches_incremental_facts(self):
+        self.create_order([(self.kettle, 2, 40), (self.lamp, 1, 15)])
+        self.create_order([(self.lamp, 3, 15)], status='cancelled')
+        incremental = self.facts()
+        days = list(SalesDay.objects.values_list('date', 'status', 'units', 'revenue', 'order_count'))
+        self.assertEqual(rebuild_sales(), 3)
+        self.assertEqual(self.facts(), incremental)
+        self.assertEqual(list(SalesDay.objects.values_list('date', 'status', 'units', 'revenue', 'order_count')),
+                         days)
+
+    def test_totals_by_period(self):
+        order = self.create_order([(self.kettle, 2, 40), (self.lamp, 1, 15)])
+        self.create_order([(self.kettle, 1, 40)])
+        today = timezone.localtime(order.order_date).date()
+        old = self.create_order([(self.kettle, 5, 40)])
+        Order.objects.filter(pk=old.pk).update(order_date=old.order_date - timedelta(days=20))
+        rebuild_sales()
+
+        periods = {'daily': (today, today), 'monthly': (today - timedelta(days=30), None)}
+        with self.assertNumQueries(1):
+            totals = sales_totals(periods)
+        self.assertEqual(totals['daily'], {'total_sales': Decimal('135.00'), 'total_orders': 2, 'total_units': 4})
+        self.assertEqual(totals['monthly']['total_orders'], 3)
+        kettle = sales_totals(periods, product=self.kettle.pk)
+        self.assertEqual(kettle['daily'], {'total_sales': Decimal('120.00'), 'total_orders': 2, 'total_units': 3})
+
+    def test_sales_report_reads_facts(self):
+        order = self.create_order([(self.kettle, 2, 40), (self.lamp, 1, 15)], status='completed')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('inventory:sales_report'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['daily_sales']['total_sales'], Decimal('95.00'))
+        self.assertEqual([row['product__sku'] for row in response.context['top_products']],
+                         ['SKU-8801', 'SKU-8802'])
+
+        today = timezone.localtime(order.order_date).date().isoformat()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('inventory:sales_report'), {
+                'start_date': today, 'end_date': today, 'status': 'completed', 'sku': 'SKU-8802'})
+        self.assertEqual(response.context['filtered_sales']['total_sales'], Decimal('15.00'))
+        self.assertEqual(response.context['filtered_sales']['total_orders'], 1)
+        self.assertFalse(any('orders_orderitem' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(response.context['selected_product'], self.lamp)
+        response = self.client.get(reverse('inventory:sales_report'), {'product': self.kettle.pk})
+        self.assertEqual(response.context['daily_sales']['total_sales'], Decimal('80.00'))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'row-cache-tests'}})
+class ListRowCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('rowcache', password='pass12345')
+        cls.customer = Customer.objects.create(name="Row Customer", email="rows@example.com")
+        cls.product = Product.objects.create(
+            name="Row Kettle", slug="row-kettle", unit_price=40, cost_price=20, quantity=5, sku="SKU-8901")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_order_rows_follow_totals_and_customers(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer)
+        self.assertContains(self.client.get(reverse('orders:order_list')), '$0.00')
+        stamp = Order.objects.get(pk=order.pk).updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=order, product=self.product, quantity=2, price=40)
+        self.assertGreater(Order.objects.get(pk=order.pk).updated_at, stamp)
+        self.assertContains(self.client.get(reverse('orders:order_list')), '$80.00')
+        self.customer.name = "Renamed Customer"
+        self.customer.save()
+        self.assertContains(self.client.get(reverse('orders:order_list')), 'Renamed Customer')
+        self.assertContains(self.client.get(reverse('orders:customer_list')), 'Renamed Customer')
+
+    def test_customer_rows_show_order_figures(self):
+        response = self.client.get(reverse('orders:customer_list'))
+        self.assertEqual(response.context['customers'][0].order_count, 0)
+        self.assertContains(response, 'No orders')
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer)
+            OrderItem.objects.create(order=order, product=self.product, quantity=2, price=40)
+        response = self.client.get(reverse('orders:customer_list'))
+        customer = response.context['customers'][0]
+        self.assertEqual((customer.order_count, customer.total_spent), (1, Decimal('80.00')))
+        self.assertContains(response, '$80.00')
+        self.assertNotContains(response, 'No orders')
+
+    def test_product_rows_follow_stock_postings(self):
+        self.assertContains(self.client.get(reverse('inventory:product_list')), '<span class="fw-medium">5</span>')
+        with self.captureOnCommitCallbacks(execute=True):
+            StockMovement.objects.create(product=self.product, movement_type='purchase', quantity=20)
+        self.assertContains(self.client.get(reverse('inventory:product_list')), '<span class="fw-medium">25</span>')
@@ -0,0 +1,114 @@
+"""
+Deferred order total maintenance.
+
+Item changes only mark their order as dirty. Totals are recomputed once per
+order when the surrounding transaction commits, with a single
+``Sum(quantity * price)`` query for every dirty order and an update of just
+the ``total`` column.
+"""
+import logging
+
+from django.db import router, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from store_manager.caching import bump
+
+from .models import Order, OrderItem
+from .rollups import record_order_change
+
+logger = logging.getLogger(__name__)
+
+
+def items_total_subquery():
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    total = items.annotate(total=Sum(F('quantity') * F('price'))).values('total')
+    return Coalesce(
+        Subquery(total, output_field=DecimalField(max_digits=10, decimal_places=2)),
+        Value(0),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def refresh_totals(order_ids, using=None):
+    """
+    Recomputes the totals of the given orders and returns ``{pk: total}``.
+    Only orders whose total actually changed are written, along with their
+    updated_at.
+    """
+    order_ids = set(order_ids)
+    if not order_ids:
+        return {}
+    using = using or router.db_for_write(Order)
+    now = timezone.now()
+
+    with transaction.atomic(using=using):
+        rows = Order.objects.using(using).filter(pk__in=order_ids).annotate(
+            new_total=items_total_subquery()
+        ).values_list('pk', 'status', 'order_date', 'total', 'new_total')
+
+        totals = {}
+        changed = []
+        for pk, status, order_date, old_total, new_total in rows:
+            totals[pk] = new_total
+            if new_total != old_total:
+                changed.append(Order(pk=pk, total=new_total, updated_at=now))
+                record_order_change(order_date, (status, old_total), (status, new_total))
+
+        if len(changed) == 1:
+            Order.objects.using(using).filter(pk=changed[0].pk).update(total=changed[0].total, updated_at=now)
+        elif changed:
+            Order.objects.using(using).bulk_update(changed, ['total', 'updated_at'], batch_size=500)
+        if changed:
+            bump('orders', using=using)
+    return totals
+
+
+class PendingTotals:
+    """
+    Order ids waiting for a total refresh when the current transaction
+    commits
+    """
+
+    def __init__(self, using):
+        self.using = using
+        self.order_ids = set()
+
+    def is_registered(self, connection):
+        return any(entry[1] == self.flush for entry in connection.run_on_commit)
+
+    def flush(self):
+        connection = transaction.get_connection(self.using)
+        if getattr(connection, 'pending_order_totals', None) is self:
+            connection.pending_order_totals = None
+        try:
+            refresh_totals(self.order_ids, using=self.using)
+            logger.debug(f"Updated totals for {len(self.order_ids)} order(s)")
+        except Exception as e:
+            logger.error(f"Failed to update totals for orders {sorted(self.order_ids)}: {e}")
+
+
+def schedule_total_refresh(order_ids, using=None):
+    """
+    Marks orders as needing a total refresh. Inside a transaction the refresh
+    runs once at commit however many items change; in autocommit mode it runs
+    immediately.
+    """
+    order_ids = {order_id for order_id in order_ids if order_id is not None}
+    if not order_ids:
+        return
+    using = using or router.db_for_write(Order)
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        refresh_totals(order_ids, using=using)
+        return
+
+    # A rolled back block discards its on_commit callbacks, so only reuse
+    # the pending set while its flush is still registered.
+    pending = getattr(connection, 'pending_order_totals', None)
+    if pending is None or not pending.is_registered(connection):
+        pending = PendingTotals(using)
+        connection.pending_order_totals = pending
+        transaction.on_commit(pending.flush, using=using)
+    pending.order_ids.update(order_ids)
@@ -26,4 +26,9 @@ urlpatterns = [
     path('orders/<int:pk>/items/<int:item_pk>/delete/', views.OrderItemDeleteView.as_view(), name='order_item_delete'),
     path('orders/<int:pk>/items/export/', views.export_order_items, name='export_order_items'),
     path('orders/<int:pk>/items/import/', views.import_order_items, name='import_order_items'),
+    path('export/orders/', views.export_orders, name='export_orders'),
+    path('export/customers/', views.export_customers, name='export_customers'),
+    path('export/products/', views.export_products, name='export_products'),
+    path('export/movements/', views.export_stock_movements, name='export_stock_movements'),
+    path('export/alerts/', views.export_inventory_alerts, name='export_inventory_alerts'),
 ]
\ No newline at end of file
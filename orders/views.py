@@ -1,6 +1,9 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse
-from django.db.models import Q, Sum, F
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum, F
+from django.db.models.functions import Coalesce
 from django.views.generic import (
     ListView, DetailView, CreateView, 
     UpdateView, DeleteView, TemplateView
@@ -19,7 +22,13 @@ from django.db.models import Sum, F, Q
 from django.contrib import messages
 from django.utils import timezone
 from .models import Order, Customer
+from .rollups import overall_totals, status_totals
+from .importers import import_order_items as import_items_from_csv
 from inventory.models import Product, Category, Supplier, StockMovement, ProductImage, InventoryAlert
+from inventory.export_jobs import export_or_enqueue
+from inventory.metrics import product_metrics
+from store_manager.caching import CachedResponseMixin
+from store_manager.pagination import CursorPaginationMixin
 from .forms import OrderForm, CustomerForm, OrderItemFormSet  # Only import forms that exist in orders/forms.py
 from inventory.forms import ProductForm, StockMovementForm, CategoryForm, SupplierForm, ProductImageForm
 from .models import Order, Customer, OrderItem  # Make sure OrderItem is imported
@@ -49,11 +58,11 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         
         # Inventory summary
         products = Product.objects.all()
-        context['total_products'] = products.count()
-        context['low_stock'] = products.filter(quantity__lte=F('reorder_level')).count()
-        context['out_of_stock'] = products.filter(quantity=0).count()
-        context['total_value'] = products.aggregate(
-            total=Sum(F('quantity') * F('cost_price')))['total'] or 0
+        metrics = product_metrics(products, value=F('quantity') * F('cost_price'))
+        context['total_products'] = metrics['total_products']
+        context['low_stock'] = metrics['low_stock']
+        context['out_of_stock'] = metrics['out_of_stock']
+        context['total_value'] = metrics['total_value']
         
         # Recent activity
         context['recent_movements'] = StockMovement.objects.select_related(
@@ -72,15 +81,17 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         )
         
         return context
-class OrdersDashboardView(LoginRequiredMixin, TemplateView):
+class OrdersDashboardView(LoginRequiredMixin, CachedResponseMixin, TemplateView):
     template_name = 'orders/dashboard.html'
+    cache_domains = ('orders',)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_orders'] = Order.objects.count()
-        context['pending_orders'] = Order.objects.filter(status='pending').count()
-        context['completed_orders'] = Order.objects.filter(status='completed').count()
-        context['total_revenue'] = sum(o.total for o in Order.objects.all())
+        totals = status_totals()
+        context['total_orders'] = sum(row['orders'] for row in totals.values())
+        context['pending_orders'] = totals['pending']['orders']
+        context['completed_orders'] = totals['completed']['orders']
+        context['total_revenue'] = sum(row['revenue'] for row in totals.values())
         context['recent_orders'] = Order.objects.select_related('customer').order_by('-order_date')[:10]
         return context
 class ProductListView(LoginRequiredMixin, ListView):
@@ -382,14 +393,16 @@ def update_order_status(request, pk):
     else:
         messages.error(request, "Invalid status.")
     return redirect(reverse('orders:order_detail', kwargs={'pk': order.id}))
-class OrderListView(LoginRequiredMixin, ListView):
+class OrderListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Order
     template_name = 'orders/order_list.html'
     context_object_name = 'orders'
     paginate_by = 25
+    cursor_ordering = ('-order_date', 'id')
+    query_budget = 8
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related('customer').order_by('-order_date')  # Changed from created_at to order_date
+        queryset = super().get_queryset().select_related('customer')
         search = self.request.GET.get('search')
         status = self.request.GET.get('status')
 
@@ -406,8 +419,7 @@ class OrderListView(LoginRequiredMixin, ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_orders'] = Order.objects.count()
-        context['total_revenue'] = Order.objects.aggregate(total=Sum('total'))['total'] or 0
+        context['total_orders'], context['total_revenue'] = overall_totals()
         context['customers'] = Customer.objects.all()
         return context
 class OrderDetailView(LoginRequiredMixin, DetailView):
@@ -440,9 +452,11 @@ class OrderCreateView(LoginRequiredMixin, CreateView):
         formset = context['formset']
         
         if formset.is_valid():
-            self.object = form.save()
-            formset.instance = self.object
-            formset.save()
+            # One transaction, so the order total is computed once at commit
+            with transaction.atomic():
+                self.object = form.save()
+                formset.instance = self.object
+                formset.save()
             messages.success(self.request, f"Order #{self.object.id} created successfully.")
             return redirect(self.get_success_url())
         else:
@@ -482,6 +496,7 @@ class CustomerListView(LoginRequiredMixin, ListView):
     template_name = 'orders/customer_list.html'
     context_object_name = 'customers'
     paginate_by = 20
+    query_budget = 8
 
     def get_queryset(self):
         queryset = super().get_queryset().order_by('name')
@@ -492,12 +507,18 @@ class CustomerListView(LoginRequiredMixin, ListView):
                 Q(email__icontains=search) |
                 Q(phone__icontains=search)
             )
-        return queryset         
+        # The figures each row shows (and its cache key includes), as
+        # subqueries so only the rows on the page are counted
+        orders = Order.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+        return queryset.annotate(
+            order_count=Coalesce(Subquery(orders.annotate(count=Count('pk')).values('count')), 0),
+            total_spent=Subquery(orders.annotate(total_spent=Sum('total')).values('total_spent')),
+            last_order_date=Subquery(orders.annotate(last=Max('order_date')).values('last')),
+        )
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_customers'] = self.get_queryset().count()
-        context['total_orders'] = Order.objects.count()
-        context['total_revenue'] = Order.objects.aggregate(total=Sum('total'))['total'] or 0
+        context['total_customers'] = context['paginator'].count
+        context['total_orders'], context['total_revenue'] = overall_totals()
         return context
 class CustomerDetailView(LoginRequiredMixin, DetailView):
     model = Customer
@@ -605,7 +626,8 @@ def add_order_item(request, pk):
     if request.method == 'POST':
         form = OrderItemFormSet(request.POST, instance=order)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
             messages.success(request, "Order item added successfully.")
             return redirect('orders:order_detail', pk=order.pk)
     else:
@@ -618,7 +640,8 @@ def update_order_item(request, pk, item_pk):
     if request.method == 'POST':
         form = OrderItemFormSet(request.POST, instance=item)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
             messages.success(request, "Order item updated successfully.")
             return redirect('orders:order_detail', pk=order.pk)
     else:
@@ -635,159 +658,70 @@ def delete_order_item(request, pk, item_pk):
         return redirect('orders:order_detail', pk=order.pk)
     
     return render(request, 'orders/order_item_confirm_delete.html', {'item': item, 'order': order})     
-def export_orders(request): 
-    orders = Order.objects.all().select_related('customer')
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="orders.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Order ID', 'Customer Name', 'Order Date', 'Status', 'Total'])
-
-    for order in orders:
-        writer.writerow([
-            order.id,
-            order.customer.name,
-            order.order_date.strftime('%Y-%m-%d %H:%M:%S'),
-            order.get_status_display(),
-            order.total
-        ])
-
-    return response     
-def export_order_items(request, pk):    
+@login_required
+def export_orders(request):
+    return export_or_enqueue(request, 'orders')
+
+
+@login_required
+def export_order_items(request, pk):
     order = get_object_or_404(Order, pk=pk)
-    items = order.items.select_related('product')
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="order_{order.id}_items.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Order ID', 'Product Name', 'Quantity', 'Price', 'Total'])
-
-    for item in items:
-        writer.writerow([
-            order.id,
-            item.product.name,
-            item.quantity,
-            item.price,
-            item.get_total()
-        ])
-
-    return response 
+    return export_or_enqueue(
+        request, 'order_items',
+        filters={'order_id': order.pk},
+        filename=f"order_{order.id}_items.csv",
+    )
+
+
+@login_required
 def export_customers(request):
-    customers = Customer.objects.all()
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="customers.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Customer ID', 'Name', 'Email', 'Phone', 'Address'])
-
-    for customer in customers:
-        writer.writerow([
-            customer.id,
-            customer.name,
-            customer.email,
-            customer.phone,
-            customer.address
-        ])
-
-    return response     
+    return export_or_enqueue(request, 'customers')
+
+
+@login_required
 def export_products(request):
-    products = Product.objects.all().select_related('category', 'supplier')
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="products.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Product ID', 'Name', 'SKU', 'Category', 'Supplier', 'Quantity', 'Cost Price', 'Selling Price'])
-
-    for product in products:
-        writer.writerow([
-            product.id,
-            product.name,
-            product.sku,
-            product.category.name if product.category else '',
-            product.supplier.name if product.supplier else '',
-            product.quantity,
-            product.cost_price,
-            product.unit_price
-        ])
-
-    return response 
-def export_stock_movements(request):    
-    movements = StockMovement.objects.all().select_related('product', 'created_by')
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="stock_movements.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Movement ID', 'Product', 'Movement Type', 'Quantity', 'Unit Price', 'Total Value', 'Created By', 'Created At'])
-
-    for movement in movements:
-        writer.writerow([
-            movement.id,
-            movement.product.name,
-            movement.get_movement_type_display(),
-            movement.quantity,
-            movement.unit_price,
-            movement.get_total_value(),
-            movement.created_by.username if movement.created_by else '',
-            movement.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-
-    return response 
-def export_inventory_alerts(request):   
-    alerts = InventoryAlert.objects.all().select_related('product', 'created_by')
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="inventory_alerts.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Alert ID', 'Product', 'Alert Type', 'Quantity', 'Created By', 'Created At', 'Resolved'])
-
-    for alert in alerts:
-        writer.writerow([
-            alert.id,
-            alert.product.name,
-            alert.get_alert_type_display(),
-            alert.quantity,
-            alert.created_by.username if alert.created_by else '',
-            alert.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            alert.is_resolved
-        ])
-
-    return response   
-def import_order_items(request):
+    return export_or_enqueue(request, 'products')
+
+
+@login_required
+def export_stock_movements(request):
+    return export_or_enqueue(request, 'stock_movements')
+
+
+@login_required
+def export_inventory_alerts(request):
+    return export_or_enqueue(request, 'inventory_alerts')
+
+
+def import_order_items(request, pk=None):
+    order = get_object_or_404(Order, pk=pk) if pk else None
+    done_url = order.get_absolute_url() if order else reverse('orders:order_list')
+    context = {'order': order}
+
     if request.method == 'POST' and request.FILES.get('csv_file'):
         csv_file = request.FILES['csv_file']
         if not csv_file.name.endswith('.csv'):
             messages.error(request, 'Please upload a CSV file')
-            return redirect('orders:order_list')
-        
+            return redirect(done_url)
+
         try:
-            decoded_file = csv_file.read().decode('utf-8').splitlines()
-            reader = csv.DictReader(decoded_file)
-            
-            for row in reader:
-                try:
-                    order = Order.objects.get(id=row['order_id'])
-                    product = Product.objects.get(id=row['product_id'])
-                    
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        quantity=row['quantity'],
-                        price=row['price']
-                    )
-                except (Order.DoesNotExist, Product.DoesNotExist) as e:
-                    messages.warning(request, f'Skipped row: {e}')
-                    continue
-            
-            messages.success(request, 'Order items imported successfully!')
-            return redirect('orders:order_list')
-            
-        except Exception as e:
+            report = import_items_from_csv(csv_file, order=order)
+        except ValidationError as e:
+            messages.error(request, f'Error importing file: {e.message}')
+            return redirect(done_url)
+        except (UnicodeDecodeError, csv.Error) as e:
             messages.error(request, f'Error importing file: {e}')
-            return redirect('orders:order_list')
-    
-    return render(request, 'orders/import_order_items.html')  
-    from django.shortcuts import render
+            return redirect(done_url)
+
+        if report.imported:
+            messages.success(request, f'Imported {report.imported} order item(s).')
+        if not report.errors:
+            return redirect(done_url)
+        context['report'] = report
+
+    return render(request, 'orders/import_order_items.html', context)
+
+
 from .models import Product  # or whatever your inventory model is
 
 def low_stock_report(request):
@@ -0,0 +1,141 @@
+"""
+Read-only JSON API.
+
+Each endpoint reuses the filtering of an HTML list view (its get_queryset()
+reads the same query parameters), then reads only the requested columns
+with values() and serializes the dicts directly, so no model instances or
+templates are involved. Lists are paginated with CursorPaginator.
+
+Query parameters, besides the list view's own filters:
+
+``fields``
+    Comma-separated subset of the resource's fields (default: all).
+``limit``
+    Page size, up to MAX_PAGE_SIZE.
+``cursor``
+    The ``next`` or ``previous`` token of an earlier response.
+``count``
+    'exact' or 'approx' to include a total.
+
+Responses carry an ETag of their content; a request whose If-None-Match
+matches gets an empty 304. Clients authenticate with a session or with the
+X-Api-Token header (settings.API_TOKEN).
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.views import View
+
+from .pagination import CursorPaginator, InvalidCursor
+
+MAX_PAGE_SIZE = 500
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiListView(View):
+    """
+    JSON list endpoint over ``list_view``'s queryset. ``fields`` maps output
+    names to values() lookups.
+    """
+    list_view = None
+    fields = {}
+    # Defaults to the list view's cursor ordering
+    ordering = None
+    page_size = 50
+    query_budget = 5
+    http_method_names = ['get', 'head', 'options']
+
+    def authenticate(self, request):
+        if 'X-Api-Token' in request.headers:
+            token = getattr(settings, 'API_TOKEN', None)
+            if not token or not constant_time_compare(request.headers['X-Api-Token'], token):
+                raise ApiError("Invalid API token", status=403)
+        elif not request.user.is_authenticated:
+            raise ApiError("Authentication required", status=401)
+
+    def get_list_view(self):
+        view = self.list_view()
+        view.setup(self.request, *self.args, **self.kwargs)
+        return view
+
+    def get_ordering(self, list_view):
+        if self.ordering is not None:
+            return self.ordering
+        return list_view.get_cursor_ordering()
+
+    def get_fields(self):
+        requested = self.request.GET.get('fields')
+        if not requested:
+            return dict(self.fields)
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+        return {name: self.fields[name] for name in names}
+
+    def get_page_size(self):
+        try:
+            limit = int(self.request.GET.get('limit', self.page_size))
+        except ValueError:
+            raise ApiError("limit must be a number")
+        return min(max(limit, 1), MAX_PAGE_SIZE)
+
+    def get_count_mode(self):
+        mode = self.request.GET.get('count') or None
+        if mode not in (None, 'exact', 'approx'):
+            raise ApiError("count must be 'exact' or 'approx'")
+        return mode
+
+    def page_link(self, cursor):
+        if cursor is None:
+            return None
+        query = self.request.GET.copy()
+        query['cursor'] = cursor
+        return self.request.build_absolute_uri(f'?{query.urlencode()}')
+
+    def get_data(self):
+        fields = self.get_fields()
+        list_view = self.get_list_view()
+        ordering = self.get_ordering(list_view)
+        # The cursor needs the ordering columns even when they aren't output
+        columns = list(dict.fromkeys([*fields.values(), *(name.lstrip('-') for name in ordering or ())]))
+        queryset = list_view.get_queryset().values(*columns)
+
+        paginator = CursorPaginator(queryset, ordering, self.get_page_size(), count_mode=self.get_count_mode())
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor as e:
+            raise ApiError(str(e))
+
+        data = {
+            'results': [{name: row[lookup] for name, lookup in fields.items()} for row in page],
+            'next': self.page_link(page.next_cursor),
+            'previous': self.page_link(page.previous_cursor),
+        }
+        if paginator.count_mode:
+            data['count'] = page.count
+            data['count_is_estimate'] = page.count_is_estimate
+        return data
+
+    def get(self, request, *args, **kwargs):
+        try:
+            self.authenticate(request)
+            content = json.dumps(self.get_data(), cls=DjangoJSONEncoder)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+
+        response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = f'"{hashlib.md5(content.encode(), usedforsecurity=False).hexdigest()}"'
+        response['Cache-Control'] = 'private, no-cache'
+        # A 304 that keeps the ETag header when If-None-Match matches
+        return get_conditional_response(request, etag=response['ETag'], response=response)
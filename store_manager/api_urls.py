@@ -0,0 +1,14 @@
+from django.urls import path
+
+from inventory.api import InventoryAlertApiView, ProductApiView, StockMovementApiView
+from orders.api import CustomerApiView, OrderApiView
+
+app_name = 'api'
+
+urlpatterns = [
+    path('products/', ProductApiView.as_view(), name='products'),
+    path('movements/', StockMovementApiView.as_view(), name='movements'),
+    path('alerts/', InventoryAlertApiView.as_view(), name='alerts'),
+    path('orders/', OrderApiView.as_view(), name='orders'),
+    path('customers/', CustomerApiView.as_view(), name='customers'),
+]
@@ -0,0 +1,291 @@
+"""
+Benchmark harness for the key views and exports.
+
+Each scenario requests a URL through the test client as a staff user and
+records, per request, the queries run and their time (with the same
+QueryRecorder as the request instrumentation), the wall time, and the
+response size; one more request runs under tracemalloc for the peak Python
+memory, as tracing slows everything else down. Streaming responses are
+consumed in full, so exports are timed end to end. The response cache (see
+store_manager.caching) is off unless ``cache_responses`` is set, so the
+views' own cost is what gets timed.
+
+``run_benchmarks`` returns a JSON-ready report carrying the commit and the
+dataset sizes; ``compare_reports`` lines two reports up so a regression
+between commits shows as a ratio.
+
+``run_render_benchmarks`` times the template rendering alone of a
+``RENDER_ROWS``-row page of the product, order and customer lists, whose
+rows are cached fragments: cold (the row cache emptied first) and warm.
+"""
+import subprocess
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import QuerySet
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import Category, InventoryAlert, Product, StockMovement, Supplier
+from inventory.views import ProductListView
+from orders.models import Customer, Order, OrderItem
+from orders.views import CustomerListView, OrderListView
+
+from .instrumentation import QueryRecorder, percentile
+
+BENCH_USERNAME = 'bench-runner'
+RENDER_ROWS = 100
+RENDER_VIEWS = [('product_list', ProductListView), ('order_list', OrderListView),
+                ('customer_list', CustomerListView)]
+# The {% cache %} tag uses this cache when it is configured
+FRAGMENT_CACHE = 'template_fragments'
+DATASET_MODELS = [Product, StockMovement, Category, Supplier, InventoryAlert, Customer, Order, OrderItem]
+
+
+class Scenario:
+    """
+    A URL to request ``iterations`` times. ``url`` may be a callable that
+    looks up an object to request; when it returns None the scenario is
+    skipped. ``settings`` are overridden for its requests.
+    """
+
+    def __init__(self, name, url, iterations=None, settings=None, headers=None):
+        self.name = name
+        self.url = url
+        self.iterations = iterations
+        self.settings = settings or {}
+        self.headers = headers or {}
+
+    def resolve_url(self):
+        return self.url() if callable(self.url) else self.url
+
+
+def view_url(view_name, query=''):
+    return lambda: reverse(view_name) + (f'?{query}' if query else '')
+
+
+def first_url(view_name, queryset, field='pk'):
+    def url():
+        value = queryset.values_list(field, flat=True).first()
+        return None if value is None else reverse(view_name, args=[value])
+    return url
+
+
+# Exports stream whatever their size, rather than queueing a job
+STREAM_EXPORTS = {'EXPORT_ASYNC_THRESHOLD': float('inf')}
+
+SCENARIOS = [
+    Scenario('dashboard', view_url('dashboard')),
+    Scenario('product_list', view_url('inventory:product_list')),
+    Scenario('product_list_search', view_url('inventory:product_list', 'search=wireless+mouse')),
+    Scenario('product_list_low_stock', view_url('inventory:product_list', 'stock_status=low')),
+    Scenario('product_scan', first_url('inventory:product_scan', Product.objects.order_by('pk'), 'sku')),
+    Scenario('category_list', view_url('inventory:category_list')),
+    Scenario('category_detail', first_url('inventory:category_detail', Category.objects.filter(parent=None))),
+    Scenario('supplier_list', view_url('inventory:supplier_list')),
+    Scenario('movement_list', view_url('inventory:movement_list')),
+    Scenario('alert_list', view_url('inventory:alert_list')),
+    Scenario('inventory_report', view_url('inventory:inventory_report')),
+    Scenario('sales_report', view_url('inventory:sales_report')),
+    Scenario('order_list', view_url('orders:order_list')),
+    Scenario('order_detail', first_url('orders:order_detail', Order.objects.order_by('-pk'))),
+    Scenario('customer_list', view_url('orders:customer_list')),
+    Scenario('api_products', view_url('api:products')),
+    Scenario('api_orders', view_url('api:orders')),
+    Scenario('export_products', view_url('orders:export_products'), iterations=1, settings=STREAM_EXPORTS),
+    Scenario('export_orders', view_url('orders:export_orders'), iterations=1, settings=STREAM_EXPORTS),
+]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        'p50': round(percentile(values, 0.50), 2),
+        'p95': round(percentile(values, 0.95), 2),
+        'max': round(values[-1], 2),
+        'mean': round(sum(values) / len(values), 2),
+    }
+
+
+class BenchmarkRunner:
+    def __init__(self, iterations=5, warmup=1, measure_memory=True, log=None, cache_responses=False):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.measure_memory = measure_memory
+        self.cache_responses = cache_responses
+        self.log = log or (lambda name, result: None)
+
+    def request(self, client, url, headers):
+        """
+        One request, returning ``(status, bytes, queries, db_ms, wall_ms)``
+        """
+        recorder = QueryRecorder()
+        began = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = client.get(url, headers=headers)
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+        wall_ms = (time.perf_counter() - began) * 1000
+        return response.status_code, size, recorder.count, recorder.seconds * 1000, wall_ms
+
+    def run_scenario(self, client, scenario):
+        url = scenario.resolve_url()
+        if url is None:
+            return {'skipped': "no object to request"}
+        iterations = scenario.iterations or self.iterations
+        with override_settings(**scenario.settings):
+            try:
+                for _ in range(self.warmup):
+                    self.request(client, url, scenario.headers)
+                samples = [self.request(client, url, scenario.headers) for _ in range(iterations)]
+                peak_kb = None
+                if self.measure_memory:
+                    tracemalloc.start()
+                    try:
+                        self.request(client, url, scenario.headers)
+                        peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024)
+                    finally:
+                        tracemalloc.stop()
+            except Exception as error:
+                return {'url': url, 'error': f"{type(error).__name__}: {error}"}
+        return {
+            'url': url,
+            'iterations': iterations,
+            'status': samples[-1][0],
+            'response_bytes': samples[-1][1],
+            'queries': max(sample[2] for sample in samples),
+            'db_ms': summarize([sample[3] for sample in samples]),
+            'wall_ms': summarize([sample[4] for sample in samples]),
+            'peak_memory_kb': peak_kb,
+        }
+
+    def run(self, scenarios):
+        user, created = get_user_model().objects.get_or_create(
+            username=BENCH_USERNAME, defaults={'is_staff': True, 'is_superuser': True})
+        client = Client()
+        client.force_login(user)
+        results = {}
+        try:
+            # Like the test runner: the test client's host, and no query log
+            overrides = {} if self.cache_responses else {'RESPONSE_CACHE_TIMEOUT': 0}
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], DEBUG=False,
+                                   **overrides):
+                for scenario in scenarios:
+                    results[scenario.name] = result = self.run_scenario(client, scenario)
+                    self.log(scenario.name, result)
+        finally:
+            if created:
+                user.delete()
+        return results
+
+
+def dataset_sizes():
+    return {model._meta.label: model.objects.count() for model in DATASET_MODELS}
+
+
+def run_benchmarks(scenarios=None, iterations=5, warmup=1, measure_memory=True, log=None,
+                   cache_responses=False):
+    """
+    Runs the scenarios (all by default) and returns the report
+    """
+    runner = BenchmarkRunner(iterations, warmup, measure_memory, log, cache_responses)
+    started = timezone.now()
+    results = runner.run(SCENARIOS if scenarios is None else scenarios)
+    return {
+        'commit': git_commit(),
+        'started_at': started.isoformat(),
+        'database': connections['default'].vendor,
+        'dataset': dataset_sizes(),
+        'iterations': iterations,
+        'cache_responses': cache_responses,
+        'scenarios': results,
+    }
+
+
+def render_page(view, request):
+    """
+    Runs the view, loads every queryset in its context, then renders it,
+    returning ``(rows, render_ms, queries run while rendering)``
+    """
+    response = view(request)
+    for value in response.context_data.values():
+        if isinstance(value, QuerySet):
+            list(value)
+    recorder = QueryRecorder()
+    began = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        response.render()
+    render_ms = (time.perf_counter() - began) * 1000
+    return len(response.context_data['object_list']), render_ms, recorder.count
+
+
+def run_render_benchmarks(rows=RENDER_ROWS, iterations=5, log=None):
+    """
+    ``{view: {'rows', 'cold_ms', 'warm_ms', 'cold_queries', 'warm_queries'}}``
+    for a ``rows``-row first page of each RENDER_VIEWS list. The row
+    fragments go to a cache of their own, emptied before each cold render.
+    """
+    log = log or (lambda name, result: None)
+    user, created = get_user_model().objects.get_or_create(
+        username=BENCH_USERNAME, defaults={'is_staff': True, 'is_superuser': True})
+    fragments = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-fragments'}
+    results = {}
+    try:
+        with override_settings(CACHES={**settings.CACHES, FRAGMENT_CACHE: fragments}, DEBUG=False):
+            for name, view_class in RENDER_VIEWS:
+                view = view_class.as_view(paginate_by=rows)
+                request = RequestFactory().get('/')
+                request.user = user
+                cold, warm = [], []
+                for _ in range(iterations):
+                    caches[FRAGMENT_CACHE].clear()
+                    cold.append(render_page(view, request))
+                    warm.append(render_page(view, request))
+                results[name] = result = {
+                    'rows': cold[-1][0],
+                    'cold_ms': summarize([sample[1] for sample in cold]),
+                    'warm_ms': summarize([sample[1] for sample in warm]),
+                    'cold_queries': max(sample[2] for sample in cold),
+                    'warm_queries': max(sample[2] for sample in warm),
+                }
+                log(name, result)
+    finally:
+        if created:
+            user.delete()
+    return results
+
+
+def compare_reports(baseline, current, metric='p50'):
+    """
+    ``[(scenario, baseline ms, current ms, ratio, baseline queries, current
+    queries)]`` for the scenarios timed in both reports
+    """
+    rows = []
+    for name, result in current['scenarios'].items():
+        before = baseline['scenarios'].get(name, {})
+        if 'wall_ms' not in result or 'wall_ms' not in before:
+            continue
+        old, new = before['wall_ms'][metric], result['wall_ms'][metric]
+        rows.append((name, old, new, new / old if old else None, before['queries'], result['queries']))
+    return rows
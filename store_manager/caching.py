@@ -0,0 +1,179 @@
+"""
+Versioned response cache for the report and dashboard pages.
+
+Function views use the ``cache_response`` decorator and class-based views
+CachedResponseMixin, naming the data domains the page reads (DOMAINS).
+Successful GET responses are kept in the ``settings.RESPONSE_CACHE_ALIAS``
+cache (the default cache, local memory unless CACHES says otherwise) for
+``settings.RESPONSE_CACHE_TIMEOUT`` seconds; a timeout of 0 turns caching
+off.
+
+Each domain has a version counter in the same cache. Pages are stored under
+the view name and the normalized query parameters, together with the
+versions they were rendered at, so a request reads the page and the current
+versions with one ``get_many`` and only serves the page if they still
+match. Writes call ``bump`` for the domains they touch, which moves the
+versions on once the transaction commits (after the derived tables it
+refreshes on commit), so a cached page is never served across a write and
+nothing has to be deleted.
+
+Requests with pending flash messages skip the cache, since the messages
+are rendered into the page.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+DOMAINS = ('inventory', 'orders')
+DEFAULT_TIMEOUT = 300
+CACHE_PREFIX = 'responses'
+
+
+def response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def cache_timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def version_key(domain):
+    return f'{CACHE_PREFIX}:version:{domain}'
+
+
+def new_version():
+    # Not restarting from 1 keeps pages stored before the counter was
+    # evicted from matching a recreated one
+    return time.time_ns()
+
+
+def page_key(view_name, query):
+    """
+    The key of a page: its view, today's date (pages default to periods
+    ending today) and its query parameters in a stable order, without empty
+    values
+    """
+    params = sorted((name, value) for name, values in query.lists() for value in values if value != '')
+    digest = hashlib.md5(repr(params).encode(), usedforsecurity=False).hexdigest()
+    return f'{CACHE_PREFIX}:page:{view_name}:{timezone.localdate().isoformat()}:{digest}'
+
+
+def bump_now(domains):
+    cache = response_cache()
+    for domain in domains:
+        try:
+            cache.incr(version_key(domain))
+        except ValueError:
+            cache.set(version_key(domain), new_version(), None)
+
+
+class PendingBumps:
+    """
+    Domains to bump when the current transaction commits
+    """
+
+    def __init__(self, using):
+        self.using = using
+        self.domains = set()
+
+    def is_registered(self, connection):
+        return any(entry[1] == self.flush for entry in connection.run_on_commit)
+
+    def flush(self):
+        connection = transaction.get_connection(self.using)
+        if getattr(connection, 'pending_cache_bumps', None) is self:
+            connection.pending_cache_bumps = None
+        bump_now(self.domains)
+
+
+def bump(*domains, using=None):
+    """
+    Invalidates the pages reading ``domains``: once at commit inside a
+    transaction, straight away in autocommit mode
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        bump_now(domains)
+        return
+
+    # As for order totals: a rolled back block drops its callbacks
+    pending = getattr(connection, 'pending_cache_bumps', None)
+    if pending is None or not pending.is_registered(connection):
+        pending = PendingBumps(using)
+        connection.pending_cache_bumps = pending
+        transaction.on_commit(pending.flush, using=using)
+    pending.domains.update(domains)
+
+
+def current_versions(cache, domains, found):
+    versions = []
+    for domain in domains:
+        version = found.get(version_key(domain))
+        if version is None:
+            cache.add(version_key(domain), new_version(), None)
+            version = cache.get(version_key(domain))
+        versions.append(version)
+    return tuple(versions)
+
+
+def cached_response(request, view_name, domains, get_response):
+    """
+    Returns the cached page for the request when its domains haven't
+    changed since it was stored, or ``get_response()`` (stored when it is a
+    plain 200)
+    """
+    timeout = cache_timeout()
+    if not timeout or request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+        return get_response()
+
+    cache = response_cache()
+    key = page_key(view_name, request.GET)
+    found = cache.get_many([key, *(version_key(domain) for domain in domains)])
+    versions = current_versions(cache, domains, found)
+    entry = found.get(key)
+    if entry is not None and entry[0] == versions:
+        return HttpResponse(entry[2], content_type=entry[1])
+
+    response = get_response()
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    if response.status_code == 200 and not response.streaming and not response.cookies:
+        # Stored at the versions read before rendering: a write committed
+        # meanwhile leaves it unreachable
+        cache.set(key, (versions, response['Content-Type'], response.content), timeout)
+    return response
+
+
+def cache_response(*domains):
+    """
+    Caches a function view's pages until ``domains`` change
+    """
+    def decorator(view):
+        view_name = f'{view.__module__}.{view.__qualname__}'
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return cached_response(request, view_name, domains, lambda: view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+class CachedResponseMixin:
+    """
+    Caches a class-based view's GET pages until ``cache_domains`` change.
+    Access mixins still run first, from dispatch().
+    """
+    cache_domains = ()
+
+    def get(self, request, *args, **kwargs):
+        view_name = f'{type(self).__module__}.{type(self).__qualname__}'
+        return cached_response(
+            request, view_name, self.cache_domains, lambda: super(CachedResponseMixin, self).get(
+                request, *args, **kwargs))
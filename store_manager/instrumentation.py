@@ -0,0 +1,218 @@
+"""
+Per-view request instrumentation.
+
+RequestStatsMiddleware records, for every request that resolved to a view:
+the number of queries and their total time, the SQL fingerprints that ran
+more than once (the signature of an N+1), the template render time, the
+total time and the response size. Samples are kept per view name in a
+bounded in-memory window (``REQUEST_STATS_WINDOW``, per worker process), and
+the stats view reports p50/p95/p99 over it.
+
+Views declare a query budget with a ``query_budget`` attribute (class-based
+views) or the ``query_budget`` decorator (function views);
+``settings.QUERY_BUDGETS`` maps view names to budgets for views defined
+elsewhere, like the admin. A request over budget is logged, or raises
+QueryBudgetExceeded when ``settings.QUERY_BUDGET_STRICT`` is set, as it is
+under the test runner. Every query the request runs counts, including
+one-off work such as building the inventory snapshot on first use.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 1000
+# Fingerprints kept per view, most repeated first
+MAX_DUPLICATES = 20
+METRICS = ('queries', 'db_ms', 'render_ms', 'total_ms', 'response_bytes')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    """
+    Declares the query budget of a function view
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def view_budget(resolver_match):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if resolver_match.view_name in budgets:
+        return budgets[resolver_match.view_name]
+    func = resolver_match.func
+    budget = getattr(func, 'query_budget', None)
+    if budget is None:
+        budget = getattr(getattr(func, 'view_class', None), 'query_budget', None)
+    return budget
+
+
+def fingerprint(sql):
+    """
+    The SQL with literals and IN lists collapsed, so the same statement with
+    different parameters has the same fingerprint
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    sql = re.sub(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)', '(...)', sql)
+    return sql.replace('%s', '?')
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class QueryRecorder:
+    """
+    execute_wrapper that counts queries, their time and repeated fingerprints
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - began
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+class RequestStats:
+    """
+    Rolling per-view samples, thread-safe
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+        self.requests = Counter()
+        self.over_budget = Counter()
+        self.duplicates = defaultdict(Counter)
+        self.budgets = {}
+
+    def record(self, view_name, sample, duplicates, budget):
+        with self.lock:
+            self.samples[view_name].append(sample)
+            self.requests[view_name] += 1
+            self.budgets[view_name] = budget
+            if budget is not None and sample['queries'] > budget:
+                self.over_budget[view_name] += 1
+            if duplicates:
+                counts = self.duplicates[view_name]
+                counts.update(duplicates)
+                if len(counts) > MAX_DUPLICATES * 2:
+                    self.duplicates[view_name] = Counter(dict(counts.most_common(MAX_DUPLICATES)))
+
+    def summary(self):
+        with self.lock:
+            views = {name: list(samples) for name, samples in self.samples.items()}
+            report = {}
+            for name, samples in views.items():
+                report[name] = {
+                    'requests': self.requests[name],
+                    'budget': self.budgets[name],
+                    'over_budget': self.over_budget[name],
+                    'duplicate_queries': [
+                        {'sql': sql, 'executions': count}
+                        for sql, count in self.duplicates[name].most_common(MAX_DUPLICATES)
+                    ],
+                }
+                for metric in METRICS:
+                    values = sorted(s[metric] for s in samples if s[metric] is not None)
+                    report[name][metric] = {
+                        'p50': percentile(values, 0.50),
+                        'p95': percentile(values, 0.95),
+                        'p99': percentile(values, 0.99),
+                        'max': values[-1],
+                    } if values else None
+        return report
+
+
+request_stats = RequestStats(getattr(settings, 'REQUEST_STATS_WINDOW', DEFAULT_WINDOW))
+
+
+class RequestStatsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        began = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - began
+
+        match = request.resolver_match
+        if match is None:
+            return response
+        budget = view_budget(match)
+        duplicates = recorder.duplicates()
+        sample = {
+            'queries': recorder.count,
+            'db_ms': round(recorder.seconds * 1000, 2),
+            'render_ms': getattr(request, '_render_ms', None),
+            'total_ms': round(total * 1000, 2),
+            'response_bytes': None if response.streaming else len(response.content),
+        }
+        request_stats.record(match.view_name, sample, duplicates, budget)
+
+        if settings.DEBUG:
+            response['Server-Timing'] = (
+                f"db;dur={sample['db_ms']};desc=\"{recorder.count} queries\", total;dur={sample['total_ms']}")
+        if budget is not None and recorder.count > budget:
+            message = (
+                f"{match.view_name} ran {recorder.count} queries, over its budget of {budget}"
+                + "".join(f"\n  {count}x {sql}" for sql, count in Counter(duplicates).most_common(5)))
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_template_response(self, request, response):
+        began = time.perf_counter()
+
+        def rendered(response):
+            request._render_ms = round((time.perf_counter() - began) * 1000, 2)
+        response.add_post_render_callback(rendered)
+        return response
+
+
+@require_GET
+@staff_member_required
+def request_stats_view(request):
+    """
+    The rolling per-view stats of this worker process, as JSON
+    """
+    return JsonResponse({
+        'window': request_stats.window,
+        'views': request_stats.summary(),
+    })
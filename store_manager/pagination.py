@@ -0,0 +1,283 @@
+"""
+Keyset (cursor) pagination.
+
+Django's Paginator runs COUNT(*) over the filtered rows and then reads the
+page with OFFSET, so every page costs more the deeper it is. CursorPaginator
+instead remembers the ordering values of the row at the edge of the page and
+asks for the rows after (or before) it, which is an index range scan at any
+depth.
+
+The ordering must end in a unique column (normally ``id``) so every row has
+a distinct position. Cursors are signed, opaque tokens; a tampered token
+raises InvalidCursor. Querysets with an ordering that can't be expressed as
+model columns (search relevance, for instance) are paginated with offset
+cursors instead, behind the same interface.
+"""
+from django.core import signing
+from django.db.models import Max, Min, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'store_manager.pagination'
+# 'approx' counts never read more than this many rows of a filtered queryset
+APPROX_COUNT_LIMIT = 10000
+COUNT_MODES = ('exact', 'approx', None)
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def approximate_count(queryset, limit=APPROX_COUNT_LIMIT):
+    """
+    Returns ``(count, is_estimate)`` without a full COUNT(*). A whole table
+    is estimated from its primary key span (two index lookups); a filtered
+    queryset is counted up to ``limit`` rows.
+    """
+    if not queryset.query.has_filters():
+        # Separate queries: SQLite only optimizes a lone MIN() or MAX()
+        low = queryset.order_by().aggregate(low=Min('pk'))['low']
+        if low is None:
+            return 0, False
+        high = queryset.order_by().aggregate(high=Max('pk'))['high']
+        return high - low + 1, True
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        return limit, True
+    return count, False
+
+
+def cursor_value(value):
+    """
+    JSON-safe form of an ordering value; field.to_python() reverses it
+    """
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class CursorPage:
+    """
+    One page of results, with the cursors for its neighbours
+    """
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self.object_list)} rows>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @cached_property
+    def counted(self):
+        return self.paginator.count_rows()
+
+    @property
+    def count(self):
+        """
+        Total rows, or None when counting is off. Only queried when used.
+        """
+        return self.counted[0]
+
+    @property
+    def count_is_estimate(self):
+        return self.counted[1]
+
+
+class CursorPaginator:
+    """
+    Paginates ``queryset`` on ``ordering``, a sequence of field names as for
+    order_by() that ends in a unique field. With ``ordering=None`` the
+    queryset keeps its own ordering and cursors hold offsets.
+
+    ``count_mode`` is 'exact' (COUNT(*)), 'approx' (see approximate_count)
+    or None (no count).
+    """
+
+    def __init__(self, queryset, ordering, per_page, count_mode='approx'):
+        if count_mode not in COUNT_MODES:
+            raise ValueError(f"Unknown count mode {count_mode!r}")
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.count_mode = count_mode
+        self.fields = self.resolve_ordering(ordering) if ordering is not None else None
+
+    def resolve_ordering(self, ordering):
+        """
+        Returns ``[(field, descending)]`` for the ordering
+        """
+        meta = self.queryset.model._meta
+        fields = []
+        for name in ordering:
+            descending = name.startswith('-')
+            field = meta.get_field(name.lstrip('-'))
+            if not field.concrete or field.is_relation and not field.many_to_one:
+                raise ValueError(f"Cannot paginate on {name!r}")
+            fields.append((field, descending))
+        if not fields or not (fields[-1][0].primary_key or fields[-1][0].unique):
+            raise ValueError("The ordering must end in a unique field")
+        return fields
+
+    def order_by(self, backwards=False):
+        return [
+            ('-' if descending != backwards else '') + field.attname
+            for field, descending in self.fields
+        ]
+
+    def encode(self, position):
+        return signing.dumps(position, salt=CURSOR_SALT, compress=True)
+
+    def decode(self, cursor):
+        try:
+            position = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            raise InvalidCursor("Invalid cursor")
+        keyset = self.fields is not None
+        if not isinstance(position, dict) or ('v' in position) != keyset:
+            raise InvalidCursor("Cursor does not match this listing")
+        if keyset:
+            if len(position['v']) != len(self.fields):
+                raise InvalidCursor("Cursor does not match this listing")
+            try:
+                position['v'] = [
+                    field.to_python(value) for (field, _), value in zip(self.fields, position['v'])
+                ]
+            except Exception:
+                raise InvalidCursor("Invalid cursor")
+        return position
+
+    def row_values(self, row):
+        # Rows are model instances or values() dicts
+        if isinstance(row, dict):
+            return [row[field.attname] for field, _ in self.fields]
+        return [getattr(row, field.attname) for field, _ in self.fields]
+
+    def keyset_cursor(self, values, backwards):
+        return self.encode({'v': [cursor_value(value) for value in values], 'b': backwards})
+
+    def keyset_filter(self, values, backwards):
+        """
+        Rows strictly after ``values`` in the ordering (before them when
+        going backwards): a >= x AND ((a > x) OR (a = x AND b > y) OR ...)
+
+        The leading ``a >= x`` is redundant but lets the database seek into
+        the index on ``a`` instead of scanning it from the start.
+        """
+        condition = Q()
+        for index, ((field, descending), value) in enumerate(zip(self.fields, values)):
+            lookup = 'lt' if descending != backwards else 'gt'
+            term = Q(**{f'{field.attname}__{lookup}': value})
+            for earlier, earlier_value in zip(self.fields[:index], values):
+                term &= Q(**{earlier[0].attname: earlier_value})
+            condition |= term
+        field, descending = self.fields[0]
+        lookup = 'lte' if descending != backwards else 'gte'
+        return Q(**{f'{field.attname}__{lookup}': values[0]}) & condition
+
+    def page(self, cursor=None):
+        position = self.decode(cursor) if cursor else None
+        if self.fields is None:
+            return self.offset_page(position['o'] if position else 0)
+        return self.keyset_page(position)
+
+    def offset_page(self, offset):
+        offset = max(int(offset), 0)
+        rows = list(self.queryset[offset:offset + self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return CursorPage(
+            rows[:self.per_page], self,
+            next_cursor=self.encode({'o': offset + self.per_page}) if has_next else None,
+            previous_cursor=self.encode({'o': max(offset - self.per_page, 0)}) if offset else None,
+        )
+
+    def keyset_page(self, position):
+        backwards = bool(position and position.get('b'))
+        queryset = self.queryset.order_by(*self.order_by(backwards))
+        if position:
+            queryset = queryset.filter(self.keyset_filter(position['v'], backwards))
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            if not rows:
+                # Everything before the cursor is gone
+                return self.keyset_page(None)
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, position is not None
+
+        first = self.row_values(rows[0]) if rows else position and position['v']
+        last = self.row_values(rows[-1]) if rows else None
+        return CursorPage(
+            rows, self,
+            next_cursor=self.keyset_cursor(last, False) if has_next else None,
+            previous_cursor=self.keyset_cursor(first, True) if has_previous else None,
+        )
+
+    def count_rows(self):
+        """
+        Returns ``(count, is_estimate)`` according to the count mode
+        """
+        if self.count_mode == 'exact':
+            return self.queryset.count(), False
+        if self.count_mode == 'approx':
+            return approximate_count(self.queryset)
+        return None, False
+
+
+class CursorPaginationMixin:
+    """
+    ListView mixin that paginates with CursorPaginator instead of Django's
+    offset Paginator. Views set ``cursor_ordering`` (or override
+    get_cursor_ordering(), returning None to keep the queryset's own
+    ordering with offset cursors). Templates get ``page_obj`` with
+    ``next_link``/``previous_link`` query strings.
+    """
+    cursor_ordering = None
+    cursor_param = 'cursor'
+    count_mode = 'approx'
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        query[self.cursor_param] = cursor
+        return f'?{query.urlencode()}'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(
+            queryset, self.get_cursor_ordering(), page_size, count_mode=self.count_mode)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_param))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        page.next_link = self.cursor_link(page.next_cursor)
+        page.previous_link = self.cursor_link(page.previous_cursor)
+        return paginator, page, page.object_list, page.has_other_pages()
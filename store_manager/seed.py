@@ -0,0 +1,488 @@
+"""
+Synthetic store data for load tests and benchmarks.
+
+``seed_store`` generates a catalog (a category tree, suppliers, products),
+a stock movement ledger and an order history with items, reproducibly: the
+same seed, sizes and end date always produce the same rows. Every phase
+draws from its own random stream, so changing one size leaves the rows of
+the other phases alone.
+
+Rows go in with bulk inserts that bypass model signals. Products,
+movements, orders and items are written with raw ``executemany`` and
+explicit ids: their timestamps are ``auto_now_add`` and bulk_create would
+stamp them all with the insert time, and it spends most of its time
+preparing values field by field.
+Product quantities are set to the last ``after_quantity`` of their ledger,
+and order totals to the sum of their items. The summary tables (closure,
+snapshot, history, valuation, alerts, revenue rollups, sales facts) are
+then rebuilt.
+
+Seeded rows are recognisable by their prefix (SKU and category slug) and
+email domain, and ``clear_seed`` removes them with everything that
+references them.
+"""
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connections, models, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from inventory.models import Category, Product, StockMovement, Supplier
+from orders.models import Customer, Order, OrderItem
+
+from .caching import DOMAINS, bump
+
+DEFAULT_PREFIX = 'seed'
+BATCH_SIZE = 10000
+
+ADJECTIVES = ['wireless', 'compact', 'premium', 'portable', 'smart', 'heavy', 'mini', 'pro',
+              'classic', 'digital', 'organic', 'steel', 'cotton', 'solar', 'rapid', 'silent',
+              'large', 'family', 'travel', 'outdoor']
+NOUNS = ['mouse', 'keyboard', 'laptop', 'stand', 'lamp', 'charger', 'speaker', 'monitor',
+         'kettle', 'blender', 'backpack', 'bottle', 'drill', 'router', 'camera', 'printer',
+         'headphones', 'tripod', 'scanner', 'heater', 'rice', 'flour', 'tea', 'coffee',
+         'soap', 'juice', 'milk', 'sugar', 'shirt', 'sandals']
+BRANDS = ['Acme', 'Zenith', 'Orbit', 'Nimbus', 'Vertex', 'Kilima', 'Savanna', 'Tusker',
+          'Baobab', 'Jua', 'Mto', 'Pwani']
+DEPARTMENTS = ['Electronics', 'Groceries', 'Household', 'Clothing', 'Beverages', 'Hardware',
+               'Stationery', 'Health', 'Beauty', 'Toys', 'Garden', 'Sports']
+FIRST_NAMES = ['Amina', 'Brian', 'Wanjiru', 'David', 'Faith', 'Kevin', 'Achieng', 'Peter',
+               'Mercy', 'Otieno', 'Grace', 'Hassan', 'Njeri', 'Samuel', 'Zawadi', 'Joseph']
+LAST_NAMES = ['Mwangi', 'Ochieng', 'Kamau', 'Wambui', 'Kiptoo', 'Mohamed', 'Njoroge', 'Atieno',
+              'Mutua', 'Chebet', 'Omondi', 'Kariuki']
+CITIES = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Thika', 'Malindi', 'Nyeri']
+
+# (movement type, weight, smallest quantity, largest quantity)
+MOVEMENT_MIX = [
+    ('sale', 70, 1, 5),
+    ('purchase', 12, 20, 200),
+    ('return', 5, 1, 3),
+    ('adjustment', 6, 1, 3),
+    ('loss', 3, 1, 2),
+    ('transfer', 4, 1, 10),
+]
+STOCK_IN = {'purchase', 'return'}
+STOCK_OUT = {'sale', 'adjustment', 'loss'}
+# Orders younger than this are still open
+OPEN_ORDER_DAYS = 3
+
+
+class SeedConfig:
+    """
+    Sizes of a seeded dataset. Unset sizes are derived from ``products``:
+    10 movements and 2 orders per product, one customer per 10 products,
+    and 3 items per order on average.
+    """
+
+    def __init__(self, products=10000, movements=None, orders=None, customers=None,
+                 categories=None, suppliers=None, items_per_order=3, days=365,
+                 seed=1, until=None, prefix=DEFAULT_PREFIX):
+        self.products = products
+        self.movements = products * 10 if movements is None else movements
+        self.orders = products * 2 if orders is None else orders
+        self.customers = max(1, products // 10) if customers is None else customers
+        self.categories = max(10, products // 500) if categories is None else categories
+        self.suppliers = max(5, products // 2000) if suppliers is None else suppliers
+        self.items_per_order = items_per_order
+        self.days = days
+        self.seed = seed
+        self.until = until or timezone.localdate()
+        self.prefix = prefix
+
+    @property
+    def sku_prefix(self):
+        return f"{self.prefix.upper()}-"
+
+    @property
+    def slug_prefix(self):
+        return f"{self.prefix.lower()}-"
+
+    @property
+    def email_domain(self):
+        return f"{self.prefix.lower()}.example"
+
+    def window(self):
+        """
+        ``(start, end)`` of the seeded history, ending at midnight after ``until``
+        """
+        end = timezone.make_aware(datetime.combine(self.until + timedelta(days=1), datetime.min.time()))
+        return end - timedelta(days=self.days), end
+
+    def rng(self, phase):
+        return random.Random(f"{self.seed}:{phase}")
+
+
+def insert_rows(model, field_names, rows, using):
+    """
+    Raw multi-row insert of prepared values, in ``field_names`` order
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = model._meta
+    columns = ', '.join(qn(opts.get_field(name).column) for name in field_names)
+    placeholders = ', '.join(['%s'] * len(field_names))
+    with connection.cursor() as cursor:
+        cursor.executemany(f"INSERT INTO {qn(opts.db_table)} ({columns}) VALUES ({placeholders})", rows)
+
+
+def reset_sequences(models_list, using):
+    # Rows inserted with explicit ids leave PostgreSQL sequences behind
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models_list):
+            cursor.execute(sql)
+
+
+def cents(value):
+    return Decimal(value).scaleb(-2)
+
+
+class Popularity:
+    """
+    Picks product indexes with a long tail: a few products sell a lot, most
+    rarely. Popularity is independent of the product's position.
+    """
+
+    def __init__(self, size, rng):
+        self.order = list(range(size))
+        rng.shuffle(self.order)
+        self.rng = rng
+
+    def pick(self):
+        return self.order[int(len(self.order) * self.rng.random() ** 3)]
+
+
+class StoreSeeder:
+    def __init__(self, config, using=None, log=None):
+        self.config = config
+        self.using = using or router.db_for_write(Product)
+        self.log = log or (lambda message: None)
+        self.counts = {}
+
+    def run(self, derived=True):
+        config = self.config
+        self.step('categories', self.seed_categories)
+        self.step('suppliers', self.seed_suppliers)
+        self.step('products', self.seed_products)
+        self.step('stock movements', self.seed_movements)
+        self.step('customers', self.seed_customers)
+        self.step('orders', self.seed_orders)
+        if derived:
+            self.step('summary tables', refresh_summaries)
+        self.log(f"Seeded {config.products:,} products, {self.counts['stock movements']:,} movements, "
+                 f"{self.counts['orders']:,} orders")
+        return self.counts
+
+    def step(self, label, function):
+        began = time.perf_counter()
+        rows = function()
+        elapsed = time.perf_counter() - began
+        self.counts[label] = rows
+        if rows is None:
+            self.log(f"{label}: {elapsed:.1f}s")
+        else:
+            self.log(f"{label}: {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f}/s)")
+
+    def seed_categories(self):
+        config = self.config
+        rng = config.rng('categories')
+        roots = min(len(DEPARTMENTS), config.categories)
+        levels = [[
+            Category(name=f"{DEPARTMENTS[i]} ({config.prefix} {i})",
+                     slug=f"{config.slug_prefix}cat-{i}")
+            for i in range(roots)
+        ]]
+        # Two levels each three times wider than the one above, and the
+        # rest on a fourth
+        remaining = config.categories - roots
+        made = roots
+        while remaining > 0:
+            width = remaining if len(levels) == 3 else min(remaining, len(levels[-1]) * 3)
+            levels.append([
+                Category(name=f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} ({config.prefix} {made + i})",
+                         slug=f"{config.slug_prefix}cat-{made + i}", parent=rng.choice(levels[-1]))
+                for i in range(width)
+            ])
+            made += width
+            remaining -= width
+
+        from inventory.categories import rebuild_closure
+        self.category_ids = []
+        with transaction.atomic(using=self.using):
+            for level in levels:
+                Category.objects.using(self.using).bulk_create(level, batch_size=BATCH_SIZE)
+                self.category_ids.extend(category.pk for category in level)
+        rebuild_closure()
+        return made
+
+    def seed_suppliers(self):
+        config = self.config
+        rng = config.rng('suppliers')
+        suppliers = [
+            Supplier(name=f"{rng.choice(BRANDS)} {rng.choice(DEPARTMENTS)} Supplies ({config.prefix} {i})",
+                     contact_person=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                     email=f"supplier{i}@{config.email_domain}",
+                     phone=f"+2547{rng.randrange(10 ** 8):08d}",
+                     address=f"{rng.randrange(1, 400)} Industrial Area, {rng.choice(CITIES)}")
+            for i in range(config.suppliers)
+        ]
+        Supplier.objects.using(self.using).bulk_create(suppliers, batch_size=BATCH_SIZE)
+        self.supplier_ids = [supplier.pk for supplier in suppliers]
+        return len(suppliers)
+
+    def seed_products(self):
+        config = self.config
+        rng = config.rng('products')
+        ops = connections[self.using].ops
+        start, end = config.window()
+        now = ops.adapt_datetimefield_value(timezone.now())
+        first_id = (Product.objects.using(self.using).aggregate(last=Max('pk'))['last'] or 0) + 1
+        self.product_ids = range(first_id, first_id + config.products)
+        # Prices in cents, by product index
+        self.unit_cents = array('q')
+        self.cost_cents = array('q')
+
+        fields = ['id', 'name', 'slug', 'sku', 'barcode', 'description', 'category', 'supplier',
+                  'unit_price', 'cost_price', 'quantity', 'reorder_level', 'is_active', 'dimensions',
+                  'tax_rate', 'manufacture_date', 'expiry_date', 'created_at', 'updated_at']
+        rows = []
+        for i in range(config.products):
+            cost = int(rng.lognormvariate(6.5, 1.2)) + 50
+            unit = int(cost * rng.uniform(1.1, 1.8))
+            perishable = rng.random() < 0.2
+            sku = f"{config.sku_prefix}{i:08d}"
+            rows.append((
+                first_id + i,
+                f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+                sku.lower(), sku, f"9{config.seed % 100:02d}{i:09d}",
+                f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} from {rng.choice(BRANDS)}",
+                rng.choice(self.category_ids), rng.choice(self.supplier_ids),
+                cents(unit), cents(cost), 0, rng.choice([5, 10, 20, 50]), rng.random() > 0.03, '',
+                Decimal('16.00') if rng.random() < 0.8 else Decimal('0.00'),
+                ops.adapt_datefield_value((start - timedelta(days=rng.randrange(30))).date())
+                if perishable else None,
+                ops.adapt_datefield_value((end + timedelta(days=rng.randrange(-30, 365))).date())
+                if perishable else None,
+                now, now,
+            ))
+            self.unit_cents.append(unit)
+            self.cost_cents.append(cost)
+            if len(rows) == BATCH_SIZE or i == config.products - 1:
+                with transaction.atomic(using=self.using):
+                    insert_rows(Product, fields, rows, self.using)
+                rows = []
+        reset_sequences([Product], self.using)
+        return config.products
+
+    def seed_movements(self):
+        """
+        A chronological ledger: each movement continues its product's running
+        quantity, and out-of-stock products are restocked before selling
+        """
+        config = self.config
+        if not config.products:
+            return 0
+        rng = config.rng('movements')
+        popularity = Popularity(config.products, rng)
+        kinds = [kind for kind, *_ in MOVEMENT_MIX]
+        weights = [weight for _, weight, *_ in MOVEMENT_MIX]
+        ranges = {kind: (low, high) for kind, _, low, high in MOVEMENT_MIX}
+        quantities = array('q', [0]) * config.products
+        connection = connections[self.using]
+        adapt = connection.ops.adapt_datetimefield_value
+        start, end = config.window()
+        step = (end - start) / max(config.movements, 1)
+
+        fields = ['product', 'movement_type', 'quantity', 'before_quantity', 'after_quantity',
+                  'reference', 'notes', 'unit_price', 'total_price', 'created_at']
+        rows = []
+        for k in range(config.movements):
+            index = popularity.pick()
+            before = quantities[index]
+            kind = rng.choices(kinds, weights)[0]
+            low, high = ranges[kind]
+            quantity = rng.randint(low, high)
+            if kind in STOCK_OUT and quantity > before:
+                kind = 'purchase'
+                quantity = rng.randint(*ranges['purchase'])
+            after = before + quantity if kind in STOCK_IN else before - quantity if kind in STOCK_OUT else before
+            quantities[index] = after
+            price = self.unit_cents[index] if kind in ('sale', 'return') else self.cost_cents[index]
+            rows.append((
+                self.product_ids[index], kind, quantity, before, after,
+                f"PO-{k}" if kind == 'purchase' else '', '',
+                cents(price), cents(price * quantity), adapt(start + step * (k + rng.random())),
+            ))
+            if len(rows) == BATCH_SIZE:
+                self.write_movements(fields, rows)
+                rows = []
+        self.write_movements(fields, rows)
+
+        updates = [(quantity, self.product_ids[index]) for index, quantity in enumerate(quantities) if quantity]
+        qn = connection.ops.quote_name
+        opts = Product._meta
+        with transaction.atomic(using=self.using), connection.cursor() as cursor:
+            for offset in range(0, len(updates), BATCH_SIZE):
+                cursor.executemany(
+                    f"UPDATE {qn(opts.db_table)} SET {qn(opts.get_field('quantity').column)} = %s "
+                    f"WHERE {qn(opts.pk.column)} = %s", updates[offset:offset + BATCH_SIZE])
+        return config.movements
+
+    def write_movements(self, fields, rows):
+        if rows:
+            with transaction.atomic(using=self.using):
+                insert_rows(StockMovement, fields, rows, self.using)
+
+    def seed_customers(self):
+        config = self.config
+        rng = config.rng('customers')
+        self.customer_ids = array('q')
+        batch = []
+        for i in range(config.customers):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            batch.append(Customer(
+                name=f"{first} {last}", email=f"{first.lower()}.{last.lower()}{i}@{config.email_domain}",
+                phone=f"+2547{rng.randrange(10 ** 8):08d}",
+                address=f"{rng.randrange(1, 900)} {rng.choice(LAST_NAMES)} Road, {rng.choice(CITIES)}",
+            ))
+            if len(batch) == BATCH_SIZE or i == config.customers - 1:
+                Customer.objects.using(self.using).bulk_create(batch)
+                self.customer_ids.extend(customer.pk for customer in batch)
+                batch = []
+        return config.customers
+
+    def seed_orders(self):
+        """
+        Orders with explicit ids so their items can be written in the same
+        pass; totals are the sums of the items
+        """
+        config = self.config
+        if not config.products or not config.customers:
+            return 0
+        rng = config.rng('orders')
+        popularity = Popularity(config.products, rng)
+        adapt = connections[self.using].ops.adapt_datetimefield_value
+        start, end = config.window()
+        step = (end - start) / max(config.orders, 1)
+        open_after = end - timedelta(days=OPEN_ORDER_DAYS)
+        next_id = (Order.objects.using(self.using).aggregate(last=Max('pk'))['last'] or 0) + 1
+
+        orders, items = [], []
+        for k in range(config.orders):
+            order_id = next_id + k
+            order_date = start + step * (k + rng.random())
+            if order_date >= open_after:
+                status = rng.choices(['pending', 'processing', 'completed'], [5, 4, 1])[0]
+            else:
+                status = rng.choices(['completed', 'cancelled'], [9, 1])[0]
+            total = 0
+            for _ in range(rng.randint(1, config.items_per_order * 2 - 1)):
+                index = popularity.pick()
+                quantity = rng.randint(1, 4)
+                items.append((order_id, self.product_ids[index], quantity, cents(self.unit_cents[index])))
+                total += self.unit_cents[index] * quantity
+            orders.append((order_id, rng.choice(self.customer_ids), adapt(order_date), adapt(order_date),
+                           status, cents(total)))
+            if len(orders) == BATCH_SIZE or k == config.orders - 1:
+                with transaction.atomic(using=self.using):
+                    insert_rows(Order, ['id', 'customer', 'order_date', 'updated_at', 'status', 'total'], orders,
+                                self.using)
+                    insert_rows(OrderItem, ['order', 'product', 'quantity', 'price'], items, self.using)
+                orders, items = [], []
+        reset_sequences([Order, OrderItem], self.using)
+        return config.orders
+
+
+def refresh_summaries():
+    """
+    Rebuilds every summary table from the base tables after bulk writes
+    """
+    from inventory.alerts import evaluate_alerts
+    from inventory.history import rebuild_history
+    from inventory.snapshot import rebuild_snapshot
+    from inventory.valuation import rebuild_valuation
+    from orders.rollups import backfill_rollups
+    from orders.sales import rebuild_sales
+
+    rebuild_snapshot()
+    rebuild_history()
+    rebuild_valuation()
+    evaluate_alerts()
+    backfill_rollups()
+    rebuild_sales()
+    bump(*DOMAINS)
+
+
+def seed_store(config, using=None, log=None, derived=True):
+    """
+    Generates the dataset described by ``config`` and returns the rows
+    written per table
+    """
+    return StoreSeeder(config, using=using, log=log).run(derived=derived)
+
+
+def delete_where(model, where, params, using):
+    """
+    Raw DELETE of the ``model`` rows matching ``where``, after deleting the
+    rows that reference them (or clearing the reference, for SET_NULL
+    foreign keys). Model signals don't fire.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = model._meta
+    selected = f"SELECT {qn(opts.pk.column)} FROM {qn(opts.db_table)} WHERE {where}"
+    deleted = 0
+    with connection.cursor() as cursor:
+        for relation in opts.related_objects:
+            if relation.many_to_many:
+                continue
+            related = relation.related_model
+            column = qn(relation.field.column)
+            if relation.on_delete is models.SET_NULL:
+                cursor.execute(
+                    f"UPDATE {qn(related._meta.db_table)} SET {column} = NULL WHERE {column} IN ({selected})",
+                    params)
+            elif related is not model:
+                deleted += delete_where(related, f"{column} IN ({selected})", params, using)
+        cursor.execute(f"DELETE FROM {qn(opts.db_table)} WHERE {where}", params)
+        return deleted + cursor.rowcount
+
+
+def clear_seed(prefix=DEFAULT_PREFIX, using=None):
+    """
+    Deletes the rows seeded with ``prefix`` and everything referencing them,
+    then rebuilds the summary tables. Returns the number of rows deleted.
+    """
+    config = SeedConfig(products=0, prefix=prefix)
+    using = using or router.db_for_write(Product)
+    qn = connections[using].ops.quote_name
+
+    def column(model, name):
+        return qn(model._meta.get_field(name).column)
+
+    deleted = 0
+    with transaction.atomic(using=using):
+        for model, where, value in [
+            (Product, f"{column(Product, 'sku')} LIKE %s", f"{config.sku_prefix}%"),
+            (Category, f"{column(Category, 'slug')} LIKE %s", f"{config.slug_prefix}cat-%"),
+            (Supplier, f"{column(Supplier, 'email')} LIKE %s", f"%@{config.email_domain}"),
+            (Customer, f"{column(Customer, 'email')} LIKE %s", f"%@{config.email_domain}"),
+        ]:
+            deleted += delete_where(model, where, [value], using)
+
+    from inventory.valuation import is_built, rebuild_totals
+    from inventory.snapshot import rebuild_snapshot
+    from orders.rollups import backfill_rollups
+    from orders.sales import rebuild_sales
+    rebuild_snapshot()
+    if is_built():
+        rebuild_totals()
+    backfill_rollups()
+    rebuild_sales()
+    bump(*DOMAINS)
+    return deleted
@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'store_manager.instrumentation.RequestStatsMiddleware',
 ]
 
 ROOT_URLCONF = 'store_manager.urls'
@@ -137,3 +138,26 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Query budgets for views defined outside this project, by view name; our
+# own views declare theirs (see store_manager.instrumentation)
+QUERY_BUDGETS = {
+    'admin:inventory_supplier_changelist': 10,
+    'admin:inventory_category_changelist': 12,
+    'admin:inventory_product_changelist': 10,
+    'admin:orders_customer_changelist': 10,
+}
+
+# Report and dashboard pages are kept in this cache for up to
+# RESPONSE_CACHE_TIMEOUT seconds (0 turns it off), and dropped as soon as
+# the data they show changes (see store_manager.caching)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Enforces the query budgets (QUERY_BUDGET_STRICT) while testing
+TEST_RUNNER = 'store_manager.test_runner.BudgetTestRunner'
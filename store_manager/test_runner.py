@@ -0,0 +1,20 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class BudgetTestRunner(DiscoverRunner):
+    """
+    Runs the tests with query budgets enforced, so a view that goes over
+    its budget fails the test that requested it, and with the response
+    cache off, so every request renders (and runs its queries); the cache
+    tests turn it back on
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.strict_budgets = override_settings(QUERY_BUDGET_STRICT=True, RESPONSE_CACHE_TIMEOUT=0)
+        self.strict_budgets.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.strict_budgets.disable()
+        super().teardown_test_environment(**kwargs)
@@ -20,6 +20,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import TemplateView
 from inventory.views import DashboardView
+from store_manager.instrumentation import request_stats_view
 
 
 
@@ -28,9 +29,11 @@ from inventory.views import DashboardView
 urlpatterns = [
 
     path('', TemplateView.as_view(template_name='home.html'), name='home'),
+    path('admin/request-stats/', request_stats_view, name='request_stats'),
     path('admin/', admin.site.urls),
     path('inventory/', include('inventory.urls', namespace='inventory')),
     path('orders/', include('orders.urls', namespace='orders')),
+    path('api/v1/', include('store_manager.api_urls', namespace='api')),
     path('accounts/', include('django.contrib.auth.urls')), 
     path('dashboard/', DashboardView.as_view(), name='dashboard'), # <-- Add this line
     